@@ -27,6 +27,6 @@ SELECT 'VERIFICACION FINAL:' AS info;
 SHOW COLUMNS FROM fb_leads WHERE Field IN ('procesado', 'enviado');
 
 -- Opcional: Crear índice para mejor rendimiento
-CREATE INDEX idx_enviado ON fb_leads(enviado);
+CREATE INDEX idx_enviado_created ON fb_leads(enviado, created_time, id);
 
 SELECT 'SCRIPT COMPLETADO EXITOSAMENTE!' AS resultado;
\ No newline at end of file
@@ -0,0 +1,21 @@
+-- =====================================================
+-- MIGRACIÓN: COLUMNA 'actualizado_at' EN expokossodo_registros
+-- =====================================================
+-- Habilita la exportación incremental (export_registros.py --since).
+-- Equivale a 'flask --app app migrate-registros'. Requiere privilegio de
+-- ALTER e INDEX sobre la tabla; la aplicación no la modifica al arrancar.
+
+USE atusalud_kossomet;
+
+-- Verificar si la columna ya existe
+SELECT 'VERIFICANDO SI EXISTE COLUMNA actualizado_at:' AS info;
+SHOW COLUMNS FROM expokossodo_registros LIKE 'actualizado_at';
+
+-- Crear la columna (si ya existe, MySQL mostrará un error que puedes ignorar)
+ALTER TABLE expokossodo_registros
+ADD COLUMN actualizado_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+
+-- Índice para filtrar y paginar por fecha de modificación
+CREATE INDEX idx_actualizado ON expokossodo_registros(actualizado_at, id);
+
+SELECT 'MIGRACIÓN COMPLETADA' AS resultado;
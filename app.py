@@ -1,168 +1,258 @@
 import os
+import signal
+import sys
+import atexit
 import hmac
-import hashlib
-import json
-from datetime import datetime, timezone
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 from flask import Flask, request, jsonify, Response
 from dotenv import load_dotenv
-import requests
-import pymysql
-from modules.lead_consolidator import consolidate_lead_to_registros, ensure_procesado_column
 
+# Antes de importar 'modules': sus ajustes se leen del entorno al importarse
 load_dotenv()
 
+from modules import codec, db, exporter, lead_journal, lead_stats, partitions, pipeline, profiling, resilience, schema
+from modules.log import fields, setup_logging
+from modules.slot_counter import SLOT_COMPACTION_INTERVAL, start_compaction_thread
+
+setup_logging()
+
 FB_APP_SECRET = os.environ.get("FB_APP_SECRET", "").encode()
 PAGE_TOKEN = os.environ.get("FB_PAGE_ACCESS_TOKEN", "")
 VERIFY_TOKEN = os.environ.get("WEBHOOK_VERIFY_TOKEN", "mi_token_verificacion_123")
+# Tokens para /export/registros y /stats; sin token el endpoint queda deshabilitado
+EXPORT_TOKEN = os.environ.get("EXPORT_TOKEN", "")
+STATS_TOKEN = os.environ.get("STATS_TOKEN", "")
+
+# Timeout (segundos) de cada request a Graph API; partition_worker.py usa uno menor
+GRAPH_TIMEOUT = float(os.environ.get("GRAPH_TIMEOUT", 10))
 
 # Facebook Marketing API
 MKT_TOKEN = os.environ.get("MKT_TOKEN", "")
 AD_ACCOUNT_ID = os.environ.get("AD_ACCOUNT_ID", "")
 PAGE_ID = os.environ.get("PAGE_ID", "142158129158183")
-
-DB_HOST = os.environ.get("DB_HOST")
-DB_NAME = os.environ.get("DB_NAME")
-DB_USER = os.environ.get("DB_USER")
-DB_PASSWORD = os.environ.get("DB_PASSWORD")
-DB_PORT = int(os.environ.get("DB_PORT", 3306))
+# Varias páginas: FB_PAGE_TOKENS='{"<page_id>": "<token>", ...}'.
+# Las páginas sin token propio usan FB_PAGE_ACCESS_TOKEN.
+PAGE_TOKENS = {str(page_id): token for page_id, token in codec.loads(os.environ.get("FB_PAGE_TOKENS") or "{}").items()}
+PAGE_IDS = list(PAGE_TOKENS) or [PAGE_ID]
 
 LEADS_FOLDER = "Leads_expokossodo"
 SAVE_TO_FILE = os.environ.get("SAVE_TO_FILE", "false").lower() == "true"  # Desactivado por defecto
 
+# Tiempo máximo (segundos) para terminar los leads en vuelo al recibir SIGTERM
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", 25))
+# Cada cuántos segundos se reintenta el spool (journal) si MySQL está disponible; 0 = solo al arrancar
+SPOOL_REPLAY_INTERVAL = float(os.environ.get("SPOOL_REPLAY_INTERVAL", 15))
+
 app = Flask(__name__)
 
+# Estado de apagado y leads en vuelo (compartido entre hilos del worker)
+_shutdown_event = threading.Event()
+_inflight_cond = threading.Condition()
+_inflight_count = 0
+_shutdown_handlers_installed = False
+
+# Sesión HTTP para Graph API, creada en el primer uso (reutiliza conexiones TLS)
+_graph_session = None
+_graph_session_lock = threading.Lock()
+
+# Nombres de campañas/adsets/anuncios ya consultados (se repiten en casi todos los leads)
+_object_name_cache = {}
+
 def verify_and_create_columns():
-    """Verifica que todas las columnas necesarias existan en la tabla fb_leads"""
-    if not all([DB_HOST, DB_NAME, DB_USER, DB_PASSWORD]):
+    """Verifica que la tabla fb_leads y todas sus columnas e índices existan"""
+    if not db.is_configured():
         app.logger.warning("MySQL no configurado completamente. Saltando verificación de columnas.")
         return
 
     try:
-        conn = pymysql.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            autocommit=True,
-            charset="utf8mb4",
-            cursorclass=pymysql.cursors.DictCursor,
-        )
-        
+        # Conexión directa (sin pool): esto corre en el master de gunicorn antes del fork
+        conn = db.connect()
         with conn.cursor() as cur:
-            # Verificar si la tabla existe
-            cur.execute("SHOW TABLES LIKE 'fb_leads'")
-            if not cur.fetchone():
-                app.logger.info("Tabla fb_leads no existe. Se creará al recibir el primer lead.")
-                conn.close()
-                return
-            
-            # Verificar y crear columnas 'procesado' y 'enviado'
-            ensure_procesado_column(cur, conn)
-            
-            # Obtener columnas existentes
-            cur.execute("SHOW COLUMNS FROM fb_leads")
-            existing_columns = {row['Field'] for row in cur.fetchall()}
-            
-            # Columnas requeridas
-            required_columns = {
-                'campaign_name': 'VARCHAR(255) NULL',
-                'adset_name': 'VARCHAR(255) NULL', 
-                'ad_name': 'VARCHAR(255) NULL',
-                'sala': 'VARCHAR(10) NULL',
-                'enviado': 'TINYINT(1) DEFAULT 0'
-            }
-            
-            # Verificar y agregar columnas faltantes
-            for column_name, column_definition in required_columns.items():
-                if column_name not in existing_columns:
-                    try:
-                        alter_sql = f"ALTER TABLE fb_leads ADD COLUMN {column_name} {column_definition}"
-                        cur.execute(alter_sql)
-                        app.logger.info(f"Columna '{column_name}' agregada exitosamente")
-                    except Exception as e:
-                        app.logger.error(f"Error agregando columna '{column_name}': {e}")
-                else:
-                    app.logger.info(f"Columna '{column_name}' ya existe")
-            
-            # Crear índices si no existen
-            indexes = {
-                'idx_campaign_name': 'campaign_name',
-                'idx_adset_name': 'adset_name',
-                'idx_ad_name': 'ad_name',
-                'idx_sala': 'sala',
-                'idx_enviado': 'enviado'
-            }
-            
-            for index_name, column_name in indexes.items():
-                if column_name in existing_columns or column_name in required_columns:
-                    try:
-                        cur.execute(f"CREATE INDEX {index_name} ON fb_leads({column_name})")
-                        app.logger.info(f"Índice '{index_name}' creado exitosamente")
-                    except Exception as e:
-                        if "Duplicate key name" not in str(e):
-                            app.logger.warning(f"Info sobre índice '{index_name}': {e}")
-        
+            schema.ensure_schema(cur, conn)
         conn.close()
         app.logger.info("Verificación de columnas completada")
-        
+
     except Exception as e:
-        app.logger.exception(f"Error verificando columnas de base de datos: {e}")
+        app.logger.exception("Error verificando columnas de base de datos", extra=fields(component="schema", error=e))
 
 def init_app():
-    """Inicializa la aplicación creando carpetas necesarias y verificando BD"""
+    """
+    Inicializa la aplicación creando carpetas necesarias y verificando BD.
+    En producción corre una sola vez desde el hook on_starting de gunicorn.
+    """
     # Crear carpeta para archivos si está habilitado
     if SAVE_TO_FILE:
         if not os.path.exists(LEADS_FOLDER):
             os.makedirs(LEADS_FOLDER)
-            app.logger.info(f"Carpeta '{LEADS_FOLDER}' creada exitosamente")
+            app.logger.info("Carpeta de leads creada", extra=fields(folder=LEADS_FOLDER))
         else:
-            app.logger.info(f"Carpeta '{LEADS_FOLDER}' ya existe")
+            app.logger.info("Carpeta de leads ya existe", extra=fields(folder=LEADS_FOLDER))
     
     # Verificar y crear columnas faltantes en la base de datos
     verify_and_create_columns()
 
-def verify_signature(req) -> bool:
-    """Valida X-Hub-Signature-256 con el APP_SECRET."""
-    sig = req.headers.get("X-Hub-Signature-256", "")
-    if not sig.startswith("sha256="):
-        return False
-    received = sig.split("=", 1)[1]
-    digest = hmac.new(FB_APP_SECRET, msg=req.get_data(), digestmod=hashlib.sha256).hexdigest()
-    return hmac.compare_digest(received, digest)
+@contextmanager
+def _track_inflight():
+    """Cuenta los leads que se están procesando para poder drenarlos al apagar."""
+    global _inflight_count
+    with _inflight_cond:
+        _inflight_count += 1
+    try:
+        yield
+    finally:
+        with _inflight_cond:
+            _inflight_count -= 1
+            _inflight_cond.notify_all()
+
+def drain_inflight(timeout: float = SHUTDOWN_DRAIN_TIMEOUT) -> bool:
+    """
+    Espera hasta 'timeout' segundos a que terminen los leads en vuelo.
+    Los que no terminen siguen en el journal y se reprocesan en el próximo arranque.
+    """
+    with _inflight_cond:
+        drained = _inflight_cond.wait_for(lambda: _inflight_count == 0, timeout=timeout)
+        remaining = _inflight_count
+
+    if drained:
+        app.logger.info("Todos los leads en vuelo fueron procesados")
+    else:
+        app.logger.warning("Leads en proceso al vencer el plazo; quedan en el journal", extra=fields(component="shutdown", remaining=remaining))
+    return drained
+
+def install_shutdown_handlers():
+    """
+    Instala el manejador de SIGTERM: deja de aceptar leads nuevos y drena los
+    que están en proceso. Si ya existe un manejador (por ejemplo el de gunicorn)
+    se encadena para que el worker siga su apagado normal.
+    """
+    global _shutdown_handlers_installed
+    if _shutdown_handlers_installed or threading.current_thread() is not threading.main_thread():
+        return
+
+    previous_handler = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        if not _shutdown_event.is_set():
+            _shutdown_event.set()
+            app.logger.info("SIGTERM recibido", extra=fields(
+                component="shutdown", inflight=_inflight_count, journal_pending=lead_journal.pending_count()
+            ))
+
+        if callable(previous_handler):
+            # El worker (gunicorn) termina la petición actual; el drenaje final corre en atexit
+            previous_handler(signum, frame)
+        else:
+            drain_inflight()
+            sys.exit(0)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    atexit.register(drain_inflight)
+    _shutdown_handlers_installed = True
+
+def _replay_lead(leadgen_id, form_id, page_id, lead_json):
+    """Reprocesa un lead del journal contándolo como en vuelo: el apagado espera a que termine."""
+    with _track_inflight():
+        dispatch_fn()(leadgen_id, form_id, page_id, lead_json)
 
-def fetch_lead(lead_id: str) -> dict:
-    """Obtiene el lead completo desde Graph API."""
+def replay_journal():
+    """Reprocesa los leads pendientes: los de un apagado anterior y los que esperaban a MySQL/Graph."""
+    pending = lead_journal.pending_count()
+    if not pending:
+        return
+
+    app.logger.info("Reprocesando leads pendientes del journal", extra=fields(component="replay", pending=pending))
+    replayed, failed = lead_journal.replay_pending(_replay_lead, defer_on=resilience.DependencyUnavailable, stop=_shutdown_event)
+    app.logger.info("Journal reprocesado", extra=fields(component="replay", replayed=replayed, failed=failed))
+
+def _journal_replay_loop():
+    replay_journal()
+    while SPOOL_REPLAY_INTERVAL > 0 and not _shutdown_event.wait(SPOOL_REPLAY_INTERVAL):
+        # Con el circuito de MySQL abierto no tiene sentido intentarlo
+        if not resilience.mysql.available():
+            continue
+        try:
+            replay_journal()
+        except Exception as e:
+            app.logger.exception("Error reprocesando el journal", extra=fields(error=e))
+
+def start_slot_compaction(stop_event=None):
+    """
+    Compacta periódicamente los incrementos de slots en expokossodo_eventos.
+    El hilo termina al activarse stop_event (por defecto el de SIGTERM del
+    worker); al salir del proceso se espera a que cierre su transacción.
+    """
+    if SLOT_COMPACTION_INTERVAL <= 0 or not db.is_configured():
+        return None
+    if stop_event is None:
+        stop_event = _shutdown_event
+    thread = start_compaction_thread(db.get_connection, stop_event)
+
+    def stop_compaction():
+        stop_event.set()
+        thread.join(timeout=SHUTDOWN_DRAIN_TIMEOUT)
+
+    atexit.register(stop_compaction)
+    return thread
+
+def start_journal_replay():
+    """
+    Lanza el reprocesamiento del journal en segundo plano: al arrancar y luego
+    cada SPOOL_REPLAY_INTERVAL segundos, cuando el circuito de MySQL lo permite.
+    """
+    thread = threading.Thread(target=_journal_replay_loop, name="journal-replay", daemon=True)
+    thread.start()
+    return thread
+
+def verify_signature(body: bytes, signature_header: str) -> bool:
+    """Valida X-Hub-Signature-256 con el APP_SECRET sobre el cuerpo ya leído."""
+    return codec.verify_hmac_sha256(FB_APP_SECRET, body, signature_header)
+
+def graph_session():
+    """Devuelve la sesión HTTP de Graph API, creándola (e importando requests) en el primer uso."""
+    global _graph_session
+    if _graph_session is None:
+        with _graph_session_lock:
+            if _graph_session is None:
+                import requests
+                _graph_session = requests.Session()
+    return _graph_session
+
+def page_token(page_id) -> str:
+    """Token de acceso de la página (FB_PAGE_TOKENS), o el token por defecto."""
+    return PAGE_TOKENS.get(str(page_id), PAGE_TOKEN)
+
+def fetch_lead(lead_id: str, page_id=None) -> dict:
+    """
+    Obtiene el lead completo desde Graph API con el token de su página.
+    Un 4xx (lead borrado, permisos, token vencido) se lanza como error del
+    lead y no cuenta para el circuito de Graph API (ver resilience.http_failure).
+    """
     url = f"https://graph.facebook.com/v23.0/{lead_id}"
     params = {
-        "access_token": PAGE_TOKEN,
+        "access_token": page_token(page_id),
         "fields": "id,created_time,field_data,ad_id,adset_id,campaign_id,form_id,platform"
     }
-    r = requests.get(url, params=params, timeout=10)
-    r.raise_for_status()
-    return r.json()
-
-def parse_common_fields(lead_json: dict):
-    """Mapea campos comunes desde field_data."""
-    fd = lead_json.get("field_data", [])
-    field_map = {}
-    for f in fd:
-        name = f.get("name")
-        values = f.get("values") or []
-        field_map[name] = values[0] if values else None
-
-    full_name = field_map.get("full_name") or field_map.get("name")
-    email = field_map.get("email")
-    phone = field_map.get("phone_number") or field_map.get("phone")
-    job_title = field_map.get("job_title") or field_map.get("cargo")
-    company_name = field_map.get("company_name") or field_map.get("empresa")
-    
-    return full_name, email, phone, job_title, company_name
+    with resilience.graph.call():
+        r = graph_session().get(url, params=params, timeout=GRAPH_TIMEOUT)
+        r.raise_for_status()
+    return codec.loads(r.content)
+
+def _remember_name(object_id: str, name: str) -> str:
+    """Guarda en cache el nombre de un objeto de Marketing API (solo si se obtuvo)."""
+    if object_id and name:
+        _object_name_cache[object_id] = name
+    return name
 
 def get_campaign_name(campaign_id: str) -> str:
     """Obtiene el nombre de la campaña desde Facebook Marketing API"""
     if not campaign_id or not MKT_TOKEN:
         return None
+
+    if campaign_id in _object_name_cache:
+        return _object_name_cache[campaign_id]
     
     try:
         url = f"https://graph.facebook.com/v23.0/{campaign_id}"
@@ -170,18 +260,21 @@ def get_campaign_name(campaign_id: str) -> str:
             "fields": "name",
             "access_token": MKT_TOKEN
         }
-        response = requests.get(url, params=params, timeout=10)
+        response = graph_session().get(url, params=params, timeout=GRAPH_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
-        return data.get("name")
+        data = codec.loads(response.content)
+        return _remember_name(campaign_id, data.get("name"))
     except Exception as e:
-        app.logger.warning(f"Error obteniendo nombre de campaña {campaign_id}: {e}")
+        app.logger.warning("Error obteniendo nombre de campaña", extra=fields(object_id=campaign_id, error=e))
         return None
 
 def get_adset_name(adset_id: str) -> str:
     """Obtiene el nombre del adset desde Facebook Marketing API"""
     if not adset_id or not MKT_TOKEN:
         return None
+
+    if adset_id in _object_name_cache:
+        return _object_name_cache[adset_id]
     
     try:
         url = f"https://graph.facebook.com/v23.0/{adset_id}"
@@ -189,18 +282,21 @@ def get_adset_name(adset_id: str) -> str:
             "fields": "name",
             "access_token": MKT_TOKEN
         }
-        response = requests.get(url, params=params, timeout=10)
+        response = graph_session().get(url, params=params, timeout=GRAPH_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
-        return data.get("name")
+        data = codec.loads(response.content)
+        return _remember_name(adset_id, data.get("name"))
     except Exception as e:
-        app.logger.warning(f"Error obteniendo nombre de adset {adset_id}: {e}")
+        app.logger.warning("Error obteniendo nombre de adset", extra=fields(object_id=adset_id, error=e))
         return None
 
 def get_ad_name(ad_id: str) -> str:
     """Obtiene el nombre del anuncio desde Facebook Marketing API"""
     if not ad_id or not MKT_TOKEN:
         return None
+
+    if ad_id in _object_name_cache:
+        return _object_name_cache[ad_id]
     
     try:
         url = f"https://graph.facebook.com/v23.0/{ad_id}"
@@ -208,39 +304,14 @@ def get_ad_name(ad_id: str) -> str:
             "fields": "name",
             "access_token": MKT_TOKEN
         }
-        response = requests.get(url, params=params, timeout=10)
+        response = graph_session().get(url, params=params, timeout=GRAPH_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
-        return data.get("name")
+        data = codec.loads(response.content)
+        return _remember_name(ad_id, data.get("name"))
     except Exception as e:
-        app.logger.warning(f"Error obteniendo nombre de anuncio {ad_id}: {e}")
+        app.logger.warning("Error obteniendo nombre de anuncio", extra=fields(object_id=ad_id, error=e))
         return None
 
-def extract_sala_and_clean_name(ad_name: str) -> tuple:
-    """
-    Extrae la sala del nombre del anuncio y limpia el nombre.
-    
-    Ejemplos:
-    'S3 - De la Microscopía Óptica...' -> ('S3', 'De la Microscopía Óptica...')
-    'S1 - Determinación de Vida...' -> ('S1', 'Determinación de Vida...')
-    'Nombre sin sala' -> (None, 'Nombre sin sala')
-    """
-    if not ad_name:
-        return None, ad_name
-    
-    # Patrón para detectar sala: S1, S2, S3, S4, etc. seguido de " - "
-    import re
-    pattern = r'^(S\d+)\s*-\s*(.+)$'
-    match = re.match(pattern, ad_name.strip())
-    
-    if match:
-        sala = match.group(1)  # Ej: "S3"
-        clean_name = match.group(2).strip()  # Resto del nombre
-        return sala, clean_name
-    else:
-        # No se encontró patrón de sala
-        return None, ad_name
-
 def save_lead_to_file(lead_json: dict, leadgen_id: str):
     """Guarda el lead en un archivo JSON en la carpeta Leads_expokossodo"""
     if not SAVE_TO_FILE:
@@ -250,121 +321,85 @@ def save_lead_to_file(lead_json: dict, leadgen_id: str):
     filename = f"{LEADS_FOLDER}/lead_{leadgen_id}_{timestamp}.json"
     
     with open(filename, "w", encoding="utf-8") as f:
-        json.dump(lead_json, f, ensure_ascii=False, indent=2)
+        f.write(codec.dumps(lead_json, pretty=True))
     
-    app.logger.info(f"Lead guardado en archivo: {filename}")
+    app.logger.info("Lead guardado en archivo", extra=fields(lead_id=leadgen_id, path=filename, sampled=True))
 
-def save_lead_mysql(lead_json: dict, form_id: int, page_id: int):
-    """Inserta lead en MySQL con idempotencia y lo consolida en expokossodo_registros."""
-    if not all([DB_HOST, DB_NAME, DB_USER, DB_PASSWORD]):
+def save_lead_mysql(lead_json: dict, form_id: int, page_id: int, fence=None):
+    """
+    Inserta lead en MySQL con idempotencia y lo consolida en expokossodo_registros
+    (etapas parse -> enrich -> match -> persist de modules/pipeline.py).
+    Retorna False si el lead no pudo guardarse (queda pendiente en el journal).
+    Lanza resilience.DependencyUnavailable si el circuito de MySQL está abierto
+    y partitions.LeaseLost si fence (partition_worker.py) rechaza la consolidación.
+    """
+    if not db.is_configured():
         app.logger.warning("MySQL no configurado completamente. Solo guardando en archivo.")
-        return
+        return True
+    if not resilience.mysql.available():
+        # Se evita también el enriquecimiento por Graph API: el lead espera en el spool
+        raise resilience.DependencyUnavailable("mysql: circuito abierto")
 
-    full_name, email, phone, job_title, company_name = parse_common_fields(lead_json)
-    created_time = datetime.fromisoformat(lead_json["created_time"].replace("Z", "+00:00")).astimezone(timezone.utc)
-    payload = json.dumps(lead_json, ensure_ascii=False)
-    
-    # Obtener nombres desde Facebook Marketing API
-    campaign_name = get_campaign_name(lead_json.get("campaign_id"))
-    adset_name = get_adset_name(lead_json.get("adset_id"))
-    ad_name_raw = get_ad_name(lead_json.get("ad_id"))
-    
-    # Extraer sala y limpiar nombre del anuncio
-    sala, ad_name = extract_sala_and_clean_name(ad_name_raw)
+    started = time.perf_counter()
+    # Nombres desde Facebook Marketing API, antes de tomar una conexión del pool
+    leads = pipeline.enrich(
+        pipeline.parse_graph([(lead_json, form_id, page_id)]),
+        get_campaign_name, get_adset_name, get_ad_name
+    )
+    lead = next(leads)
+    enriched_at = time.perf_counter()
 
     try:
-        conn = pymysql.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            autocommit=True,
-            charset="utf8mb4",
-            cursorclass=pymysql.cursors.DictCursor,
-        )
-        
-        with conn.cursor() as cur:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS fb_leads (
-                  id BIGINT PRIMARY KEY,
-                  form_id BIGINT NOT NULL,
-                  page_id BIGINT NOT NULL,
-                  campaign_id VARCHAR(64) NULL,
-                  adset_id VARCHAR(64) NULL,
-                  ad_id VARCHAR(64) NULL,
-                  campaign_name VARCHAR(255) NULL,
-                  adset_name VARCHAR(255) NULL,
-                  ad_name VARCHAR(255) NULL,
-                  sala VARCHAR(10) NULL,
-                  full_name VARCHAR(255) NULL,
-                  email VARCHAR(255) NULL,
-                  phone VARCHAR(64) NULL,
-                  created_time DATETIME NOT NULL,
-                  raw_json JSON NOT NULL,
-                  procesado TINYINT(1) DEFAULT 0,
-                  enviado TINYINT(1) DEFAULT 0,
-                  ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            sql = """
-            INSERT INTO fb_leads (id, form_id, page_id, campaign_id, adset_id, ad_id,
-                                  campaign_name, adset_name, ad_name, sala,
-                                  full_name, email, phone, created_time, raw_json)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            ON DUPLICATE KEY UPDATE
-              campaign_id=VALUES(campaign_id),
-              adset_id=VALUES(adset_id),
-              ad_id=VALUES(ad_id),
-              campaign_name=VALUES(campaign_name),
-              adset_name=VALUES(adset_name),
-              ad_name=VALUES(ad_name),
-              sala=VALUES(sala),
-              full_name=VALUES(full_name),
-              email=VALUES(email),
-              phone=VALUES(phone),
-              raw_json=VALUES(raw_json);
-            """
-            cur.execute(sql, (
-                int(lead_json["id"]),
-                int(form_id),
-                int(page_id),
-                lead_json.get("campaign_id"),
-                lead_json.get("adset_id"),
-                lead_json.get("ad_id"),
-                campaign_name,
-                adset_name,
-                ad_name,
-                sala,
-                full_name,
-                email,
-                phone,
-                created_time.strftime("%Y-%m-%d %H:%M:%S"),
-                payload
-            ))
-            
-            # Preparar datos del lead para consolidación
-            lead_data = {
-                'id': int(lead_json["id"]),
-                'ad_name': ad_name,
-                'adset_name': adset_name,
-                'sala': sala,
-                'email': email,
-                'full_name': full_name,
-                'phone_number': phone,
-                'cargo': job_title,
-                'empresa': company_name
-            }
-            
-            # Consolidar el lead en expokossodo_registros
-            app.logger.info(f"Iniciando consolidación del lead {lead_json['id']} a expokossodo_registros...")
-            consolidate_lead_to_registros(lead_data, cur, conn)
-            
-        conn.close()
-        app.logger.info(f"Lead {lead_json['id']} guardado y consolidado exitosamente")
+        with resilience.mysql.call(), db.get_connection() as conn, conn.cursor() as cur:
+            lead, consolidated = next(pipeline.persist(pipeline.match([lead], cur), cur, conn, fence=fence))
+
+        app.logger.info("Lead guardado y consolidado", extra=fields(
+            lead_id=lead.id,
+            event_id=lead.event_id,
+            consolidated=consolidated,
+            enrich_ms=(enriched_at - started) * 1000,
+            persist_ms=(time.perf_counter() - enriched_at) * 1000
+        ))
+        return True
+    except (resilience.DependencyUnavailable, partitions.LeaseLost):
+        raise
     except Exception as e:
-        app.logger.exception(f"Error guardando/consolidando lead en MySQL: {e}")
+        app.logger.exception("Error guardando/consolidando lead en MySQL", extra=fields(lead_id=lead_json.get('id'), error=e))
+        return False
+
+def process_leadgen(leadgen_id: str, form_id, page_id, lead_json: dict = None, fence=None):
+    """
+    Obtiene, guarda y consolida un lead. Lanza excepción si no pudo completarse.
+    Si el lead ya se había obtenido (viene del spool) no se vuelve a consultar Graph API.
+    fence(cursor) se llama antes del commit de la consolidación (ver partitions.check_lease).
+    """
+    if lead_json is None:
+        started = time.perf_counter()
+        lead_json = fetch_lead(leadgen_id, page_id)
+        app.logger.info("Lead obtenido de Graph API", extra=fields(
+            lead_id=leadgen_id, fetch_ms=(time.perf_counter() - started) * 1000, sampled=True
+        ))
+        # Si MySQL falla, el reproceso usa este JSON sin depender de Graph API
+        lead_journal.attach_lead(leadgen_id, lead_json)
+
+    save_lead_to_file(lead_json, leadgen_id)
+
+    if not save_lead_mysql(lead_json, form_id, page_id, fence):
+        raise RuntimeError(f"No se pudo guardar el lead {leadgen_id} en MySQL")
+
+def enqueue_leadgen(leadgen_id: str, form_id, page_id, lead_json: dict = None):
+    """
+    Modo particionado: encola el lead en su partición para que lo procese un
+    partition_worker.py (que vuelve a obtenerlo de Graph API con el token de la página).
+    """
+    with resilience.mysql.call(), db.get_connection() as conn, conn.cursor() as cur:
+        partitions.ensure_partition_tables_ready(cur)
+        partition = partitions.enqueue_lead(cur, leadgen_id, form_id, page_id)
+    app.logger.info("Lead encolado", extra=fields(lead_id=leadgen_id, partition=partition, sampled=True))
+
+def dispatch_fn():
+    """Procesa en el worker que recibió el webhook (inline) o encola por partición (partitioned)."""
+    return enqueue_leadgen if partitions.is_partitioned() else process_leadgen
 
 @app.get("/facebook/webhook")
 def verify():
@@ -382,31 +417,65 @@ def verify():
 @app.post("/facebook/webhook")
 def receive():
     """Recibe los eventos de Facebook (POST)"""
-    if FB_APP_SECRET and not verify_signature(request):
+    # El cuerpo se lee una sola vez: la firma y el parseo usan el mismo buffer
+    try:
+        raw_body = codec.read_body(request)
+    except codec.BodyTooLarge as e:
+        app.logger.warning("Webhook rechazado", extra=fields(component="webhook", error=e))
+        return "Payload too large", 413
+
+    if FB_APP_SECRET and not verify_signature(raw_body, request.headers.get("X-Hub-Signature-256", "")):
         return "Invalid signature", 403
 
-    body = request.get_json(silent=True) or {}
-    
+    if _shutdown_event.is_set():
+        # Facebook reintenta las entregas que no reciben 200
+        return "Shutting down", 503
+
+    # Profiling opcional: 1 de cada PROFILE_SAMPLE_RATE peticiones o cabecera X-Profile firmada
+    profile = profiling.should_profile(raw_body, request.headers.get(profiling.PROFILE_HEADER, ""))
+    with profiling.profiled("webhook", enabled=profile):
+        return handle_webhook(raw_body)
+
+def handle_webhook(raw_body: bytes):
+    """Registra en el journal y procesa los leads de un webhook ya validado."""
+    try:
+        body = codec.loads(raw_body) if raw_body else {}
+    except ValueError:
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+
+    leads = []
     for entry in body.get("entry", []):
         for change in entry.get("changes", []):
             if change.get("field") == "leadgen":
                 value = change.get("value", {})
-                leadgen_id = value.get("leadgen_id")
-                form_id = value.get("form_id")
-                page_id = value.get("page_id")
-                
-                app.logger.info(f"Nuevo lead recibido: {leadgen_id}")
-
-                try:
-                    lead_json = fetch_lead(leadgen_id)
-                    
-                    save_lead_to_file(lead_json, leadgen_id)
-                    
-                    save_lead_mysql(lead_json, form_id, page_id)
-                    
-                except Exception as e:
-                    app.logger.exception(f"Error procesando lead {leadgen_id}: {e}")
-                    continue
+                leads.append((value.get("leadgen_id"), value.get("form_id"), value.get("page_id")))
+
+    # Registrar todos los leads antes de procesarlos: si el worker se apaga
+    # a mitad de camino, los pendientes se reprocesan en el próximo arranque
+    for leadgen_id, form_id, page_id in leads:
+        lead_journal.record_pending(leadgen_id, form_id, page_id)
+
+    dispatch = dispatch_fn()
+    for leadgen_id, form_id, page_id in leads:
+        if _shutdown_event.is_set():
+            app.logger.warning("Apagado en curso; lead queda en el journal", extra=fields(lead_id=leadgen_id))
+            continue
+
+        app.logger.info("Nuevo lead recibido", extra=fields(lead_id=leadgen_id, form_id=form_id, page_id=page_id))
+
+        with _track_inflight():
+            try:
+                dispatch(leadgen_id, form_id, page_id)
+                lead_journal.mark_done(leadgen_id)
+            except resilience.DependencyUnavailable as e:
+                # Se responde 200 igual: el lead queda en el spool y se reprocesa al cerrarse el circuito
+                lead_journal.release(leadgen_id)
+                app.logger.warning("Dependencia no disponible; lead queda en el spool", extra=fields(lead_id=leadgen_id, error=e))
+            except Exception as e:
+                lead_journal.release(leadgen_id)
+                app.logger.exception("Error procesando lead", extra=fields(lead_id=leadgen_id, error=e))
 
     return "OK", 200
 
@@ -423,8 +492,131 @@ def home():
 @app.route("/health")
 def health():
     """Endpoint de salud para monitoreo"""
-    return jsonify({"status": "healthy"}), 200
+    status = {
+        "status": "healthy",
+        "processing_mode": partitions.PROCESSING_MODE,
+        "dependencies": {"mysql": resilience.mysql.status(), "graph": resilience.graph.status()},
+        "spool_pending": lead_journal.pending_count()
+    }
+    if db.DB_QUERY_TIMING:
+        status["top_statements"] = [
+            {"sql": sql, "count": count, "total_ms": round(total_ms, 1), "max_ms": round(max_ms, 1)}
+            for sql, count, total_ms, max_ms in db.top_statements()
+        ]
+    return jsonify(status), 200
+
+def bearer_authorized(token: str) -> bool:
+    """Valida 'Authorization: Bearer <token>'. Sin token configurado no autoriza a nadie."""
+    auth = request.headers.get("Authorization", "")
+    supplied = auth[len("Bearer "):].strip() if auth.startswith("Bearer ") else ""
+    return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+
+@app.get("/stats")
+def stats():
+    """
+    Resumen de leads por campaña, sala, día y evento (cache de STATS_CACHE_TTL segundos).
+    Requiere 'Authorization: Bearer <STATS_TOKEN>'.
+    """
+    if not bearer_authorized(STATS_TOKEN):
+        return "Forbidden", 403
+
+    days = min(max(request.args.get("dias", default=30, type=int), 1), 366)
+    summary = lead_stats.cached_summary(days)
+    if summary is not None:
+        return jsonify(summary)
+
+    if not db.is_configured():
+        return jsonify({"error": "MySQL no configurado"}), 503
+    try:
+        with resilience.mysql.call(), db.get_connection() as conn, conn.cursor() as cur:
+            summary = lead_stats.load_summary(cur, days)
+    except resilience.DependencyUnavailable:
+        return jsonify({"error": "MySQL no disponible"}), 503
+    except Exception as e:
+        app.logger.exception("Error leyendo estadísticas", extra=fields(error=e))
+        return jsonify({"error": "Error leyendo estadísticas"}), 500
+    return jsonify(summary)
+
+@app.get("/export/registros")
+def export_registros():
+    """
+    Exporta en streaming los registros con sus eventos y QR (CSV o JSONL, gzip opcional).
+    Parámetros: formato, gzip=1, fecha, sala, evento_id, desde (incremental).
+    Requiere 'Authorization: Bearer <EXPORT_TOKEN>'.
+    """
+    if not bearer_authorized(EXPORT_TOKEN):
+        return "Forbidden", 403
+
+    fmt = request.args.get("formato", "csv")
+    if fmt not in exporter.EXPORT_FORMATS:
+        return jsonify({"error": f"formato debe ser uno de {', '.join(exporter.EXPORT_FORMATS)}"}), 400
+    compress = request.args.get("gzip") == "1"
+    filters = {
+        "fecha": request.args.get("fecha"),
+        "sala": request.args.get("sala"),
+        "evento_id": request.args.get("evento_id", type=int),
+        "since": request.args.get("desde"),
+    }
+
+    if not db.is_configured() or not resilience.mysql.available():
+        return jsonify({"error": "MySQL no disponible"}), 503
+
+    # Conexión propia (no del pool): se mantiene abierta mientras dura la descarga
+    conn = db.connect()
+    try:
+        with conn.cursor() as cur:
+            next_since = exporter.export_started_at(cur)
+            filters["updated_at"] = exporter.has_updated_column(cur)
+    except Exception:
+        conn.close()
+        raise
+
+    if filters["since"] and not filters["updated_at"]:
+        conn.close()
+        return jsonify({"error": "La exportación incremental requiere migrar expokossodo_registros (flask --app app migrate-registros)"}), 409
+
+    filename = f"registros_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}" + (".gz" if compress else "")
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "X-Export-Next-Since": str(next_since),
+    }
+    mimetype = "application/gzip" if compress else ("text/csv" if fmt == "csv" else "application/x-ndjson")
+    response = Response(exporter.export_stream(conn, fmt, compress, **filters), mimetype=mimetype, headers=headers)
+    # El servidor cierra la respuesta aunque el cliente se desconecte o nunca lea el cuerpo
+    response.call_on_close(conn.close)
+    return response
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Verifica el esquema de MySQL (uso: flask --app app init-db)."""
+    init_app()
+
+@app.cli.command("migrate-registros")
+def migrate_registros_command():
+    """Agrega actualizado_at e idx_actualizado a expokossodo_registros (uso: flask --app app migrate-registros)."""
+    conn = db.connect()
+    try:
+        with conn.cursor() as cur:
+            migrated = schema.migrate_registros(cur, conn)
+    finally:
+        conn.close()
+    if migrated:
+        app.logger.info("Migración de expokossodo_registros completada")
+
+@app.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    """Recalcula el resumen de estadísticas desde cero (uso: flask --app app rebuild-stats)."""
+    conn = db.connect()
+    try:
+        with conn.cursor() as cur:
+            rows = lead_stats.rebuild_stats(cur, conn)
+    finally:
+        conn.close()
+    app.logger.info("Resumen de estadísticas recalculado", extra=fields(component="stats", rows=rows))
 
 if __name__ == "__main__":
     init_app()
+    install_shutdown_handlers()
+    start_journal_replay()
+    start_slot_compaction()
     app.run(host="0.0.0.0", port=8000, debug=True)
\ No newline at end of file
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de los codecs JSON usados en el procesamiento de leads
+
+Compara la librería estándar 'json' contra 'orjson' (si está instalado) en las
+operaciones del camino caliente:
+1. Decodificar el cuerpo de un webhook de leadgen
+2. Decodificar la respuesta de Graph API de un lead
+3. Codificar el lead para la columna raw_json
+4. Decodificar/codificar eventos_seleccionados
+
+Uso:
+    python bench_codec.py [--number 20000]
+"""
+
+import argparse
+import json
+import timeit
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+WEBHOOK_BODY = json.dumps({
+    "object": "page",
+    "entry": [{
+        "id": "142158129158183",
+        "time": 1756740000,
+        "changes": [{
+            "field": "leadgen",
+            "value": {
+                "leadgen_id": "1234567890123456",
+                "form_id": "9876543210987654",
+                "page_id": "142158129158183",
+                "created_time": 1756740000
+            }
+        }]
+    }]
+}).encode("utf-8")
+
+LEAD_JSON = {
+    "id": "1234567890123456",
+    "created_time": "2025-09-01T15:04:05+0000",
+    "ad_id": "120000000000000001",
+    "adset_id": "120000000000000002",
+    "campaign_id": "120000000000000003",
+    "form_id": "9876543210987654",
+    "platform": "fb",
+    "field_data": [
+        {"name": "full_name", "values": ["José Pérez Núñez"]},
+        {"name": "email", "values": ["jose.perez@example.com"]},
+        {"name": "phone_number", "values": ["+51987654321"]},
+        {"name": "job_title", "values": ["Jefe de Laboratorio"]},
+        {"name": "company_name", "values": ["Laboratorios Químicos S.A.C."]},
+    ]
+}
+LEAD_BYTES = json.dumps(LEAD_JSON).encode("utf-8")
+EVENTOS = "[12, 15, 27, 31]"
+
+def stdlib_cases():
+    return {
+        "webhook loads": lambda: json.loads(WEBHOOK_BODY.decode("utf-8")),
+        "lead loads": lambda: json.loads(LEAD_BYTES.decode("utf-8")),
+        "raw_json dumps": lambda: json.dumps(LEAD_JSON, ensure_ascii=False),
+        "eventos roundtrip": lambda: json.dumps(json.loads(EVENTOS) + [40]),
+    }
+
+def orjson_cases():
+    return {
+        "webhook loads": lambda: orjson.loads(WEBHOOK_BODY),
+        "lead loads": lambda: orjson.loads(LEAD_BYTES),
+        "raw_json dumps": lambda: orjson.dumps(LEAD_JSON).decode("utf-8"),
+        # eventos_seleccionados se escribe siempre con el formato de json (codec.dumps_text)
+        "eventos roundtrip": lambda: json.dumps(orjson.loads(EVENTOS) + [40]),
+    }
+
+def run(cases, number):
+    """Retorna microsegundos por operación (mejor de 5 repeticiones)."""
+    return {
+        name: min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+        for name, fn in cases.items()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara json vs orjson")
+    parser.add_argument("--number", type=int, default=20000, help="Iteraciones por medición")
+    args = parser.parse_args()
+
+    stdlib = run(stdlib_cases(), args.number)
+    fast = run(orjson_cases(), args.number) if orjson else {}
+
+    print(f"{'operación':<20} {'json (µs)':>10} {'orjson (µs)':>12} {'speedup':>8}")
+    print("-" * 54)
+    for name, std_us in stdlib.items():
+        if name in fast:
+            print(f"{name:<20} {std_us:>10.2f} {fast[name]:>12.2f} {std_us / fast[name]:>7.1f}x")
+        else:
+            print(f"{name:<20} {std_us:>10.2f} {'-':>12} {'-':>8}")
+
+    if not orjson:
+        print("\n⚠️  orjson no está instalado (pip install orjson); solo se midió json")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Script para verificar los índices de las consultas de consolidación
+
+Este script:
+1. Revisa que existan los índices administrados (fb_leads, expokossodo_registros,
+   expokossodo_registro_eventos) y los crea con --create; también elimina los
+   índices reemplazados (idx_enviado)
+2. Ejecuta EXPLAIN sobre las consultas calientes y marca recorridos completos o filesort
+3. Termina con código 1 si alguna consulta no usa índice (útil en CI / despliegue)
+
+Uso:
+    python check_indexes.py [--create]
+"""
+
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+# Antes de importar 'modules': sus ajustes se leen del entorno al importarse
+load_dotenv()
+
+from modules import db
+from modules.log import setup_logging
+from modules.schema import drop_replaced_indexes, ensure_managed_indexes, explain_hot_queries
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica índices y planes de consulta")
+    parser.add_argument("--create", action="store_true", help="Crear los índices que falten y eliminar los reemplazados")
+    args = parser.parse_args()
+    setup_logging()
+
+    if not db.is_configured():
+        print("❌ Error: Variables de entorno de base de datos no configuradas")
+        return 1
+
+    connection = db.connect()
+    try:
+        with connection.cursor() as cursor:
+            print("🔧 Verificando índices administrados...")
+            missing = ensure_managed_indexes(cursor, connection, create=args.create)
+            if missing:
+                for table, index_name, columns in missing:
+                    print(f"   ⚠️  Falta {index_name} en {table} ({', '.join(columns)})")
+            else:
+                print("   ✅ Todos los índices administrados existen")
+            for table, index_name in drop_replaced_indexes(cursor, connection, drop=args.create):
+                print(f"   ⚠️  Índice redundante {index_name} en {table} (se elimina con --create)")
+
+            print("\n🔍 Planes de las consultas calientes (EXPLAIN):")
+            problems_found = False
+            for query_name, table, access_type, key, rows, problems in explain_hot_queries(cursor):
+                status = "❌" if problems else "✅"
+                detail = f" -> {', '.join(problems)}" if problems else ""
+                print(f"   {status} {query_name}: {table} type={access_type} key={key} rows={rows}{detail}")
+                problems_found = problems_found or bool(problems)
+    finally:
+        connection.close()
+
+    return 1 if problems_found or missing else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
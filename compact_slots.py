@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Script para consolidar los slots ocupados de expokossodo_eventos
+
+Este script:
+1. Compacta los incrementos pendientes de expokossodo_eventos_slots_delta en slots_ocupados
+2. Con --reconcile recalcula slots_ocupados desde expokossodo_registro_eventos
+   (una sola consulta agrupada) y descarta los incrementos pendientes
+
+Uso:
+    python compact_slots.py [--reconcile]
+"""
+
+import argparse
+
+from dotenv import load_dotenv
+
+# Antes de importar 'modules': sus ajustes se leen del entorno al importarse
+load_dotenv()
+
+from modules import db
+from modules.log import setup_logging
+from modules.slot_counter import compact_slot_increments, pending_increments, reconcile_slots
+
+def main():
+    parser = argparse.ArgumentParser(description="Compacta o reconcilia slots_ocupados")
+    parser.add_argument("--reconcile", action="store_true", help="Recalcular desde expokossodo_registro_eventos")
+    args = parser.parse_args()
+    setup_logging()
+
+    if not db.is_configured():
+        print("❌ Error: Variables de entorno de base de datos no configuradas")
+        return
+
+    connection = db.connect()
+    try:
+        with connection.cursor() as cursor:
+            pending = pending_increments(cursor)
+            print(f"📋 Incrementos pendientes: {sum(pending.values())} en {len(pending)} eventos")
+
+            if args.reconcile:
+                print("🔧 Reconciliando slots_ocupados desde expokossodo_registro_eventos...")
+                changed = reconcile_slots(cursor, connection)
+                if changed is None:
+                    print("⚠️  Hay una compactación en curso; intenta de nuevo en unos segundos")
+                else:
+                    print(f"✅ {changed} eventos corregidos")
+            else:
+                print("🔧 Compactando incrementos...")
+                totals = compact_slot_increments(cursor, connection)
+                if totals is None:
+                    print("⚠️  Otro proceso está compactando; intenta de nuevo en unos segundos")
+                else:
+                    for evento_id, total in sorted(totals.items()):
+                        print(f"   ➕ Evento {evento_id}: +{total}")
+                    print(f"✅ {len(totals)} eventos actualizados")
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Script para exportar los registros con sus eventos y QR (sistema de check-in)
+
+Este script:
+1. Recorre las inscripciones por páginas (keyset) con un cursor del lado del servidor
+2. Las escribe en CSV o JSONL, opcionalmente comprimido con gzip
+3. Filtra por fecha del evento, sala, evento o registros modificados desde una fecha
+4. Muestra el valor de --since para la próxima exportación incremental
+
+Uso:
+    python export_registros.py [--format csv|jsonl] [--gzip] [--fecha 2025-09-02]
+                               [--sala S1] [--evento-id 12] [--since "2025-09-01 18:00:00"]
+                               [--output archivo]
+"""
+
+import argparse
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# Antes de importar 'modules': sus ajustes se leen del entorno al importarse
+load_dotenv()
+
+from modules import db
+from modules.exporter import EXPORT_FORMATS, EXPORT_PAGE_SIZE, export_started_at, export_stream, has_updated_column
+
+EXPORTS_FOLDER = "exports"
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta registros con eventos y QR")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="Formato de salida (default csv)")
+    parser.add_argument("--gzip", action="store_true", help="Comprimir con gzip")
+    parser.add_argument("--fecha", help="Solo eventos de esta fecha (YYYY-MM-DD)")
+    parser.add_argument("--sala", help="Solo eventos de esta sala (ej. S1)")
+    parser.add_argument("--evento-id", type=int, help="Solo este evento")
+    parser.add_argument("--since", help="Solo registros modificados desde esta fecha/hora (exportación incremental)")
+    parser.add_argument("--page-size", type=int, default=EXPORT_PAGE_SIZE, help="Filas por página")
+    parser.add_argument("--output", help=f"Archivo de salida (default {EXPORTS_FOLDER}/registros_<fecha>.<formato>)")
+    args = parser.parse_args()
+
+    start_time = datetime.now()
+    print("🚀 EXPORTANDO REGISTROS")
+    print("=" * 60)
+
+    if not db.is_configured():
+        print("❌ Error: Variables de entorno de base de datos no configuradas")
+        return
+
+    output = args.output
+    if not output:
+        os.makedirs(EXPORTS_FOLDER, exist_ok=True)
+        extension = args.format + (".gz" if args.gzip else "")
+        output = os.path.join(EXPORTS_FOLDER, f"registros_{start_time.strftime('%Y%m%d_%H%M%S')}.{extension}")
+
+    connection = db.connect()
+    written = 0
+    try:
+        with connection.cursor() as cursor:
+            next_since = export_started_at(cursor)
+            updated_at = has_updated_column(cursor)
+
+        if not updated_at:
+            if args.since:
+                print("❌ Error: --since requiere la columna actualizado_at (flask --app app migrate-registros)")
+                return
+            print("⚠️  expokossodo_registros sin actualizado_at: exportación completa, sin modo incremental")
+
+        chunks = export_stream(
+            connection, args.format, args.gzip,
+            fecha=args.fecha, sala=args.sala, evento_id=args.evento_id,
+            since=args.since, page_size=args.page_size, updated_at=updated_at
+        )
+        tmp_output = f"{output}.tmp"
+        with open(tmp_output, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(tmp_output, output)
+    finally:
+        connection.close()
+
+    duration = (datetime.now() - start_time).total_seconds()
+    print(f"✅ Archivo: {output} ({written / 1024:.1f} KB)")
+    print(f"⏱️  Tiempo total: {duration:.2f} segundos")
+    if updated_at:
+        print(f"🔁 Próxima exportación incremental: --since \"{next_since}\"")
+
+if __name__ == "__main__":
+    main()
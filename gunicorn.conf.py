@@ -0,0 +1,31 @@
+# Configuración de gunicorn (se carga automáticamente desde el directorio de trabajo)
+import os
+import time
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Plazo que gunicorn da a un worker para terminar antes de matarlo (SIGKILL).
+# Debe ser mayor que SHUTDOWN_DRAIN_TIMEOUT para que el drenaje alcance a completar.
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# La verificación de esquema se puede desactivar si se corre aparte con 'flask --app app init-db'
+SCHEMA_CHECK_ON_START = os.environ.get("SCHEMA_CHECK_ON_START", "true").lower() == "true"
+
+def on_starting(server):
+    """Verifica el esquema una sola vez en el master, antes de crear los workers."""
+    if not SCHEMA_CHECK_ON_START:
+        return
+
+    started = time.perf_counter()
+    from app import init_app
+
+    init_app()
+    server.log.info(f"Inicialización completada en {(time.perf_counter() - started) * 1000:.0f} ms")
+
+def post_worker_init(worker):
+    """Instala el manejo de SIGTERM, reprocesa el journal e inicia la compactación de slots."""
+    from app import install_shutdown_handlers, start_journal_replay, start_slot_compaction
+
+    install_shutdown_handlers()
+    start_journal_replay()
+    start_slot_compaction()
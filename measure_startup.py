@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Script para medir el tiempo de arranque de la aplicación.
+
+Mide en procesos nuevos:
+1. Cuánto tarda 'import app' (lo que paga cada worker de gunicorn)
+2. Cuánto tarda init_app() (verificación de esquema, corre una vez en el master)
+
+Uso:
+    python measure_startup.py [--runs 10] [--init] [--importtime]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+IMPORT_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import app
+print(f"{(time.perf_counter() - t0) * 1000:.2f}")
+"""
+
+INIT_SNIPPET = """
+import time
+import app
+t0 = time.perf_counter()
+app.init_app()
+print(f"{(time.perf_counter() - t0) * 1000:.2f}")
+"""
+
+def run_snippet(snippet):
+    """Ejecuta el fragmento en un intérprete nuevo y retorna los milisegundos medidos."""
+    result = subprocess.run(
+        [sys.executable, "-c", snippet],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+def measure(snippet, runs):
+    samples = [run_snippet(snippet) for _ in range(runs)]
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "max": max(samples),
+    }
+
+def print_importtime(limit=15):
+    """Muestra los módulos que más tardan en importarse (python -X importtime)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # Formato: "import time:  self [us] | cumulative | module"
+        self_us, cumulative_us, module = [part.strip() for part in line.split(":", 1)[1].split("|")]
+        rows.append((int(cumulative_us), module))
+
+    print(f"\n📦 Top {limit} imports por tiempo acumulado:")
+    for cumulative_us, module in sorted(rows, reverse=True)[:limit]:
+        print(f"   {cumulative_us / 1000:8.2f} ms  {module}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el tiempo de arranque de app.py")
+    parser.add_argument("--runs", type=int, default=10, help="Cantidad de procesos a medir")
+    parser.add_argument("--init", action="store_true", help="Medir también init_app() (requiere MySQL)")
+    parser.add_argument("--importtime", action="store_true", help="Mostrar el desglose de imports")
+    args = parser.parse_args()
+
+    print(f"⏱️  Midiendo 'import app' en {args.runs} procesos...")
+    stats = measure(IMPORT_SNIPPET, args.runs)
+    print(f"   min {stats['min']:.2f} ms | mediana {stats['median']:.2f} ms | max {stats['max']:.2f} ms")
+
+    if args.init:
+        print(f"\n⏱️  Midiendo init_app() en {args.runs} procesos...")
+        stats = measure(INIT_SNIPPET, args.runs)
+        print(f"   min {stats['min']:.2f} ms | mediana {stats['median']:.2f} ms | max {stats['max']:.2f} ms")
+
+    if args.importtime:
+        print_importtime()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+
+from modules import db, lead_stats
+from modules.log import fields
+from modules.records import EventRecord
+from modules.slot_counter import pending_increments
+
+logger = logging.getLogger(__name__)
+
+# Cache en memoria (por proceso) de los eventos y sus cupos restantes.
+# Evita consultar expokossodo_eventos por cada lead y permite rechazar
+# inscripciones a eventos llenos antes de escribir.
+AVAILABILITY_TTL = float(os.environ.get("AVAILABILITY_TTL", 30))
+# Columna de expokossodo_eventos con la capacidad total del evento
+EVENT_CAPACITY_COLUMN = os.environ.get("EVENT_CAPACITY_COLUMN", "slots_disponibles")
+
+WAITLIST_TABLE = "expokossodo_lista_espera"
+
+_lock = threading.Lock()
+_events = []
+_remaining = {}
+_loaded_at = 0.0
+_capacity_enabled = True
+_waitlist_ready = False
+
+def refresh(cursor):
+    """
+    Recarga eventos y cupos desde la BD: capacidad - slots_ocupados - incrementos
+    aún no compactados. Si la columna de capacidad no existe (error 1054), solo
+    se cachean los eventos y no se limita la capacidad. Cualquier otro error
+    (conexión, timeout, deadlock) se propaga para que lo maneje el reintento.
+    """
+    global _events, _remaining, _loaded_at, _capacity_enabled
+
+    capacity_sql = f", {EVENT_CAPACITY_COLUMN} AS capacidad, slots_ocupados" if _capacity_enabled else ""
+    try:
+        cursor.execute(f"SELECT id, titulo_charla, fecha, sala{capacity_sql} FROM expokossodo_eventos")
+    except Exception as e:
+        if not _capacity_enabled or db.mysql_error_code(e) != db.ER_BAD_FIELD_ERROR:
+            raise
+        logger.warning("No se pudo leer la capacidad de eventos; sin control de cupos", extra=fields(component="availability", column=EVENT_CAPACITY_COLUMN, error=e))
+        _capacity_enabled = False
+        cursor.execute("SELECT id, titulo_charla, fecha, sala FROM expokossodo_eventos")
+    rows = cursor.fetchall()
+
+    remaining = {}
+    if _capacity_enabled:
+        pending = pending_increments(cursor)
+        for row in rows:
+            if row['capacidad'] is None:
+                continue
+            ocupados = (row['slots_ocupados'] or 0) + pending.get(row['id'], 0)
+            remaining[row['id']] = int(row['capacidad']) - ocupados
+
+    events = [EventRecord.from_row(row) for row in rows]
+    with _lock:
+        _events = events
+        _remaining = remaining
+        _loaded_at = time.monotonic()
+
+def _ensure_fresh(cursor):
+    if time.monotonic() - _loaded_at > AVAILABILITY_TTL:
+        refresh(cursor)
+
+def get_events(cursor):
+    """Lista de EventRecord para el matching (recargada como máximo cada AVAILABILITY_TTL segundos)."""
+    _ensure_fresh(cursor)
+    return _events
+
+def try_reserve(cursor, evento_id):
+    """
+    Descuenta un cupo del evento si queda alguno. Retorna False si el evento
+    está lleno. Los eventos sin capacidad configurada siempre aceptan.
+    """
+    _ensure_fresh(cursor)
+    with _lock:
+        remaining = _remaining.get(evento_id)
+        if remaining is None:
+            return True
+        if remaining <= 0:
+            return False
+        _remaining[evento_id] = remaining - 1
+        return True
+
+def release(evento_id):
+    """Devuelve un cupo reservado cuando la inscripción no llegó a escribirse."""
+    with _lock:
+        if evento_id in _remaining:
+            _remaining[evento_id] += 1
+
+def ensure_waitlist_table(cursor):
+    """Crea la tabla de lista de espera si no existe."""
+    global _waitlist_ready
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {WAITLIST_TABLE} (
+          id INT AUTO_INCREMENT PRIMARY KEY,
+          evento_id INT NOT NULL,
+          fb_lead_id BIGINT NULL,
+          registro_id INT NULL,
+          nombres VARCHAR(255) NULL,
+          correo VARCHAR(255) NULL,
+          numero VARCHAR(64) NULL,
+          empresa VARCHAR(255) NULL,
+          cargo VARCHAR(255) NULL,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          UNIQUE KEY uq_evento_correo (evento_id, correo)
+        )
+    """)
+    _waitlist_ready = True
+
+def add_to_waitlist(cursor, connection, evento_id, lead, registro_id=None):
+    """Registra el lead en la lista de espera del evento (idempotente por correo)."""
+    if not _waitlist_ready:
+        ensure_waitlist_table(cursor)
+    cursor.execute(f"""
+        INSERT IGNORE INTO {WAITLIST_TABLE}
+          (evento_id, fb_lead_id, registro_id, nombres, correo, numero, empresa, cargo)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        evento_id,
+        lead.id,
+        registro_id,
+        lead.full_name,
+        lead.email,
+        lead.phone or '',
+        lead.company_name or '',
+        lead.job_title or ''
+    ))
+    inserted = cursor.rowcount == 1
+    connection.commit()
+    if inserted:
+        # Fuera de la transacción del alta: un fallo del resumen no la deshace
+        lead_stats.record_event(cursor, connection, evento_id, "lista_espera")
+    logger.info("Evento lleno, lead agregado a la lista de espera", extra=fields(component="waitlist", lead_id=lead.id, evento_id=evento_id))
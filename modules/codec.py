@@ -0,0 +1,66 @@
+import hashlib
+import hmac
+import json
+import os
+
+# orjson es opcional: si está instalado se usa para todo encode/decode de JSON
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+# Tamaño máximo del cuerpo de un webhook (las notificaciones de leadgen pesan pocos KB)
+MAX_BODY_BYTES = int(os.environ.get("WEBHOOK_MAX_BODY_BYTES", 256 * 1024))
+
+class BodyTooLarge(Exception):
+    """El cuerpo de la petición supera MAX_BODY_BYTES."""
+
+def loads(data):
+    """Decodifica JSON desde bytes o str. Lanza ValueError si no es JSON válido."""
+    if orjson:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+def dumps(obj, pretty=False):
+    """
+    Codifica a JSON (str) sin escapar caracteres no ASCII. Sin pretty el
+    resultado compacto de orjson ('[1,2]') difiere del de json ('[1, 2]'):
+    usar solo donde el consumidor parsea el JSON; si no, dumps_text.
+    """
+    if orjson:
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2 if pretty else None)
+
+def dumps_text(obj):
+    """
+    Codifica con el formato exacto de json.dumps (separadores ', ' y ': '),
+    con o sin orjson. Para columnas de texto que leen otros sistemas, como
+    eventos_seleccionados (check-in): su contenido no debe depender del backend.
+    """
+    return json.dumps(obj)
+
+def read_body(req, max_bytes=MAX_BODY_BYTES):
+    """
+    Lee el cuerpo de la petición una sola vez, rechazando los que superen
+    max_bytes antes de leerlos (por Content-Length) o al leerlos.
+    """
+    if req.content_length is not None and req.content_length > max_bytes:
+        raise BodyTooLarge(f"Content-Length {req.content_length} > {max_bytes}")
+
+    body = req.stream.read(max_bytes + 1)
+    if len(body) > max_bytes:
+        raise BodyTooLarge(f"Cuerpo mayor a {max_bytes} bytes")
+    return body
+
+def verify_hmac_sha256(secret, body, signature_header):
+    """Valida una firma 'sha256=<hex>' (X-Hub-Signature-256) sobre el mismo buffer leído."""
+    if not signature_header or not signature_header.startswith("sha256="):
+        return False
+    received = signature_header.split("=", 1)[1]
+    digest = hmac.new(secret, msg=body, digestmod=hashlib.sha256).hexdigest()
+    return hmac.compare_digest(received, digest)
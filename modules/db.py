@@ -0,0 +1,197 @@
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# pymysql se importa al crear la primera conexión para que 'import app' sea liviano
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 4))
+# Un MySQL caído debe fallar rápido (y abrir el circuito) en vez de bloquear al worker
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", 5))
+# Tiempo máximo de lectura/escritura por consulta; 0 = sin límite
+DB_QUERY_TIMEOUT = int(os.environ.get("DB_QUERY_TIMEOUT", 0))
+# Acumula tiempos por sentencia en todo el proceso (además de las capturas de profiling)
+DB_QUERY_TIMING = os.environ.get("DB_QUERY_TIMING", "false").lower() == "true"
+
+# Código de error de MySQL: columna desconocida
+ER_BAD_FIELD_ERROR = 1054
+# Códigos de error de MySQL por falta de privilegios (base, tabla, operación)
+PRIVILEGE_ERRORS = {1044, 1142, 1227}
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_cursor_class = None
+_query_stats = {}
+_query_stats_lock = threading.Lock()
+_capture = threading.local()
+
+def db_settings():
+    """Lee la configuración de MySQL del entorno (después de load_dotenv)."""
+    return {
+        "host": os.environ.get("DB_HOST"),
+        "database": os.environ.get("DB_NAME"),
+        "user": os.environ.get("DB_USER"),
+        "password": os.environ.get("DB_PASSWORD"),
+        "port": int(os.environ.get("DB_PORT", 3306)),
+    }
+
+def is_configured():
+    """Indica si las variables de entorno de MySQL están completas."""
+    settings = db_settings()
+    return all([settings["host"], settings["database"], settings["user"], settings["password"]])
+
+def connect(autocommit=True):
+    """Abre una conexión nueva (sin pool), con el mismo formato que usa toda la app."""
+    import pymysql
+
+    return pymysql.connect(
+        **db_settings(),
+        autocommit=autocommit,
+        charset="utf8mb4",
+        cursorclass=timed_cursor_class(),
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        read_timeout=DB_QUERY_TIMEOUT or None,
+        write_timeout=DB_QUERY_TIMEOUT or None,
+    )
+
+def mysql_error_code(error):
+    """
+    Código de error de MySQL (ej. 1054) si 'error' es una OperationalError o
+    InternalError de pymysql; None para cualquier otra excepción.
+    """
+    import pymysql
+
+    if isinstance(error, (pymysql.err.OperationalError, pymysql.err.InternalError)) and error.args:
+        return error.args[0]
+    return None
+
+def is_connection_error(error):
+    """
+    Indica si el error deja la conexión (o el servidor) en duda: OperationalError
+    (caída, timeout, deadlock) o InterfaceError. Los demás errores de pymysql y
+    los de la aplicación no invalidan la conexión.
+    """
+    import pymysql
+
+    return isinstance(error, (pymysql.err.OperationalError, pymysql.err.InterfaceError))
+
+def _statement_key(query):
+    """Normaliza la sentencia para agrupar: espacios colapsados y sin literales numéricos."""
+    text = re.sub(r"\s+", " ", query if isinstance(query, str) else query.decode("utf-8", "replace")).strip()
+    return re.sub(r"\b\d+\b", "?", text)[:200]
+
+def _add_timing(stats, key, seconds):
+    entry = stats.get(key)
+    if entry is None:
+        stats[key] = [1, seconds, seconds]
+    else:
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+def _record_query(query, seconds):
+    key = _statement_key(query)
+    captured = getattr(_capture, "stats", None)
+    if captured is not None:
+        _add_timing(captured, key, seconds)
+    if DB_QUERY_TIMING:
+        with _query_stats_lock:
+            _add_timing(_query_stats, key, seconds)
+
+def timed_cursor_class():
+    """
+    DictCursor que mide cada execute() cuando hay una captura activa en el hilo
+    (capture_queries) o DB_QUERY_TIMING=true. Sin medición el costo es un if.
+    """
+    global _cursor_class
+    if _cursor_class is None:
+        import pymysql.cursors
+
+        class TimedDictCursor(pymysql.cursors.DictCursor):
+            def execute(self, query, args=None):
+                if not DB_QUERY_TIMING and getattr(_capture, "stats", None) is None:
+                    return super().execute(query, args)
+                started = time.perf_counter()
+                try:
+                    return super().execute(query, args)
+                finally:
+                    _record_query(query, time.perf_counter() - started)
+
+        _cursor_class = TimedDictCursor
+    return _cursor_class
+
+@contextmanager
+def capture_queries():
+    """
+    Captura los tiempos de las consultas ejecutadas en este hilo.
+    Entrega un dict {sentencia: [cantidad, segundos_total, segundos_max]}.
+    """
+    previous = getattr(_capture, "stats", None)
+    _capture.stats = {}
+    try:
+        yield _capture.stats
+    finally:
+        _capture.stats = previous
+
+def top_statements(stats=None, limit=10):
+    """
+    Las sentencias con más tiempo acumulado: de una captura, o del acumulado
+    del proceso (DB_QUERY_TIMING) si no se indica.
+
+    Returns:
+        list: [(sentencia, cantidad, total_ms, max_ms)]
+    """
+    if stats is None:
+        with _query_stats_lock:
+            stats = dict(_query_stats)
+    ranked = sorted(stats.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+    return [(key, count, total * 1000, worst * 1000) for key, (count, total, worst) in ranked]
+
+def _get_pool():
+    """Crea el pool en el primer uso. Tras un fork se crea uno nuevo por proceso."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+                _pool_pid = os.getpid()
+    return _pool
+
+@contextmanager
+def get_connection():
+    """
+    Entrega una conexión del pool (autocommit=True) y la devuelve al terminar.
+    Si la conexión falla durante el uso (is_connection_error) se descarta en
+    lugar de reutilizarse; otros errores la devuelven al pool.
+    """
+    pool = _get_pool()
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = connect()
+    else:
+        try:
+            conn.ping(reconnect=True)
+        except Exception:
+            conn = connect()
+
+    try:
+        yield conn
+    except Exception as e:
+        if is_connection_error(e):
+            try:
+                conn.close()
+            except Exception:
+                pass
+            conn = None
+        raise
+    finally:
+        if conn is not None:
+            try:
+                pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
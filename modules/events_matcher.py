@@ -1,6 +1,11 @@
+import logging
 import re
 from datetime import datetime
 
+from modules.log import fields
+
+logger = logging.getLogger(__name__)
+
 def normalize_by_45_char(title):
     """Limpia sufijos y corta a 40 caracteres."""
     if not title: return ""
@@ -17,7 +22,8 @@ def normalize_by_colon(title):
 def find_event_id(ad_name, adset_name, sala, all_events):
     """
     Encuentra el ID del evento correspondiente usando la lógica de dos pasos.
-    Retorna el event_id o None si no se encuentra.
+    all_events son EventRecord (modules/records.py), con las claves de cada
+    título ya normalizadas. Retorna el event_id o None si no se encuentra.
     """
     date_map = {'dia 1': '2025-09-02', 'dia 2': '2025-09-03', 'dia 3': '2025-09-04'}
     sala_map = {'s1': 'sala1', 's2': 'sala2', 's3': 'sala3', 's4': 'sala4'}
@@ -26,31 +32,28 @@ def find_event_id(ad_name, adset_name, sala, all_events):
     target_sala = sala_map.get(sala.lower() if sala else '')
     
     if not target_date or not target_sala:
-        print(f"[WARNING] No se pudo mapear Día o Sala para: {adset_name} / {sala}")
+        logger.warning("No se pudo mapear Día o Sala", extra=fields(component="match", adset_name=adset_name, sala=sala))
         return None
     
     # Intento #1: 40 Caracteres
     normalized_lead_title_45 = normalize_by_45_char(ad_name)
     for event in all_events:
-        event_date = event['fecha'].strftime('%Y-%m-%d') if event['fecha'] else ''
-        if (target_date == event_date and
-            target_sala == event['sala'] and
-            normalized_lead_title_45 == normalize_by_45_char(event['titulo_charla'])):
-            print(f"[MATCH] Evento encontrado por método 40 caracteres: ID {event['id']}")
-            return event['id']
+        if (target_date == event.fecha_iso and
+            target_sala == event.sala and
+            normalized_lead_title_45 == event.key_45):
+            logger.info("Evento encontrado", extra=fields(component="match", event_id=event.id, metodo="40_caracteres", sampled=True))
+            return event.id
     
     # Intento #2: Dos Puntos
     normalized_lead_title_colon = normalize_by_colon(ad_name)
     if normalized_lead_title_colon:
         for event in all_events:
-            normalized_event_title_colon = normalize_by_colon(event['titulo_charla'])
-            event_date = event['fecha'].strftime('%Y-%m-%d') if event['fecha'] else ''
-            if (normalized_event_title_colon and
-                target_date == event_date and
-                target_sala == event['sala'] and
-                normalized_lead_title_colon == normalized_event_title_colon):
-                print(f"[MATCH] Evento encontrado por método dos puntos: ID {event['id']}")
-                return event['id']
+            if (event.key_colon and
+                target_date == event.fecha_iso and
+                target_sala == event.sala and
+                normalized_lead_title_colon == event.key_colon):
+                logger.info("Evento encontrado", extra=fields(component="match", event_id=event.id, metodo="dos_puntos", sampled=True))
+                return event.id
     
-    print(f"[WARNING] No se encontró evento para: {ad_name}")
+    logger.warning("No se encontró evento", extra=fields(component="match", ad_name=ad_name))
     return None
\ No newline at end of file
@@ -0,0 +1,147 @@
+import csv
+import io
+import os
+import zlib
+from datetime import date, datetime
+
+from modules import codec
+
+# Exportación de registros con sus eventos y QR para el sistema de check-in.
+# Se pagina por clave (registro_id, evento_id) en lugar de OFFSET y cada página
+# se lee con un cursor del lado del servidor: la memoria no depende de la
+# cantidad de asistentes.
+EXPORT_PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", 2000))
+EXPORT_FORMATS = ("csv", "jsonl")
+
+# Una fila por inscripción (registro + evento)
+EXPORT_COLUMNS = (
+    "registro_id", "nombres", "correo", "empresa", "cargo", "numero", "qr_code",
+    "evento_id", "titulo_charla", "fecha", "sala", "actualizado_at",
+)
+
+EXPORT_SQL = """
+    SELECT re.registro_id, r.nombres, r.correo, r.empresa, r.cargo, r.numero, r.qr_code,
+           re.evento_id, e.titulo_charla, e.fecha, e.sala, {actualizado_at}
+    FROM expokossodo_registro_eventos re
+    JOIN expokossodo_registros r ON r.id = re.registro_id
+    JOIN expokossodo_eventos e ON e.id = re.evento_id
+    WHERE (re.registro_id > %s OR (re.registro_id = %s AND re.evento_id > %s))
+    {filters}
+    ORDER BY re.registro_id, re.evento_id
+    LIMIT %s
+"""
+
+def export_started_at(cursor):
+    """
+    Hora del servidor MySQL al iniciar la exportación. Es el valor a usar como
+    'desde' en la siguiente exportación incremental (las filas que cambien
+    durante la exportación se repiten en la próxima, no se pierden).
+    """
+    cursor.execute("SELECT NOW() AS ahora")
+    return cursor.fetchone()['ahora']
+
+def has_updated_column(cursor):
+    """
+    Indica si expokossodo_registros ya tiene actualizado_at (se agrega con
+    'flask --app app migrate-registros'). Sin la columna la exportación sale
+    completa, con actualizado_at vacío, y no admite 'since'.
+    """
+    cursor.execute("SHOW COLUMNS FROM expokossodo_registros LIKE 'actualizado_at'")
+    return cursor.fetchone() is not None
+
+def _build_filters(fecha=None, sala=None, evento_id=None, since=None):
+    clauses = []
+    params = []
+    if fecha:
+        clauses.append("AND DATE(e.fecha) = %s")
+        params.append(fecha)
+    if sala:
+        clauses.append("AND e.sala = %s")
+        params.append(sala)
+    if evento_id:
+        clauses.append("AND re.evento_id = %s")
+        params.append(int(evento_id))
+    if since:
+        clauses.append("AND r.actualizado_at >= %s")
+        params.append(since)
+    return "\n    ".join(clauses), params
+
+def iter_rows(connection, fecha=None, sala=None, evento_id=None, since=None, page_size=EXPORT_PAGE_SIZE, updated_at=True):
+    """
+    Recorre las inscripciones filtradas por fecha del evento, sala, evento y/o
+    'since' (registros modificados desde esa fecha), página por página.
+    updated_at=False si la tabla no tiene actualizado_at (ver has_updated_column).
+    """
+    import pymysql.cursors
+
+    filters, filter_params = _build_filters(fecha, sala, evento_id, since)
+    sql = EXPORT_SQL.format(filters=filters, actualizado_at="r.actualizado_at" if updated_at else "NULL AS actualizado_at")
+    last_registro, last_evento = 0, 0
+
+    while True:
+        fetched = 0
+        with connection.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(sql, (last_registro, last_registro, last_evento, *filter_params, page_size))
+            for row in cursor:
+                fetched += 1
+                last_registro, last_evento = row['registro_id'], row['evento_id']
+                yield row
+        if fetched < page_size:
+            return
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def encode_csv(rows, rows_per_chunk=500):
+    """Codifica las filas como CSV (con encabezado), en bloques de texto."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_plain(row[column]) for column in EXPORT_COLUMNS])
+        if i % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def encode_jsonl(rows, rows_per_chunk=500):
+    """Codifica las filas como JSON Lines, en bloques de texto."""
+    lines = []
+    for row in rows:
+        lines.append(codec.dumps({column: _plain(row[column]) for column in EXPORT_COLUMNS}))
+        if len(lines) >= rows_per_chunk:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def gzip_chunks(chunks):
+    """Comprime en streaming (formato gzip) un iterador de bloques de bytes."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_stream(connection, fmt="csv", compress=False, **filters):
+    """
+    Genera la exportación como bloques de bytes listos para escribir a un
+    archivo o enviar en una respuesta HTTP.
+
+    Args:
+        fmt: 'csv' o 'jsonl'
+        compress: comprimir con gzip
+        filters: fecha, sala, evento_id, since, page_size, updated_at (ver iter_rows)
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    if filters.get("since") and not filters.get("updated_at", True):
+        raise ValueError("La exportación incremental requiere la columna actualizado_at (flask --app app migrate-registros)")
+
+    encode = encode_csv if fmt == "csv" else encode_jsonl
+    chunks = (text.encode("utf-8") for text in encode(iter_rows(connection, **filters)))
+    return gzip_chunks(chunks) if compress else chunks
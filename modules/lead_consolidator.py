@@ -1,122 +1,158 @@
-import json
+import logging
+import time
 from datetime import datetime
+from modules import availability, codec, lead_stats
 from modules.events_matcher import find_event_id
 from modules.qr_generator import generate_qr_text
+from modules.log import fields
+from modules.partitions import LeaseLost
+from modules.slot_counter import ensure_slot_deltas_ready, record_slot_increment
 
-def _create_registro_evento_relation(cursor, connection, registro_id, evento_id):
+logger = logging.getLogger(__name__)
+
+def _create_registro_evento_relation(cursor, registro_id, evento_id):
     """
-    Crea la relación en expokossodo_registro_eventos y actualiza slots_ocupados.
+    Crea la relación en expokossodo_registro_eventos y registra el incremento de
+    slots_ocupados (se compacta luego en expokossodo_eventos, ver slot_counter),
+    dentro de la transacción del llamador: los errores se propagan.
     Verifica duplicados antes de insertar.
+
+    Returns:
+        bool: True si la relación se creó, False si ya existía
     """
-    try:
-        # 1. Verificar si la relación ya existe
-        cursor.execute("""
-            SELECT 1 FROM expokossodo_registro_eventos 
-            WHERE registro_id = %s AND evento_id = %s
-            LIMIT 1
-        """, (registro_id, evento_id))
-        
-        existe = cursor.fetchone()
-        if existe:
-            print(f"[INFO] Relación registro {registro_id} - evento {evento_id} ya existe")
-            return True
-        
-        # 2. Insertar la relación registro-evento
-        cursor.execute("""
-            INSERT INTO expokossodo_registro_eventos (registro_id, evento_id)
-            VALUES (%s, %s)
-        """, (registro_id, evento_id))
-        
-        # 3. Actualizar contador de slots ocupados en la tabla eventos
-        cursor.execute("""
-            UPDATE expokossodo_eventos 
-            SET slots_ocupados = slots_ocupados + 1 
-            WHERE id = %s
-        """, (evento_id,))
-        
-        connection.commit()
-        print(f"[RELATION] Creada relación registro {registro_id} - evento {evento_id} y actualizado slots")
-        return True
-        
-    except Exception as e:
-        print(f"[ERROR] Error creando relación registro-evento: {e}")
-        connection.rollback()
+    # 1. Verificar si la relación ya existe
+    cursor.execute("""
+        SELECT 1 FROM expokossodo_registro_eventos 
+        WHERE registro_id = %s AND evento_id = %s
+        LIMIT 1
+    """, (registro_id, evento_id))
+    
+    existe = cursor.fetchone()
+    if existe:
+        logger.info("Relación ya existe", extra=fields(component="consolidator", registro_id=registro_id, evento_id=evento_id, sampled=True))
         return False
+    
+    # 2. Insertar la relación
+    cursor.execute("""
+        INSERT INTO expokossodo_registro_eventos (registro_id, evento_id)
+        VALUES (%s, %s)
+    """, (registro_id, evento_id))
+    
+    # 3. Registrar el slot ocupado sin bloquear la fila del evento
+    record_slot_increment(cursor, evento_id)
+    return True
+
+def _commit(cursor, connection, fence):
+    """Confirma la transacción; con fence verifica antes el lease de la partición."""
+    if fence:
+        fence(cursor)
+    connection.commit()
 
-def consolidate_lead_to_registros(lead_data, cursor, connection):
+def match_event(lead, cursor):
     """
-    Consolida un lead de Facebook a la tabla expokossodo_registros.
+    Busca el evento del lead (eventos desde el cache en memoria) y lo guarda en
+    lead.event_id: el id del evento, o 0 si no se encontró.
+    """
+    lead.event_id = find_event_id(
+        lead.ad_name,
+        lead.adset_name,
+        lead.sala,
+        availability.get_events(cursor)
+    ) or 0
+    return lead.event_id
+
+def consolidate_lead_to_registros(lead, cursor, connection, fence=None):
+    """
+    Consolida un lead de Facebook a la tabla expokossodo_registros. El registro,
+    la relación con el evento y el incremento de slots van en una sola transacción.
     
     Args:
-        lead_data: Diccionario con los datos del lead
+        lead: LeadRecord (modules/records.py); si aún no tiene event_id se hace el matching
         cursor: Cursor de MySQL
         connection: Conexión MySQL para hacer commit
+        fence: fence(cursor) se llama antes del commit y lanza LeaseLost si el
+            worker perdió la partición (partitions.check_lease); None fuera del
+            modo particionado
     
     Returns:
         bool: True si se procesó correctamente, False si hubo error
     """
+    started = time.perf_counter()
+    reserved = False
     try:
-        # 1. Obtener todos los eventos para el matching
-        cursor.execute("SELECT id, titulo_charla, fecha, sala FROM expokossodo_eventos")
-        all_events = cursor.fetchall()
-        
-        # 2. Encontrar el ID del evento correspondiente
-        event_id = find_event_id(
-            lead_data['ad_name'],
-            lead_data['adset_name'],
-            lead_data['sala'],
-            all_events
-        )
+        # 1-2. Encontrar el ID del evento (normalmente ya lo resolvió la etapa de matching)
+        if lead.event_id is None:
+            match_event(lead, cursor)
+        event_id = lead.event_id
         
+        matched_at = time.perf_counter()
         if not event_id:
-            print(f"[WARNING] No se pudo encontrar evento para lead ID {lead_data['id']}")
+            logger.warning("No se pudo encontrar evento para el lead", extra=fields(component="consolidator", lead_id=lead.id))
             return False
         
         # 3. Verificar si ya existe un registro con este correo
         cursor.execute(
             "SELECT id, eventos_seleccionados FROM expokossodo_registros WHERE correo = %s",
-            (lead_data['email'],)
+            (lead.email,)
         )
         existing_registro = cursor.fetchone()
         
         if existing_registro:
             # 4a. Si existe, actualizar eventos_seleccionados si es necesario
-            eventos_actuales = json.loads(existing_registro['eventos_seleccionados']) if existing_registro['eventos_seleccionados'] else []
+            eventos_actuales = codec.loads(existing_registro['eventos_seleccionados']) if existing_registro['eventos_seleccionados'] else []
+            
+            if event_id in eventos_actuales:
+                logger.info("El evento ya está en el registro", extra=fields(component="consolidator", lead_id=lead.id, event_id=event_id, registro_id=existing_registro['id'], sampled=True))
             
-            if event_id not in eventos_actuales:
+            elif not availability.try_reserve(cursor, event_id):
+                # Evento lleno: el lead va a la lista de espera
+                availability.add_to_waitlist(cursor, connection, event_id, lead, existing_registro['id'])
+            
+            else:
                 # Agregar el nuevo evento
+                reserved = True
                 eventos_actuales.append(event_id)
-                eventos_json = json.dumps(eventos_actuales)
+                eventos_json = codec.dumps_text(eventos_actuales)
                 
+                ensure_slot_deltas_ready(cursor)
+                connection.begin()
                 cursor.execute(
                     """UPDATE expokossodo_registros 
                        SET eventos_seleccionados = %s
                        WHERE id = %s""",
                     (eventos_json, existing_registro['id'])
                 )
-                connection.commit()
-                print(f"[UPDATE] Agregado evento {event_id} al registro existente ID {existing_registro['id']}")
-                
                 # Crear relación en expokossodo_registro_eventos
-                _create_registro_evento_relation(cursor, connection, existing_registro['id'], event_id)
-            else:
-                print(f"[INFO] El evento {event_id} ya está en el registro ID {existing_registro['id']}")
+                created = _create_registro_evento_relation(cursor, existing_registro['id'], event_id)
+                _commit(cursor, connection, fence)
+                reserved = False
+                logger.info("Evento agregado al registro existente", extra=fields(component="consolidator", lead_id=lead.id, event_id=event_id, registro_id=existing_registro['id'], sampled=True))
+                if created:
+                    # Resumen en su propia transacción, después del commit
+                    lead_stats.record_event(cursor, connection, event_id)
+        
+        elif not availability.try_reserve(cursor, event_id):
+            # 4b. Evento lleno y correo nuevo: solo lista de espera
+            availability.add_to_waitlist(cursor, connection, event_id, lead)
         
         else:
-            # 4b. Si no existe, crear nuevo registro
+            # 4c. Si no existe, crear nuevo registro
+            reserved = True
             
             # Generar QR con datos reales
             qr_code = generate_qr_text(
-                lead_data['full_name'],
-                lead_data['phone_number'] or '',
-                lead_data.get('cargo') or '',
-                lead_data.get('empresa') or ''
+                lead.full_name,
+                lead.phone or '',
+                lead.job_title or '',
+                lead.company_name or ''
             )
             
             # Preparar datos para inserción
-            eventos_json = json.dumps([event_id])
+            eventos_json = codec.dumps_text([event_id])
             fecha_actual = datetime.now()
             
+            ensure_slot_deltas_ready(cursor)
+            connection.begin()
             cursor.execute(
                 """INSERT INTO expokossodo_registros 
                    (nombres, correo, empresa, cargo, numero, expectativas, 
@@ -124,11 +160,11 @@ def consolidate_lead_to_registros(lead_data, cursor, connection):
                     asistencia_general_confirmada, fecha_registro, confirmado)
                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
                 (
-                    lead_data['full_name'],
-                    lead_data['email'],
-                    lead_data.get('empresa') or '',
-                    lead_data.get('cargo') or '',
-                    lead_data['phone_number'] or '',
+                    lead.full_name,
+                    lead.email,
+                    lead.company_name or '',
+                    lead.job_title or '',
+                    lead.phone or '',
                     '',  # expectativas vacías
                     eventos_json,
                     qr_code,
@@ -138,26 +174,42 @@ def consolidate_lead_to_registros(lead_data, cursor, connection):
                     0   # confirmado = false
                 )
             )
-            connection.commit()
             new_registro_id = cursor.lastrowid
-            print(f"[INSERT] Nuevo registro creado con ID {new_registro_id} para {lead_data['email']}")
             
             # Crear relación en expokossodo_registro_eventos
-            _create_registro_evento_relation(cursor, connection, new_registro_id, event_id)
+            created = _create_registro_evento_relation(cursor, new_registro_id, event_id)
+            _commit(cursor, connection, fence)
+            reserved = False
+            logger.info("Nuevo registro creado", extra=fields(component="consolidator", lead_id=lead.id, registro_id=new_registro_id, event_id=event_id, sampled=True))
+            if created:
+                lead_stats.record_event(cursor, connection, event_id)
         
         # 5. Marcar el lead como procesado y enviado
         cursor.execute(
             "UPDATE fb_leads SET procesado = 1, enviado = 1 WHERE id = %s",
-            (lead_data['id'],)
+            (lead.id,)
         )
         connection.commit()
-        print(f"[SUCCESS] Lead ID {lead_data['id']} marcado como procesado y enviado")
+        logger.info("Lead consolidado", extra=fields(
+            component="consolidator",
+            lead_id=lead.id,
+            event_id=event_id,
+            match_ms=(matched_at - started) * 1000,
+            write_ms=(time.perf_counter() - matched_at) * 1000,
+            sampled=True
+        ))
         
         return True
         
     except Exception as e:
-        print(f"[ERROR] Error consolidando lead ID {lead_data['id']}: {e}")
         connection.rollback()
+        if reserved:
+            # El cupo reservado no llegó a escribirse
+            availability.release(lead.event_id)
+        if isinstance(e, LeaseLost):
+            # El lead queda para el nuevo dueño de la partición
+            raise
+        logger.error("Error consolidando lead", extra=fields(component="consolidator", lead_id=lead.id, error=e))
         return False
 
 def ensure_procesado_column(cursor, connection):
@@ -174,15 +226,15 @@ def ensure_procesado_column(cursor, connection):
         """)
         
         if not cursor.fetchone():
-            print("[INFO] Agregando columna 'procesado' a tabla fb_leads...")
+            logger.info("Agregando columna", extra=fields(component="schema", table="fb_leads", column="procesado"))
             cursor.execute("""
                 ALTER TABLE fb_leads 
                 ADD COLUMN procesado TINYINT(1) DEFAULT 0
             """)
             connection.commit()
-            print("[SUCCESS] Columna 'procesado' agregada exitosamente")
+            logger.info("Columna agregada", extra=fields(component="schema", table="fb_leads", column="procesado"))
         else:
-            print("[INFO] Columna 'procesado' ya existe en fb_leads")
+            logger.info("Columna ya existe", extra=fields(component="schema", table="fb_leads", column="procesado"))
         
         # Verificar columna 'enviado'
         cursor.execute("""
@@ -193,15 +245,15 @@ def ensure_procesado_column(cursor, connection):
         """)
         
         if not cursor.fetchone():
-            print("[INFO] Agregando columna 'enviado' a tabla fb_leads...")
+            logger.info("Agregando columna", extra=fields(component="schema", table="fb_leads", column="enviado"))
             cursor.execute("""
                 ALTER TABLE fb_leads 
                 ADD COLUMN enviado TINYINT(1) DEFAULT 0
             """)
             connection.commit()
-            print("[SUCCESS] Columna 'enviado' agregada exitosamente")
+            logger.info("Columna agregada", extra=fields(component="schema", table="fb_leads", column="enviado"))
         else:
-            print("[INFO] Columna 'enviado' ya existe en fb_leads")
+            logger.info("Columna ya existe", extra=fields(component="schema", table="fb_leads", column="enviado"))
             
     except Exception as e:
-        print(f"[ERROR] Error verificando/creando columnas: {e}")
\ No newline at end of file
+        logger.error("Error verificando/creando columnas", extra=fields(component="schema", error=e))
\ No newline at end of file
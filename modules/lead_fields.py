@@ -0,0 +1,48 @@
+# Alias de field_data por campo normalizado, en orden de preferencia.
+# Es la única fuente del mapeo: lo usan tanto el parseo en Python como las
+# columnas generadas de fb_leads.
+LEAD_FIELD_ALIASES = {
+    'full_name': ('full_name', 'name'),
+    'email': ('email',),
+    'phone': ('phone_number', 'phone'),
+    'job_title': ('job_title', 'cargo'),
+    'company_name': ('company_name', 'empresa'),
+}
+
+# Campos que no se insertan desde Python: MySQL los calcula desde raw_json
+GENERATED_FIELDS = ('job_title', 'company_name')
+
+def extract_fields(field_data):
+    """Retorna {campo_normalizado: valor} a partir del field_data de un lead."""
+    field_map = {}
+    for f in field_data or []:
+        values = f.get("values") or []
+        field_map[f.get("name")] = values[0] if values else None
+
+    result = {}
+    for field, aliases in LEAD_FIELD_ALIASES.items():
+        value = None
+        for alias in aliases:
+            value = field_map.get(alias)
+            if value:
+                break
+        result[field] = value
+    return result
+
+def _alias_expression(alias):
+    """
+    Expresión SQL que busca en raw_json el field_data con name = alias y
+    devuelve su primer valor. JSON_SEARCH usa comodines tipo LIKE, por eso
+    se escapa el '_'.
+    """
+    escaped = alias.replace("_", "\\_")
+    path = f"JSON_UNQUOTE(JSON_SEARCH(raw_json, 'one', '{escaped}', NULL, '$.field_data[*].name'))"
+    return (
+        f"JSON_UNQUOTE(JSON_EXTRACT(raw_json, "
+        f"CONCAT(SUBSTRING_INDEX({path}, '.name', 1), '.values[0]')))"
+    )
+
+def generated_column_definition(field, length=255):
+    """Definición de columna generada (STORED) para un campo de LEAD_FIELD_ALIASES."""
+    expressions = ", ".join(f"NULLIF({_alias_expression(alias)}, '')" for alias in LEAD_FIELD_ALIASES[field])
+    return f"VARCHAR({length}) AS (LEFT(COALESCE({expressions}), {length})) STORED"
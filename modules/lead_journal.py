@@ -0,0 +1,276 @@
+import logging
+import os
+import time
+
+from modules import codec
+from modules.log import fields
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FOLDER = os.environ.get("LEAD_JOURNAL_FOLDER", "Leads_journal")
+MAX_REPLAY_ATTEMPTS = int(os.environ.get("LEAD_JOURNAL_MAX_ATTEMPTS", 5))
+# Entradas de un proceso vivo más recientes que esto se consideran en curso
+# (también las que un proceso vivo está reprocesando)
+ACTIVE_ENTRY_MAX_AGE = int(os.environ.get("LEAD_JOURNAL_ACTIVE_MAX_AGE", 600))
+
+REPLAYING_SUFFIX = ".replaying."
+
+# Un PID solo no identifica al proceso: tras reiniciar el contenedor los
+# workers vuelven a tener los mismos PID. El dueño de una entrada es
+# (pid, inicio del proceso, boot id), leídos de /proc cuando existe.
+_owner_cache = {}
+
+def _boot_id():
+    try:
+        with open("/proc/sys/kernel/random/boot_id", encoding="ascii") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _start_time(pid):
+    """Inicio del proceso en ticks desde el arranque (campo 22 de /proc/<pid>/stat); None si no se puede leer."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # El nombre del proceso (campo 2) va entre paréntesis y puede tener espacios
+    return int(stat.rsplit(b")", 1)[1].split()[19])
+
+def _owner():
+    """Identidad de este proceso (se recalcula después de un fork)."""
+    pid = os.getpid()
+    if pid not in _owner_cache:
+        _owner_cache.clear()
+        _owner_cache[pid] = {"owner_pid": pid, "owner_started": _start_time(pid), "owner_boot": _boot_id()}
+    return _owner_cache[pid]
+
+def _owner_token(owner):
+    return f"{owner['owner_pid']}-{owner['owner_started'] or 0}"
+
+def _claimed_path(path):
+    """Ruta de la entrada mientras este proceso la reprocesa."""
+    return f"{path}{REPLAYING_SUFFIX}{_owner_token(_owner())}"
+
+def _is_alive(pid, started=None, boot=None):
+    """Indica si el proceso dueño sigue vivo: mismo PID, mismo inicio y mismo arranque del sistema."""
+    if boot and boot != _owner()["owner_boot"]:
+        return False
+    if started and _owner()["owner_started"] is not None:
+        # Con /proc disponible, un PID reutilizado tiene otro inicio
+        return _start_time(pid) == started
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _entry_path(leadgen_id):
+    return os.path.join(JOURNAL_FOLDER, f"{leadgen_id}.json")
+
+def _write_atomic(path, entry):
+    """Escribe la entrada en un archivo temporal y lo renombra (atómico en POSIX)."""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(codec.dumps(entry))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _read_entry(path):
+    try:
+        with open(path, "rb") as f:
+            return codec.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+def record_pending(leadgen_id, form_id, page_id):
+    """
+    Registra un lead como 'en vuelo' antes de procesarlo.
+    Cada lead es un archivo independiente, así varios workers pueden
+    escribir en la misma carpeta sin coordinarse.
+    """
+    os.makedirs(JOURNAL_FOLDER, exist_ok=True)
+    path = _entry_path(leadgen_id)
+    previous = _read_entry(path) or {}
+
+    entry = {
+        "leadgen_id": str(leadgen_id),
+        "form_id": form_id,
+        "page_id": page_id,
+        "attempts": previous.get("attempts", 0),
+        **_owner(),
+        "recorded_at": int(time.time())
+    }
+    if previous.get("lead_json"):
+        entry["lead_json"] = previous["lead_json"]
+    _write_atomic(path, entry)
+
+def attach_lead(leadgen_id, lead_json):
+    """
+    Guarda en la entrada el lead ya obtenido de Graph API, así el reproceso
+    no necesita volver a consultarlo. Busca la entrada normal o la que este
+    proceso está reprocesando.
+    """
+    path = _entry_path(leadgen_id)
+    for candidate in (path, _claimed_path(path)):
+        entry = _read_entry(candidate)
+        if entry is not None:
+            entry["lead_json"] = lead_json
+            _write_atomic(candidate, entry)
+            return True
+    return False
+
+def release(leadgen_id):
+    """
+    Entrega la entrada al spool: deja de pertenecer al worker que la recibió
+    y cualquier reproceso (de este u otro worker) puede tomarla.
+    """
+    path = _entry_path(leadgen_id)
+    entry = _read_entry(path)
+    if entry is not None:
+        entry["owner_pid"] = None
+        _write_atomic(path, entry)
+
+def mark_done(leadgen_id):
+    """Elimina la entrada del journal una vez que el lead fue procesado."""
+    try:
+        os.remove(_entry_path(leadgen_id))
+    except FileNotFoundError:
+        pass
+
+def _is_replaying(name):
+    return REPLAYING_SUFFIX in name and ".tmp." not in name
+
+def pending_count():
+    """Cantidad de leads pendientes en el journal (incluye los que se están reprocesando)."""
+    if not os.path.isdir(JOURNAL_FOLDER):
+        return 0
+    return sum(1 for name in os.listdir(JOURNAL_FOLDER) if name.endswith(".json") or _is_replaying(name))
+
+def _is_active(entry):
+    """Indica si la entrada pertenece a un worker vivo (este u otro) que aún la está procesando."""
+    owner_pid = entry.get("owner_pid")
+    if not owner_pid:
+        return False
+    if time.time() - entry.get("recorded_at", 0) > ACTIVE_ENTRY_MAX_AGE:
+        return False
+    return _is_alive(owner_pid, entry.get("owner_started"), entry.get("owner_boot"))
+
+def _reclaim_abandoned():
+    """
+    Devuelve al journal las entradas '.replaying.<pid>-<inicio>' de un proceso
+    que murió a mitad del reproceso, o que llevan más de ACTIVE_ENTRY_MAX_AGE
+    sin terminar. Si el lead ya tiene una entrada nueva, la abandonada sobra.
+    """
+    own_token = _owner_token(_owner())
+    for name in os.listdir(JOURNAL_FOLDER):
+        if not _is_replaying(name):
+            continue
+        base_name, token = name.split(REPLAYING_SUFFIX, 1)
+        claimed_path = os.path.join(JOURNAL_FOLDER, name)
+        try:
+            pid, started = (int(part) for part in token.split("-", 1))
+            stale = time.time() - os.path.getmtime(claimed_path) > ACTIVE_ENTRY_MAX_AGE
+        except (ValueError, OSError):
+            continue
+        if token == own_token or (not stale and _is_alive(pid, started)):
+            continue
+
+        path = os.path.join(JOURNAL_FOLDER, base_name)
+        try:
+            if os.path.exists(path):
+                os.remove(claimed_path)
+            else:
+                os.rename(claimed_path, path)
+        except FileNotFoundError:
+            # Otro worker la recuperó primero
+            continue
+        logger.warning("Entrada abandonada devuelta al journal", extra=fields(component="replay", entry=base_name, owner=token))
+
+def _claim_entries():
+    """
+    Reclama las entradas pendientes renombrándolas con la identidad de este
+    proceso. Si otro worker ya reclamó una entrada, el rename falla y se omite.
+    """
+    if not os.path.isdir(JOURNAL_FOLDER):
+        return
+
+    _reclaim_abandoned()
+    for name in sorted(os.listdir(JOURNAL_FOLDER)):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(JOURNAL_FOLDER, name)
+        claimed_path = _claimed_path(path)
+        try:
+            os.rename(path, claimed_path)
+        except FileNotFoundError:
+            continue
+
+        try:
+            with open(claimed_path, "rb") as f:
+                entry = codec.loads(f.read())
+        except (OSError, ValueError) as e:
+            logger.error("Entrada de journal ilegible", extra=fields(component="replay", entry=name, error=e))
+            os.rename(claimed_path, f"{path}.corrupt")
+            continue
+
+        if _is_active(entry):
+            os.rename(claimed_path, path)
+            continue
+
+        yield path, claimed_path, entry
+
+def replay_pending(process_fn, defer_on=(), stop=None):
+    """
+    Reprocesa los leads que quedaron en el journal (reinicio del worker o
+    dependencia caída). process_fn(leadgen_id, form_id, page_id, lead_json)
+    debe lanzar una excepción si el lead no pudo procesarse; lead_json es None
+    si el lead aún no se había obtenido de Graph API.
+
+    Si process_fn lanza una excepción de 'defer_on' (dependencia no disponible)
+    la entrada vuelve al journal sin contar el intento y el reproceso se detiene.
+    También se detiene, antes de reclamar la siguiente entrada, al activarse
+    'stop' (threading.Event del apagado).
+
+    Returns:
+        tuple: (reprocesados, fallidos)
+    """
+    replayed = 0
+    failed = 0
+
+    entries = _claim_entries()
+    for path, claimed_path, entry in entries:
+        if stop is not None and stop.is_set():
+            os.rename(claimed_path, path)
+            entries.close()
+            break
+        leadgen_id = entry.get("leadgen_id")
+        try:
+            process_fn(leadgen_id, entry.get("form_id"), entry.get("page_id"), entry.get("lead_json"))
+            os.remove(claimed_path)
+            replayed += 1
+            logger.info("Lead reprocesado desde el journal", extra=fields(component="replay", lead_id=leadgen_id))
+        except defer_on as e:
+            os.rename(claimed_path, path)
+            logger.warning("Reproceso pausado: dependencia no disponible", extra=fields(component="replay", lead_id=leadgen_id, error=e))
+            entries.close()
+            break
+        except Exception as e:
+            failed += 1
+            # process_fn pudo haber guardado el lead_json en la entrada reclamada
+            entry = _read_entry(claimed_path) or entry
+            entry["owner_pid"] = None
+            entry["attempts"] = entry.get("attempts", 0) + 1
+            if entry["attempts"] >= MAX_REPLAY_ATTEMPTS:
+                _write_atomic(f"{path}.failed", entry)
+                os.remove(claimed_path)
+                logger.error("Lead descartado del journal", extra=fields(component="replay", lead_id=leadgen_id, attempts=entry['attempts'], error=e))
+            else:
+                _write_atomic(path, entry)
+                os.remove(claimed_path)
+                logger.warning("No se pudo reprocesar lead", extra=fields(component="replay", lead_id=leadgen_id, attempts=entry['attempts'], error=e))
+
+    return replayed, failed
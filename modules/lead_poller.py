@@ -0,0 +1,160 @@
+import logging
+from datetime import datetime, timezone
+
+from modules import codec
+from modules.log import fields
+
+logger = logging.getLogger(__name__)
+
+GRAPH_URL = "https://graph.facebook.com/v23.0"
+LEAD_FIELDS = "id,created_time,field_data,ad_id,adset_id,campaign_id,form_id,platform"
+
+# Segundos que se retrocede desde la marca de agua para no perder leads con el mismo timestamp
+HIGH_WATER_OVERLAP = 60
+
+def ensure_sync_table(cursor):
+    """Crea la tabla con la marca de agua (último created_time procesado) por formulario."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fb_form_sync (
+          form_id BIGINT PRIMARY KEY,
+          last_created_time DATETIME NULL,
+          leads_synced INT NOT NULL DEFAULT 0,
+          updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+
+def get_high_water_mark(cursor, form_id):
+    """Retorna el último created_time sincronizado del formulario (datetime UTC) o None."""
+    cursor.execute(
+        "SELECT last_created_time FROM fb_form_sync WHERE form_id = %s",
+        (int(form_id),)
+    )
+    row = cursor.fetchone()
+    if not row or not row['last_created_time']:
+        return None
+    return row['last_created_time'].replace(tzinfo=timezone.utc)
+
+def set_high_water_mark(cursor, connection, form_id, created_time, leads_synced):
+    """Avanza la marca de agua del formulario (nunca la retrocede)."""
+    cursor.execute("""
+        INSERT INTO fb_form_sync (form_id, last_created_time, leads_synced)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+          last_created_time = GREATEST(COALESCE(last_created_time, VALUES(last_created_time)), VALUES(last_created_time)),
+          leads_synced = leads_synced + VALUES(leads_synced)
+    """, (int(form_id), created_time.strftime("%Y-%m-%d %H:%M:%S"), leads_synced))
+    connection.commit()
+
+def parse_created_time(lead_json):
+    """Convierte el created_time de Graph API a datetime UTC."""
+    return datetime.fromisoformat(
+        lead_json["created_time"].replace("Z", "+00:00").replace("+0000", "+00:00")
+    ).astimezone(timezone.utc)
+
+def list_page_forms(session, page_id, access_token):
+    """Lista los IDs de formularios de leads de la página."""
+    url = f"{GRAPH_URL}/{page_id}/leadgen_forms"
+    params = {"access_token": access_token, "fields": "id,name,status", "limit": 100}
+    forms = []
+
+    while url:
+        response = session.get(url, params=params, timeout=30)
+        response.raise_for_status()
+        data = codec.loads(response.content)
+        forms.extend(data.get("data", []))
+        url = data.get("paging", {}).get("next")
+        params = None  # La URL 'next' ya incluye todos los parámetros
+
+    return forms
+
+def iter_form_leads(session, form_id, access_token, since=None, limit=500):
+    """
+    Recorre /{form_id}/leads página por página (hasta 'limit' leads por request).
+    Si se indica 'since' (datetime), solo trae leads creados después de esa fecha.
+    """
+    url = f"{GRAPH_URL}/{form_id}/leads"
+    params = {"access_token": access_token, "fields": LEAD_FIELDS, "limit": limit}
+    if since:
+        params["filtering"] = codec.dumps([{
+            "field": "time_created",
+            "operator": "GREATER_THAN",
+            "value": int(since.timestamp()) - HIGH_WATER_OVERLAP
+        }])
+
+    while url:
+        response = session.get(url, params=params, timeout=60)
+        response.raise_for_status()
+        data = codec.loads(response.content)
+        yield data.get("data", [])
+        url = data.get("paging", {}).get("next")
+        params = None
+
+def filter_existing_leads(cursor, leads):
+    """Descarta en una sola consulta los leads que ya están en fb_leads."""
+    if not leads:
+        return []
+    ids = [int(lead["id"]) for lead in leads]
+    placeholders = ",".join(["%s"] * len(ids))
+    cursor.execute(f"SELECT id FROM fb_leads WHERE id IN ({placeholders})", ids)
+    existing = {row['id'] for row in cursor.fetchall()}
+    return [lead for lead in leads if int(lead["id"]) not in existing]
+
+def _save(save_fn, lead_json, form_id, page_id):
+    """Guarda un lead; un lead malformado u otro error cuenta como no guardado."""
+    try:
+        return save_fn(lead_json, form_id, page_id)
+    except Exception as e:
+        logger.exception("Error guardando lead", extra=fields(component="poll", lead_id=lead_json.get("id"), form_id=form_id, error=e))
+        return False
+
+def poll_form(session, cursor, connection, form_id, page_id, access_token, save_fn,
+              full=False, limit=500):
+    """
+    Sincroniza un formulario: trae los leads nuevos desde la marca de agua y los
+    pasa por save_fn(lead_json, form_id, page_id) página por página. save_fn
+    debe retornar True si el lead quedó guardado; si lanza una excepción el
+    lead cuenta como error.
+
+    Returns:
+        dict: estadísticas (fetched, skipped, saved, errors)
+    """
+    since = None if full else get_high_water_mark(cursor, form_id)
+    stats = {"fetched": 0, "skipped": 0, "saved": 0, "errors": 0}
+
+    # Graph entrega /leads del más nuevo al más antiguo, así que la marca de
+    # agua no puede avanzar página por página: se escribe una sola vez, al
+    # terminar el formulario sin errores, con el lead más nuevo ya guardado.
+    # Con algún error no se mueve y la próxima corrida repite el rango (los
+    # leads ya guardados se descartan con filter_existing_leads).
+    high_water = None
+    blocked = False
+    for number, page in enumerate(iter_form_leads(session, form_id, access_token, since=since, limit=limit), 1):
+        stats["fetched"] += len(page)
+        new_leads = filter_existing_leads(cursor, page)
+        new_ids = {lead["id"] for lead in new_leads}
+        stats["skipped"] += len(page) - len(new_leads)
+        page_saved = 0
+
+        for lead_json in page:
+            if lead_json["id"] in new_ids:
+                if not _save(save_fn, lead_json, form_id, page_id):
+                    stats["errors"] += 1
+                    continue
+                stats["saved"] += 1
+                page_saved += 1
+            try:
+                created_time = parse_created_time(lead_json)
+            except (KeyError, ValueError):
+                # Sin fecha no se sabe hasta dónde avanzar: la marca no se mueve
+                blocked = True
+                continue
+            high_water = created_time if high_water is None else max(high_water, created_time)
+
+        logger.info("Página procesada", extra=fields(
+            component="poll",
+            form_id=form_id, page=number, fetched=len(page), new=len(new_leads), saved=page_saved
+        ))
+
+    if high_water and not stats["errors"] and not blocked:
+        set_high_water_mark(cursor, connection, form_id, high_water, stats["saved"])
+    return stats
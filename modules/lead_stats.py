@@ -0,0 +1,177 @@
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from modules.log import fields
+
+logger = logging.getLogger(__name__)
+
+# Resumen de leads por día y dimensión, mantenido incrementalmente al guardar
+# y consolidar (sin GROUP BY sobre fb_leads durante el evento).
+#   leads         total de leads nuevos (valor '')
+#   campana       leads por nombre de campaña
+#   sala          leads por sala del anuncio
+#   evento        inscripciones por evento_id (dia = fecha del evento)
+#   lista_espera  leads en lista de espera por evento_id (dia = fecha del evento)
+STATS_TABLE = "fb_leads_stats"
+STATS_CACHE_TTL = float(os.environ.get("STATS_CACHE_TTL", 5))
+
+NO_CAMPAIGN = "(sin campaña)"
+NO_SALA = "(sin sala)"
+
+_table_ready = False
+_cache = {}
+_cache_lock = threading.Lock()
+
+def ensure_stats_table(cursor):
+    """Crea la tabla de resumen si no existe."""
+    global _table_ready
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+          dia DATE NOT NULL,
+          dimension VARCHAR(32) NOT NULL,
+          valor VARCHAR(255) NOT NULL,
+          total INT NOT NULL DEFAULT 0,
+          PRIMARY KEY (dia, dimension, valor)
+        )
+    """)
+    _table_ready = True
+
+def ensure_stats_ready(cursor):
+    """Crea la tabla una sola vez por proceso (antes de abrir transacciones)."""
+    if not _table_ready:
+        ensure_stats_table(cursor)
+
+def record_lead(cursor, created_time, campaign_name, sala):
+    """
+    Suma un lead nuevo al resumen. Solo debe llamarse cuando el lead se insertó
+    por primera vez (no en actualizaciones). Un error aquí no detiene la ingesta;
+    el resumen se corrige con 'flask --app app rebuild-stats'.
+    """
+    dia = created_time.date()
+    try:
+        ensure_stats_ready(cursor)
+        cursor.execute(f"""
+            INSERT INTO {STATS_TABLE} (dia, dimension, valor, total)
+            VALUES (%s, 'leads', '', 1), (%s, 'campana', %s, 1), (%s, 'sala', %s, 1)
+            ON DUPLICATE KEY UPDATE total = total + VALUES(total)
+        """, (dia, dia, (campaign_name or NO_CAMPAIGN)[:255], dia, sala or NO_SALA))
+    except Exception as e:
+        logger.warning("No se pudo actualizar el resumen de leads", extra=fields(component="stats", error=e))
+
+def record_event(cursor, connection, evento_id, dimension="evento"):
+    """
+    Suma una inscripción (o lista de espera) al resumen del evento, con la fecha
+    del evento. Se llama después del commit de la inscripción y confirma su propia
+    transacción corta: un error aquí (deadlock, timeout) no deshace la inscripción
+    y el resumen se corrige con 'flask --app app rebuild-stats'.
+    """
+    try:
+        ensure_stats_ready(cursor)
+        # Lectura sin bloqueo: un INSERT ... SELECT tomaría un bloqueo compartido
+        # sobre la fila del evento, que la compactación de slots actualiza
+        cursor.execute("SELECT DATE(fecha) AS dia FROM expokossodo_eventos WHERE id = %s", (evento_id,))
+        row = cursor.fetchone()
+        if row and row['dia']:
+            cursor.execute(f"""
+                INSERT INTO {STATS_TABLE} (dia, dimension, valor, total)
+                VALUES (%s, %s, %s, 1)
+                ON DUPLICATE KEY UPDATE total = {STATS_TABLE}.total + 1
+            """, (row['dia'], dimension, evento_id))
+        connection.commit()
+    except Exception as e:
+        logger.warning("No se pudo actualizar el resumen de eventos", extra=fields(component="stats", evento_id=evento_id, error=e))
+        try:
+            connection.rollback()
+        except Exception:
+            pass
+
+def rebuild_stats(cursor, connection, waitlist_table="expokossodo_lista_espera"):
+    """Recalcula todo el resumen desde fb_leads, registro_eventos y la lista de espera."""
+    ensure_stats_ready(cursor)
+    connection.begin()
+    try:
+        cursor.execute(f"DELETE FROM {STATS_TABLE}")
+        cursor.execute(f"""
+            INSERT INTO {STATS_TABLE} (dia, dimension, valor, total)
+            SELECT DATE(created_time), 'leads', '', COUNT(*) FROM fb_leads
+            GROUP BY DATE(created_time)
+        """)
+        cursor.execute(f"""
+            INSERT INTO {STATS_TABLE} (dia, dimension, valor, total)
+            SELECT DATE(created_time), 'campana', LEFT(COALESCE(NULLIF(campaign_name, ''), %s), 255), COUNT(*)
+            FROM fb_leads
+            GROUP BY DATE(created_time), LEFT(COALESCE(NULLIF(campaign_name, ''), %s), 255)
+        """, (NO_CAMPAIGN, NO_CAMPAIGN))
+        cursor.execute(f"""
+            INSERT INTO {STATS_TABLE} (dia, dimension, valor, total)
+            SELECT DATE(created_time), 'sala', COALESCE(NULLIF(sala, ''), %s), COUNT(*)
+            FROM fb_leads
+            GROUP BY DATE(created_time), COALESCE(NULLIF(sala, ''), %s)
+        """, (NO_SALA, NO_SALA))
+        for dimension, table in (("evento", "expokossodo_registro_eventos"), ("lista_espera", waitlist_table)):
+            cursor.execute(f"""
+                INSERT INTO {STATS_TABLE} (dia, dimension, valor, total)
+                SELECT DATE(e.fecha), %s, t.evento_id, COUNT(*)
+                FROM {table} t
+                JOIN expokossodo_eventos e ON e.id = t.evento_id
+                WHERE e.fecha IS NOT NULL
+                GROUP BY DATE(e.fecha), t.evento_id
+            """, (dimension,))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+    with _cache_lock:
+        _cache.clear()
+    cursor.execute(f"SELECT COUNT(*) AS filas FROM {STATS_TABLE}")
+    return cursor.fetchone()['filas']
+
+def cached_summary(days):
+    """Retorna el resumen cacheado si tiene menos de STATS_CACHE_TTL segundos."""
+    with _cache_lock:
+        cached = _cache.get(days)
+    if cached and time.monotonic() - cached[0] < STATS_CACHE_TTL:
+        return cached[1]
+    return None
+
+def load_summary(cursor, days):
+    """
+    Lee el resumen de los últimos 'days' días (los eventos se incluyen todos,
+    sin importar su fecha) y lo guarda en el cache del proceso. 'valor' es
+    texto: se convierte a entero para que el join use la PK de eventos.
+    """
+    since = date.today() - timedelta(days=days - 1)
+    cursor.execute(f"""
+        SELECT s.dia, s.dimension, s.valor, s.total, e.titulo_charla
+        FROM {STATS_TABLE} s
+        LEFT JOIN expokossodo_eventos e
+          ON s.dimension IN ('evento', 'lista_espera') AND e.id = CAST(s.valor AS UNSIGNED)
+        WHERE s.dia >= %s OR s.dimension IN ('evento', 'lista_espera')
+        ORDER BY s.dia, s.dimension, s.valor
+    """, (since,))
+
+    totals = {}
+    by_day = {}
+    events = {}
+    for row in cursor.fetchall():
+        dia = row['dia'].isoformat()
+        dimension, valor, total = row['dimension'], row['valor'], int(row['total'])
+        totals.setdefault(dimension, {})
+        totals[dimension][valor] = totals[dimension].get(valor, 0) + total
+        by_day.setdefault(dia, {}).setdefault(dimension, {})[valor] = total
+        if row['titulo_charla']:
+            events[valor] = row['titulo_charla']
+
+    summary = {
+        "desde": since.isoformat(),
+        "totales": totals,
+        "por_dia": by_day,
+        "eventos": events,
+    }
+    with _cache_lock:
+        _cache[days] = (time.monotonic(), summary)
+    return summary
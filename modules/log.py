@@ -0,0 +1,114 @@
+import atexit
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+# Los registros se encolan desde el hilo de la petición y un hilo de fondo los
+# escribe en stdout, así una escritura lenta en la consola del hosting no
+# bloquea el procesamiento de leads.
+#
+# Configuración (se lee al llamar setup_logging, después de load_dotenv):
+#   LOG_LEVEL        nivel del logger raíz (default INFO)
+#   LOG_SAMPLE_RATE  solo 1 de cada N mensajes INFO marcados como 'sampled' se escribe (1 = todos)
+
+_queue_handler = None
+_listener = None
+
+def fields(sampled=False, **values):
+    """
+    Arma el 'extra' de un registro: campos clave=valor (lead_id, duraciones, ...)
+    y si el mensaje es de alto volumen y puede muestrearse. El nivel ya va en
+    la línea y el subsistema en el campo 'component': el mensaje no lleva
+    prefijos como [ERROR] o [MATCH].
+
+    Ejemplo: logger.info("Evento encontrado", extra=fields(component="match", event_id=12, sampled=True))
+    """
+    return {"fields": values, "sampled": sampled}
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    text = str(value)
+    if not text or any(c in text for c in ' ="'):
+        return '"' + text.replace('"', '\\"') + '"'
+    return text
+
+class KeyValueFormatter(logging.Formatter):
+    """Formato: '<fecha> <nivel> <logger> <mensaje> clave=valor ...'"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        values = getattr(record, "fields", None)
+        if not values:
+            return line
+        # Los campos van en la primera línea, antes de un posible traceback
+        first, sep, rest = line.partition("\n")
+        first += " " + " ".join(f"{key}={_format_value(value)}" for key, value in values.items())
+        return first + sep + rest
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar 1 de cada 'rate' registros INFO/DEBUG marcados como 'sampled', por mensaje."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self._counters = {}
+
+    def filter(self, record):
+        if self.rate <= 1 or record.levelno > logging.INFO or not getattr(record, "sampled", False):
+            return True
+        counter = self._counters.get(record.msg)
+        if counter is None:
+            counter = self._counters.setdefault(record.msg, itertools.count())
+        return next(counter) % self.rate == 0
+
+def _start_listener():
+    global _listener
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(KeyValueFormatter())
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=False)
+    _listener.start()
+
+def _restart_after_fork():
+    """El hilo escritor no sobrevive al fork (workers de gunicorn): se crea uno nuevo."""
+    if _queue_handler is None:
+        return
+    _queue_handler.queue = queue.SimpleQueue()
+    _start_listener()
+
+def stop_logging():
+    """Vacía la cola y detiene el hilo escritor."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def setup_logging(level=None, sample_rate=None):
+    """
+    Configura el logger raíz con un QueueHandler y un hilo escritor de fondo.
+    Es idempotente; lo llaman app.py y los scripts al arrancar.
+    """
+    global _queue_handler
+    if _queue_handler is not None:
+        return
+
+    level = level or os.environ.get("LOG_LEVEL", "INFO").upper()
+    if sample_rate is None:
+        sample_rate = max(1, int(os.environ.get("LOG_SAMPLE_RATE", 1)))
+
+    _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(level)
+
+    _start_listener()
+    atexit.register(stop_logging)
+    os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,304 @@
+import logging
+import math
+import os
+import socket
+import zlib
+
+from modules.log import fields
+
+logger = logging.getLogger(__name__)
+
+# Modo particionado (PROCESSING_MODE=partitioned): el webhook solo encola el
+# lead en MySQL y lo procesa un partition_worker.py. Cada lead cae en una
+# partición según hash(page_id, form_id); cada partición la procesa un único
+# worker a la vez (lease en MySQL) y en orden de llegada. Las escrituras del
+# worker sobre la cola van cercadas por (owner, epoch) del lease: un worker que
+# perdió la partición no puede tomar ni cerrar leads.
+PROCESSING_MODE = os.environ.get("PROCESSING_MODE", "inline").lower()
+PARTITION_COUNT = int(os.environ.get("PARTITION_COUNT", 16))
+LEASE_SECONDS = int(os.environ.get("PARTITION_LEASE_SECONDS", 150))
+QUEUE_MAX_ATTEMPTS = int(os.environ.get("PARTITION_QUEUE_MAX_ATTEMPTS", 5))
+
+QUEUE_TABLE = "fb_lead_queue"
+LEASE_TABLE = "fb_partition_leases"
+WORKERS_TABLE = "fb_partition_workers"
+
+# Peor caso de un lead: el lead y los nombres de campaña, adset y anuncio
+GRAPH_CALLS_PER_LEAD = 4
+# Peor caso de idas y vueltas a MySQL de un lead (ping, recarga de eventos,
+# upsert, consolidación con sus commits, resumen y cierre en la cola); cada
+# una puede tardar hasta DB_QUERY_TIMEOUT
+QUERIES_PER_LEAD = 20
+
+_tables_ready = False
+
+def is_partitioned():
+    return PROCESSING_MODE == "partitioned"
+
+def partition_for(page_id, form_id, count=PARTITION_COUNT):
+    """Partición estable del lead: todos los leads de un formulario caen en la misma."""
+    return zlib.crc32(f"{page_id}:{form_id}".encode()) % count
+
+def ensure_partition_tables(cursor, count=PARTITION_COUNT):
+    """Crea la cola, la tabla de leases (una fila por partición) y la de workers."""
+    global _tables_ready
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {QUEUE_TABLE} (
+          seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+          leadgen_id BIGINT NOT NULL,
+          form_id BIGINT NULL,
+          page_id BIGINT NULL,
+          partition_id INT NOT NULL,
+          status VARCHAR(16) NOT NULL DEFAULT 'pending',
+          attempts INT NOT NULL DEFAULT 0,
+          last_error VARCHAR(255) NULL,
+          claim_epoch BIGINT NULL,
+          claimed_at DATETIME(6) NULL,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+          UNIQUE KEY uq_leadgen (leadgen_id),
+          INDEX idx_partition_status (partition_id, status, seq)
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {LEASE_TABLE} (
+          partition_id INT PRIMARY KEY,
+          owner VARCHAR(128) NULL,
+          lease_until DATETIME NULL,
+          epoch BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {WORKERS_TABLE} (
+          worker_id VARCHAR(128) PRIMARY KEY,
+          seen_at DATETIME NOT NULL
+        )
+    """)
+    cursor.executemany(
+        f"INSERT IGNORE INTO {LEASE_TABLE} (partition_id) VALUES (%s)",
+        [(partition,) for partition in range(count)]
+    )
+    _tables_ready = True
+
+def ensure_partition_tables_ready(cursor):
+    """Crea las tablas una sola vez por proceso."""
+    if not _tables_ready:
+        ensure_partition_tables(cursor)
+
+def enqueue_lead(cursor, leadgen_id, form_id, page_id):
+    """
+    Encola el lead en su partición. Las entregas repetidas del mismo
+    leadgen_id se ignoran (clave única).
+
+    Returns:
+        int: partición asignada
+    """
+    partition = partition_for(page_id, form_id)
+    cursor.execute(f"""
+        INSERT IGNORE INTO {QUEUE_TABLE} (leadgen_id, form_id, page_id, partition_id)
+        VALUES (%s, %s, %s, %s)
+    """, (int(leadgen_id), form_id, page_id, partition))
+    return partition
+
+def next_items(cursor, partition, limit=50):
+    """
+    Próximos leads sin terminar de la partición, en orden de llegada. Incluye
+    los 'processing' que dejó un dueño anterior (o este mismo, si el lead se
+    cortó por una dependencia caída): se vuelven a tomar con claim_item.
+    """
+    cursor.execute(f"""
+        SELECT seq, leadgen_id, form_id, page_id, attempts FROM {QUEUE_TABLE}
+        WHERE partition_id = %s AND status IN ('pending', 'processing')
+        ORDER BY seq
+        LIMIT %s
+    """, (partition, limit))
+    return cursor.fetchall()
+
+class LeaseLost(Exception):
+    """Una escritura cercada no encontró el lease: otro worker tomó la partición."""
+
+def _fenced_update(cursor, assignments, condition, params, seq, worker_id, epoch, lease_valid=False):
+    """
+    UPDATE de un lead de la cola unido a su fila de fb_partition_leases: solo
+    se aplica si el lease sigue siendo de (worker_id, epoch). Lanza LeaseLost
+    si no se modificó la fila.
+    """
+    cursor.execute(f"""
+        UPDATE {QUEUE_TABLE} q JOIN {LEASE_TABLE} l ON l.partition_id = q.partition_id
+        SET {assignments}
+        WHERE q.seq = %s AND {condition}
+          AND l.owner = %s AND l.epoch = %s {"AND l.lease_until > NOW()" if lease_valid else ""}
+    """, (*params, seq, worker_id, epoch))
+    if cursor.rowcount != 1:
+        raise LeaseLost(f"lead {seq}: el lease de {worker_id} (epoch {epoch}) ya no es válido")
+
+def claim_item(cursor, seq, worker_id, epoch):
+    """
+    Toma el lead para procesarlo ('processing' con el epoch del lease vigente).
+    claimed_at cambia en cada toma, así volver a tomar un lead propio también
+    modifica la fila.
+    """
+    _fenced_update(
+        cursor, "q.status = 'processing', q.claim_epoch = l.epoch, q.claimed_at = NOW(6)",
+        "q.status IN ('pending', 'processing')", (), seq, worker_id, epoch, lease_valid=True
+    )
+
+def mark_done(cursor, seq, worker_id, epoch):
+    """Cierra el lead tomado con claim_item bajo el mismo epoch."""
+    _fenced_update(
+        cursor, "q.status = 'done'",
+        "q.status = 'processing' AND q.claim_epoch = l.epoch", (), seq, worker_id, epoch
+    )
+
+def mark_failed(cursor, item, error, worker_id, epoch, max_attempts=QUEUE_MAX_ATTEMPTS):
+    """
+    Suma un intento. Al llegar a max_attempts el lead queda 'failed' y la
+    partición sigue con el siguiente; antes de eso se reintenta en orden.
+    Cercado igual que mark_done.
+
+    Returns:
+        bool: True si el lead se descartó
+    """
+    attempts = item['attempts'] + 1
+    status = 'failed' if attempts >= max_attempts else 'pending'
+    _fenced_update(
+        cursor, "q.attempts = %s, q.status = %s, q.last_error = %s",
+        "q.status = 'processing' AND q.claim_epoch = l.epoch",
+        (attempts, status, str(error)[:255]), item['seq'], worker_id, epoch
+    )
+    return status == 'failed'
+
+def lead_time_budget(graph_timeout, db_connect_timeout, db_query_timeout):
+    """
+    Peor caso (segundos) de un lead en el worker: GRAPH_CALLS_PER_LEAD requests
+    a Graph API, la conexión a MySQL y QUERIES_PER_LEAD consultas. None si las
+    consultas no tienen límite (db_query_timeout=0).
+    """
+    if not db_query_timeout:
+        return None
+    return GRAPH_CALLS_PER_LEAD * graph_timeout + db_connect_timeout + QUERIES_PER_LEAD * db_query_timeout
+
+def check_lease(cursor, partition, worker_id, epoch):
+    """
+    Verifica, dentro de la transacción del llamador y antes de su commit, que
+    el lease sigue siendo de (worker_id, epoch). La fila queda con bloqueo
+    compartido hasta el commit: otro worker no puede tomar la partición entre
+    esta verificación y el commit. Lanza LeaseLost si ya no es válido.
+    """
+    cursor.execute(f"""
+        SELECT 1 FROM {LEASE_TABLE}
+        WHERE partition_id = %s AND owner = %s AND epoch = %s AND lease_until > NOW()
+        LOCK IN SHARE MODE
+    """, (partition, worker_id, epoch))
+    if not cursor.fetchone():
+        raise LeaseLost(f"partición {partition}: el lease de {worker_id} (epoch {epoch}) ya no es válido")
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class PartitionLeases:
+    """
+    Leases de particiones de un worker. Los plazos se comparan con NOW() de
+    MySQL (no con el reloj local) y cada toma incrementa 'epoch', así un
+    worker que perdió el lease no puede renovarlo, escribir en la cola ni
+    confirmar una consolidación (check_lease). El
+    worker renueva antes de cada lead, por eso el peor caso de un lead
+    (lead_time_budget) debe ser bastante menor que LEASE_SECONDS.
+    """
+
+    def __init__(self, worker_id=None, count=PARTITION_COUNT, lease_seconds=LEASE_SECONDS):
+        self.worker_id = worker_id or default_worker_id()
+        self.count = count
+        self.lease_seconds = lease_seconds
+        self.held = {}  # partición -> epoch
+
+    def heartbeat(self, cursor):
+        """Registra al worker como vivo (cuenta para el reparto de particiones)."""
+        cursor.execute(f"""
+            INSERT INTO {WORKERS_TABLE} (worker_id, seen_at) VALUES (%s, NOW())
+            ON DUPLICATE KEY UPDATE seen_at = NOW()
+        """, (self.worker_id,))
+
+    def fair_share(self, cursor):
+        """Particiones que le tocan a cada worker vivo (redondeo hacia arriba)."""
+        cursor.execute(
+            f"SELECT COUNT(*) AS vivos FROM {WORKERS_TABLE} WHERE seen_at > NOW() - INTERVAL %s SECOND",
+            (self.lease_seconds,)
+        )
+        alive = max(1, cursor.fetchone()['vivos'])
+        return math.ceil(self.count / alive)
+
+    def renew(self, cursor, partition):
+        """Extiende el lease. Retorna False (y lo olvida) si otro worker lo tomó."""
+        cursor.execute(f"""
+            UPDATE {LEASE_TABLE} SET lease_until = NOW() + INTERVAL %s SECOND
+            WHERE partition_id = %s AND owner = %s AND epoch = %s
+        """, (self.lease_seconds, partition, self.worker_id, self.held[partition]))
+        if cursor.rowcount == 1 or self._still_owner(cursor, partition):
+            return True
+        self.lost(partition)
+        return False
+
+    def lost(self, partition):
+        """Olvida una partición que tomó otro worker."""
+        logger.warning("Lease perdido", extra=fields(component="partition", partition=partition, worker=self.worker_id))
+        self.held.pop(partition, None)
+
+    def _still_owner(self, cursor, partition):
+        # rowcount es 0 también si lease_until no cambió (dos renovaciones en el mismo segundo)
+        cursor.execute(f"SELECT owner, epoch FROM {LEASE_TABLE} WHERE partition_id = %s", (partition,))
+        row = cursor.fetchone()
+        return bool(row) and row['owner'] == self.worker_id and row['epoch'] == self.held[partition]
+
+    def release(self, cursor, partition):
+        cursor.execute(f"""
+            UPDATE {LEASE_TABLE} SET owner = NULL, lease_until = NULL
+            WHERE partition_id = %s AND owner = %s AND epoch = %s
+        """, (partition, self.worker_id, self.held.pop(partition)))
+
+    def release_all(self, cursor):
+        for partition in list(self.held):
+            self.release(cursor, partition)
+        cursor.execute(f"DELETE FROM {WORKERS_TABLE} WHERE worker_id = %s", (self.worker_id,))
+
+    def _try_acquire(self, cursor, partition):
+        cursor.execute(f"""
+            UPDATE {LEASE_TABLE}
+            SET owner = %s, lease_until = NOW() + INTERVAL %s SECOND, epoch = epoch + 1
+            WHERE partition_id = %s AND (owner IS NULL OR lease_until IS NULL OR lease_until < NOW())
+        """, (self.worker_id, self.lease_seconds, partition))
+        if cursor.rowcount != 1:
+            return False
+        cursor.execute(f"SELECT epoch FROM {LEASE_TABLE} WHERE partition_id = %s", (partition,))
+        self.held[partition] = cursor.fetchone()['epoch']
+        logger.info("Lease tomado", extra=fields(component="partition", partition=partition, worker=self.worker_id))
+        return True
+
+    def rebalance(self, cursor):
+        """
+        Renueva los leases propios, suelta los que excedan la parte justa (para
+        que los tome un worker nuevo) y toma particiones libres o vencidas hasta
+        completarla.
+
+        Returns:
+            list: particiones que tiene este worker
+        """
+        self.heartbeat(cursor)
+        share = self.fair_share(cursor)
+
+        for partition in list(self.held):
+            self.renew(cursor, partition)
+        while len(self.held) > share:
+            self.release(cursor, max(self.held))
+
+        if len(self.held) < share:
+            # Empezar en distinto punto por worker reparte mejor las tomas simultáneas
+            offset = partition_for(self.worker_id, "", self.count)
+            for i in range(self.count):
+                partition = (offset + i) % self.count
+                if partition in self.held:
+                    continue
+                if self._try_acquire(cursor, partition) and len(self.held) >= share:
+                    break
+
+        return sorted(self.held)
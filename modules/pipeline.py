@@ -0,0 +1,142 @@
+import logging
+import re
+import time
+
+from modules import lead_stats, schema
+from modules.lead_consolidator import consolidate_lead_to_registros, match_event
+from modules.log import fields
+from modules.records import LeadRecord
+
+logger = logging.getLogger(__name__)
+
+# Etapas del procesamiento de leads como generadores encadenables:
+#
+#   webhook:  parse_graph -> enrich -> match -> persist(store=True)
+#   backfill: parse_rows  ->           match -> persist(store=False)
+#
+# Cada etapa toma y entrega LeadRecord de a uno, así un backlog grande pasa
+# por el pipeline con memoria acotada.
+
+SALA_PATTERN = re.compile(r'^(S\d+)\s*-\s*(.+)$')
+
+_fb_leads_table_ready = False
+
+def extract_sala_and_clean_name(ad_name):
+    """
+    Extrae la sala del nombre del anuncio y limpia el nombre.
+
+    Ejemplos:
+    'S3 - De la Microscopía Óptica...' -> ('S3', 'De la Microscopía Óptica...')
+    'S1 - Determinación de Vida...' -> ('S1', 'Determinación de Vida...')
+    'Nombre sin sala' -> (None, 'Nombre sin sala')
+    """
+    if not ad_name:
+        return None, ad_name
+
+    match = SALA_PATTERN.match(ad_name.strip())
+    if match:
+        return match.group(1), match.group(2).strip()
+    return None, ad_name
+
+def parse_graph(items):
+    """(lead_json, form_id, page_id) de Graph API -> LeadRecord."""
+    for lead_json, form_id, page_id in items:
+        yield LeadRecord.from_graph(lead_json, form_id, page_id)
+
+def parse_rows(rows):
+    """Filas de fb_leads -> LeadRecord (ya tienen nombres y sala)."""
+    for row in rows:
+        yield LeadRecord.from_row(row)
+
+def enrich(leads, campaign_name, adset_name, ad_name):
+    """
+    Completa los nombres de campaña/adset/anuncio (funciones que reciben el id,
+    normalmente con cache) y separa la sala del nombre del anuncio.
+    """
+    for lead in leads:
+        lead.campaign_name = campaign_name(lead.campaign_id)
+        lead.adset_name = adset_name(lead.adset_id)
+        lead.sala, lead.ad_name = extract_sala_and_clean_name(ad_name(lead.ad_id))
+        yield lead
+
+def match(leads, cursor):
+    """Resuelve el evento de cada lead (lead.event_id; 0 si no hay evento)."""
+    for lead in leads:
+        match_event(lead, cursor)
+        yield lead
+
+def store_lead(cursor, lead):
+    """
+    Inserta o actualiza el lead en fb_leads (idempotente por id).
+    Retorna True si el lead es nuevo.
+    """
+    global _fb_leads_table_ready
+    if not _fb_leads_table_ready:
+        # Una sola vez por proceso; el esquema completo se verifica al arrancar
+        schema.ensure_fb_leads_table(cursor)
+        _fb_leads_table_ready = True
+
+    cursor.execute("""
+        INSERT INTO fb_leads (id, form_id, page_id, campaign_id, adset_id, ad_id,
+                              campaign_name, adset_name, ad_name, sala,
+                              full_name, email, phone, created_time, raw_json)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        ON DUPLICATE KEY UPDATE
+          campaign_id=VALUES(campaign_id),
+          adset_id=VALUES(adset_id),
+          ad_id=VALUES(ad_id),
+          campaign_name=VALUES(campaign_name),
+          adset_name=VALUES(adset_name),
+          ad_name=VALUES(ad_name),
+          sala=VALUES(sala),
+          full_name=VALUES(full_name),
+          email=VALUES(email),
+          phone=VALUES(phone),
+          raw_json=VALUES(raw_json);
+    """, (
+        lead.id,
+        lead.form_id,
+        lead.page_id,
+        lead.campaign_id,
+        lead.adset_id,
+        lead.ad_id,
+        lead.campaign_name,
+        lead.adset_name,
+        lead.ad_name,
+        lead.sala,
+        lead.full_name,
+        lead.email,
+        lead.phone,
+        lead.created_time.strftime("%Y-%m-%d %H:%M:%S"),
+        lead.raw_json
+    ))
+
+    # rowcount 1 = insert nuevo (2 = actualizado): cada lead se cuenta una sola vez
+    inserted = cursor.rowcount == 1
+    if inserted:
+        lead_stats.record_lead(cursor, lead.created_time, lead.campaign_name, lead.sala)
+    return inserted
+
+def persist(leads, cursor, connection, store=True, fence=None):
+    """
+    Guarda cada lead en fb_leads (si store) y lo consolida en expokossodo_registros.
+    Un error al guardar en fb_leads se propaga; la consolidación informa su
+    resultado en el bool (fence: ver consolidate_lead_to_registros).
+
+    Yields:
+        tuple: (lead, consolidado)
+    """
+    for lead in leads:
+        started = time.perf_counter()
+        if store:
+            store_lead(cursor, lead)
+        stored_at = time.perf_counter()
+        consolidated = consolidate_lead_to_registros(lead, cursor, connection, fence)
+        logger.info("Lead guardado", extra=fields(
+            component="persist",
+            lead_id=lead.id,
+            upsert_ms=(stored_at - started) * 1000,
+            consolidate_ms=(time.perf_counter() - stored_at) * 1000,
+            sampled=True
+        ))
+        yield lead, consolidated
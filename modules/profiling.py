@@ -0,0 +1,103 @@
+import cProfile
+import itertools
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from modules import codec, db
+from modules.log import fields
+
+logger = logging.getLogger(__name__)
+
+# Profiling bajo demanda (desactivado por defecto):
+#   PROFILE_SAMPLE_RATE  perfila 1 de cada N webhooks (0 = nunca)
+#   PROFILE_SECRET       permite pedir el perfil de una petición puntual con la
+#                        cabecera X-Profile: sha256=<HMAC del cuerpo con PROFILE_SECRET>
+#   PROFILE_DIR          carpeta de salida (.prof para snakeviz/pstats + resumen .txt)
+#   PROFILE_KEEP         perfiles que se conservan; los más antiguos se borran
+PROFILE_SAMPLE_RATE = int(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SECRET = os.environ.get("PROFILE_SECRET", "").encode()
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 50))
+PROFILE_HEADER = "X-Profile"
+
+_request_counter = itertools.count(1)
+# cProfile admite un solo perfil activo a la vez (Python 3.12+): los demás se omiten
+_active = threading.Lock()
+
+def should_profile(body, signature_header):
+    """Decide si perfilar esta petición: cabecera firmada válida o muestreo 1 de N."""
+    if PROFILE_SECRET and signature_header and codec.verify_hmac_sha256(PROFILE_SECRET, body, signature_header):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and next(_request_counter) % PROFILE_SAMPLE_RATE == 0
+
+def _rotate(folder, keep):
+    """Deja solo los 'keep' perfiles más recientes (cada perfil son dos archivos)."""
+    profiles = sorted(
+        (os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".prof")),
+        key=os.path.getmtime
+    )
+    for path in profiles[:-keep] if keep > 0 else []:
+        for stale in (path, path[:-len(".prof")] + ".txt"):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+def write_report(profiler, queries, label, folder=PROFILE_DIR, top=30):
+    """
+    Guarda el perfil (.prof) y un resumen legible (.txt) con las funciones de
+    mayor tiempo acumulado y las consultas SQL más costosas.
+
+    Returns:
+        str: ruta del archivo .prof
+    """
+    os.makedirs(folder, exist_ok=True)
+    base = os.path.join(folder, f"{label}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{os.getpid()}")
+    profiler.dump_stats(base + ".prof")
+
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write("Consultas SQL (por tiempo total)\n")
+        for statement, count, total_ms, max_ms in db.top_statements(queries, limit=15):
+            f.write(f"{total_ms:10.1f} ms  x{count:<5} max {max_ms:8.1f} ms  {statement}\n")
+        f.write("\n")
+        stats = pstats.Stats(profiler, stream=f)
+        stats.sort_stats("cumulative").print_stats(top)
+
+    _rotate(folder, PROFILE_KEEP)
+    return base + ".prof"
+
+@contextmanager
+def profiled(label, enabled=True, folder=PROFILE_DIR):
+    """
+    Ejecuta el bloque bajo cProfile capturando además los tiempos de las
+    consultas (db.capture_queries) y escribe el reporte al salir.
+    Con enabled=False no hace nada.
+    """
+    if not enabled or not _active.acquire(blocking=False):
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    with db.capture_queries() as queries:
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            try:
+                path = write_report(profiler, queries, label, folder)
+                logger.info("Perfil guardado", extra=fields(
+                    component="profile",
+                    label=label, path=path, total_ms=(time.perf_counter() - started) * 1000,
+                    queries=sum(entry[0] for entry in queries.values())
+                ))
+            except Exception as e:
+                logger.warning("No se pudo guardar el perfil", extra=fields(component="profile", label=label, error=e))
+            finally:
+                _active.release()
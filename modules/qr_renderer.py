@@ -0,0 +1,101 @@
+import hashlib
+import os
+import statistics
+import time
+from multiprocessing import Pool
+
+# Las imágenes se guardan por hash del texto del QR: el mismo código nunca se
+# renderiza dos veces y el nombre del archivo no expone datos del participante.
+QR_STORE_DIR = os.environ.get("QR_STORE_DIR", "QR_codes")
+QR_FORMATS = ("png", "svg")
+
+def qr_hash(qr_text):
+    """SHA-256 del texto del QR (clave del almacén)."""
+    return hashlib.sha256(qr_text.encode("utf-8")).hexdigest()
+
+def store_path(qr_text, fmt, store_dir=QR_STORE_DIR):
+    """Ruta de la imagen en el almacén: <store>/<2 primeros hex>/<hash>.<fmt>"""
+    digest = qr_hash(qr_text)
+    return os.path.join(store_dir, digest[:2], f"{digest}.{fmt}")
+
+def is_rendered(qr_text, fmt, store_dir=QR_STORE_DIR):
+    return os.path.exists(store_path(qr_text, fmt, store_dir))
+
+def render_qr(task):
+    """
+    Renderiza un QR y lo escribe en el almacén. Corre dentro del pool de
+    procesos, por eso recibe una tupla (qr_text, fmt, store_dir).
+
+    Returns:
+        tuple: (hash, formato, segundos, error o None)
+    """
+    qr_text, fmt, store_dir = task
+    started = time.perf_counter()
+    path = store_path(qr_text, fmt, store_dir)
+
+    try:
+        import qrcode
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4)
+        qr.add_data(qr_text)
+        qr.make(fit=True)
+
+        if fmt == "svg":
+            import qrcode.image.svg
+            image = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        else:
+            image = qr.make_image()
+
+        # Escritura atómica: un render interrumpido nunca deja un archivo a medias
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            image.save(f)
+        os.replace(tmp_path, path)
+        return qr_hash(qr_text), fmt, time.perf_counter() - started, None
+
+    except Exception as e:
+        return qr_hash(qr_text), fmt, time.perf_counter() - started, str(e)
+
+def _pending_tasks(qr_texts, formats, store_dir, summary):
+    """Tareas (qr_text, fmt, store_dir) de las imágenes que faltan en el almacén."""
+    for qr_text in qr_texts:
+        summary["qr"] += 1
+        for fmt in formats:
+            if is_rendered(qr_text, fmt, store_dir):
+                summary["existing"] += 1
+                continue
+            yield qr_text, fmt, store_dir
+
+def render_many(qr_texts, formats=("png",), workers=None, store_dir=QR_STORE_DIR, chunksize=32, summary=None):
+    """
+    Renderiza en paralelo los QR que aún no están en el almacén. qr_texts
+    puede ser un generador: el pool lo consume a medida que avanza
+    (imap_unordered), así la memoria no crece con la cantidad de registros.
+    Las imágenes ya existentes se omiten sin enviarse al pool; si se pasa
+    'summary' (dict) se cuentan ahí los QR leídos ('qr') y las omitidas ('existing').
+
+    Returns:
+        generator de (hash, formato, segundos, error), en orden de término
+    """
+    if summary is None:
+        summary = {}
+    summary.setdefault("qr", 0)
+    summary.setdefault("existing", 0)
+
+    with Pool(workers) as pool:
+        yield from pool.imap_unordered(render_qr, _pending_tasks(qr_texts, formats, store_dir, summary), chunksize=chunksize)
+
+def timing_stats(durations):
+    """Resumen de tiempos por imagen (en milisegundos)."""
+    if not durations:
+        return {"count": 0}
+    ordered = sorted(durations)
+    return {
+        "count": len(ordered),
+        "total_s": sum(ordered),
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
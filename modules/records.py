@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+
+from modules import codec
+from modules.events_matcher import normalize_by_45_char, normalize_by_colon
+from modules.lead_fields import extract_fields
+
+# Registros compactos (con __slots__) que recorren el pipeline en lugar de
+# dicts ad-hoc: sin __dict__ por instancia y con los campos a la vista.
+
+class LeadRecord:
+    """Un lead de Facebook, desde que se parsea hasta que se consolida."""
+
+    __slots__ = (
+        "id", "form_id", "page_id", "created_time",
+        "campaign_id", "adset_id", "ad_id",
+        "campaign_name", "adset_name", "ad_name", "sala",
+        "full_name", "email", "phone", "job_title", "company_name",
+        "raw_json", "event_id",
+    )
+
+    def __init__(self, id, form_id=None, page_id=None, created_time=None,
+                 campaign_id=None, adset_id=None, ad_id=None,
+                 campaign_name=None, adset_name=None, ad_name=None, sala=None,
+                 full_name=None, email=None, phone=None, job_title=None, company_name=None,
+                 raw_json=None):
+        self.id = id
+        self.form_id = form_id
+        self.page_id = page_id
+        self.created_time = created_time
+        self.campaign_id = campaign_id
+        self.adset_id = adset_id
+        self.ad_id = ad_id
+        self.campaign_name = campaign_name
+        self.adset_name = adset_name
+        self.ad_name = ad_name
+        self.sala = sala
+        self.full_name = full_name
+        self.email = email
+        self.phone = phone
+        self.job_title = job_title
+        self.company_name = company_name
+        self.raw_json = raw_json
+        # None = aún sin matching; 0 = no se encontró evento
+        self.event_id = None
+
+    @classmethod
+    def from_graph(cls, lead_json, form_id, page_id):
+        """Crea el registro desde la respuesta de Graph API (sin nombres de campaña/anuncio)."""
+        values = extract_fields(lead_json.get("field_data", []))
+        created_time = datetime.fromisoformat(lead_json["created_time"].replace("Z", "+00:00")).astimezone(timezone.utc)
+        return cls(
+            int(lead_json["id"]),
+            form_id=int(form_id),
+            page_id=int(page_id),
+            created_time=created_time,
+            campaign_id=lead_json.get("campaign_id"),
+            adset_id=lead_json.get("adset_id"),
+            ad_id=lead_json.get("ad_id"),
+            full_name=values['full_name'],
+            email=values['email'],
+            phone=values['phone'],
+            job_title=values['job_title'],
+            company_name=values['company_name'],
+            raw_json=codec.dumps(lead_json),
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        """Crea el registro desde una fila de fb_leads (job_title/company_name son columnas generadas)."""
+        return cls(
+            row['id'],
+            ad_name=row['ad_name'],
+            adset_name=row['adset_name'],
+            sala=row['sala'],
+            full_name=row['full_name'],
+            email=row['email'],
+            phone=row['phone'],
+            job_title=row['job_title'] or '',
+            company_name=row['company_name'] or '',
+        )
+
+    def __repr__(self):
+        return f"LeadRecord(id={self.id}, email={self.email!r}, event_id={self.event_id})"
+
+class EventRecord:
+    """
+    Un evento de expokossodo_eventos con las claves de matching ya calculadas
+    (fecha ISO y títulos normalizados), así no se recalculan por cada lead.
+    """
+
+    __slots__ = ("id", "titulo_charla", "fecha", "sala", "fecha_iso", "key_45", "key_colon")
+
+    def __init__(self, id, titulo_charla, fecha, sala):
+        self.id = id
+        self.titulo_charla = titulo_charla
+        self.fecha = fecha
+        self.sala = sala
+        self.fecha_iso = fecha.strftime('%Y-%m-%d') if fecha else ''
+        self.key_45 = normalize_by_45_char(titulo_charla)
+        self.key_colon = normalize_by_colon(titulo_charla)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['id'], row['titulo_charla'], row['fecha'], row['sala'])
+
+    def __repr__(self):
+        return f"EventRecord(id={self.id}, fecha={self.fecha_iso}, sala={self.sala!r})"
@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from modules import db
+from modules.log import fields
+
+logger = logging.getLogger(__name__)
+
+# Parámetros por defecto (por dependencia se pueden sobreescribir con <NOMBRE>_*)
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.environ.get("BREAKER_RESET_TIMEOUT", 30))
+
+class DependencyUnavailable(Exception):
+    """La dependencia no acepta trabajo ahora (circuito abierto o límite de concurrencia)."""
+
+class CircuitBreaker:
+    """
+    Circuito clásico de tres estados:
+    - closed: deja pasar todo; tras 'failure_threshold' fallos seguidos se abre
+    - open: rechaza todo durante 'reset_timeout' segundos
+    - half_open: deja pasar una sola prueba; si funciona se cierra, si no se reabre
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def would_allow(self):
+        """Como allow() pero sin reservar la prueba del estado half_open."""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self._opened_at >= self.reset_timeout
+            return self.state == "closed" or not self._probe_in_flight
+
+    def release_probe(self):
+        """Devuelve la prueba de half_open cuando la llamada no llegó a ejecutarse."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Circuito cerrado", extra=fields(component="breaker", dependency=self.name))
+            self.state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("Circuito abierto", extra=fields(component="breaker", dependency=self.name, failures=self._failures))
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+class AdaptiveLimiter:
+    """
+    Límite de concurrencia AIMD: sube de a poco (+1/limit por llamada) mientras
+    la latencia esté bajo 'target_latency' y se reduce a la mitad cuando se
+    supera o la llamada falla.
+    """
+
+    def __init__(self, name, target_latency, initial_limit=8, min_limit=1, max_limit=64):
+        self.name = name
+        self.target_latency = target_latency
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, ok):
+        with self._lock:
+            self.in_flight -= 1
+            if ok and latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            else:
+                self.limit = max(self.min_limit, self.limit / 2)
+
+def http_failure(error):
+    """
+    Para Graph API: cuentan como fallo la conexión, los timeouts, 429 y 5xx.
+    Un 4xx (lead borrado, permisos, token vencido) es problema del pedido.
+    """
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+def mysql_failure(error):
+    """Para MySQL: solo los errores de conexión/servidor (OperationalError, InterfaceError)."""
+    return db.is_connection_error(error)
+
+class Dependency:
+    """
+    Circuito + límite adaptativo para una dependencia externa (MySQL, Graph API).
+    is_failure(excepción) decide si un error dentro de call() es de la
+    dependencia (cuenta para el circuito) o del pedido (se propaga sin contar).
+    """
+
+    def __init__(self, name, target_latency, is_failure=None):
+        prefix = name.upper()
+        self.name = name
+        self.is_failure = is_failure or (lambda error: True)
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=int(os.environ.get(f"{prefix}_BREAKER_FAILURES", BREAKER_FAILURE_THRESHOLD)),
+            reset_timeout=float(os.environ.get(f"{prefix}_BREAKER_RESET", BREAKER_RESET_TIMEOUT)),
+        )
+        self.limiter = AdaptiveLimiter(
+            name,
+            target_latency=float(os.environ.get(f"{prefix}_TARGET_LATENCY", target_latency)),
+            max_limit=int(os.environ.get(f"{prefix}_MAX_CONCURRENCY", 64)),
+        )
+
+    def available(self):
+        """Indica (sin reservar) si la dependencia está aceptando trabajo."""
+        return self.breaker.would_allow()
+
+    @contextmanager
+    def call(self):
+        """
+        Envuelve una llamada a la dependencia. Lanza DependencyUnavailable sin
+        ejecutar nada si el circuito está abierto o se alcanzó el límite.
+        """
+        if not self.breaker.allow():
+            raise DependencyUnavailable(f"{self.name}: circuito abierto")
+        if not self.limiter.try_acquire():
+            self.breaker.release_probe()
+            raise DependencyUnavailable(f"{self.name}: límite de concurrencia ({int(self.limiter.limit)})")
+
+        started = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        except Exception as e:
+            # La dependencia respondió; el error es del pedido
+            ok = not self.is_failure(e)
+            raise
+        finally:
+            self.limiter.release(time.monotonic() - started, ok)
+            if ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def status(self):
+        return {
+            "state": self.breaker.state,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+        }
+
+# Latencias objetivo: MySQL responde en milisegundos, Graph API en cientos
+mysql = Dependency("mysql", target_latency=1.0, is_failure=mysql_failure)
+graph = Dependency("graph", target_latency=3.0, is_failure=http_failure)
@@ -0,0 +1,317 @@
+import logging
+
+from modules import db
+from modules.availability import ensure_waitlist_table
+from modules.lead_consolidator import ensure_procesado_column
+from modules.lead_fields import GENERATED_FIELDS, generated_column_definition
+from modules.lead_stats import ensure_stats_table
+from modules.log import fields
+from modules.partitions import ensure_partition_tables, is_partitioned
+from modules.slot_counter import ensure_slot_deltas_table
+
+logger = logging.getLogger(__name__)
+
+# Columnas calculadas por MySQL desde raw_json (job_title, company_name)
+GENERATED_COLUMNS = {field: generated_column_definition(field) for field in GENERATED_FIELDS}
+
+FB_LEADS_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS fb_leads (
+      id BIGINT PRIMARY KEY,
+      form_id BIGINT NOT NULL,
+      page_id BIGINT NOT NULL,
+      campaign_id VARCHAR(64) NULL,
+      adset_id VARCHAR(64) NULL,
+      ad_id VARCHAR(64) NULL,
+      campaign_name VARCHAR(255) NULL,
+      adset_name VARCHAR(255) NULL,
+      ad_name VARCHAR(255) NULL,
+      sala VARCHAR(10) NULL,
+      full_name VARCHAR(255) NULL,
+      email VARCHAR(255) NULL,
+      phone VARCHAR(64) NULL,
+      created_time DATETIME NOT NULL,
+      raw_json JSON NOT NULL,
+      job_title {GENERATED_COLUMNS['job_title']},
+      company_name {GENERATED_COLUMNS['company_name']},
+      procesado TINYINT(1) DEFAULT 0,
+      enviado TINYINT(1) DEFAULT 0,
+      ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Columnas agregadas después de la versión inicial de fb_leads
+REQUIRED_COLUMNS = {
+    'campaign_name': 'VARCHAR(255) NULL',
+    'adset_name': 'VARCHAR(255) NULL',
+    'ad_name': 'VARCHAR(255) NULL',
+    'sala': 'VARCHAR(10) NULL',
+    'enviado': 'TINYINT(1) DEFAULT 0'
+}
+
+# Migración de expokossodo_registros (tabla del sistema de registro). No corre
+# al arrancar: se aplica con 'flask --app app migrate-registros' o con
+# MIGRATE_REGISTROS_ACTUALIZADO.sql. actualizado_at permite exportar solo lo
+# que cambió desde la última exportación (ver modules/exporter.py).
+REGISTROS_COLUMNS = {
+    'actualizado_at': 'TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'
+}
+REGISTROS_INDEXES = [
+    ('expokossodo_registros', 'idx_actualizado', ('actualizado_at', 'id'), False),
+]
+
+FB_LEADS_INDEXES = {
+    'idx_campaign_name': 'campaign_name',
+    'idx_adset_name': 'adset_name',
+    'idx_ad_name': 'ad_name',
+    'idx_sala': 'sala',
+}
+
+# Índices de las consultas de consolidación: (tabla, nombre, columnas, único).
+# idx_enviado_created reemplaza al antiguo idx_enviado (sirve al WHERE y al ORDER BY).
+MANAGED_INDEXES = [
+    ('fb_leads', 'idx_enviado_created', ('enviado', 'created_time', 'id'), False),
+    ('expokossodo_registros', 'idx_correo', ('correo',), False),
+    ('expokossodo_registro_eventos', 'uq_registro_evento', ('registro_id', 'evento_id'), True),
+]
+
+# Índices reemplazados por uno de MANAGED_INDEXES: (tabla, nombre, columnas del
+# reemplazo). Se eliminan solo cuando el reemplazo ya existe.
+REPLACED_INDEXES = [
+    ('fb_leads', 'idx_enviado', ('enviado', 'created_time', 'id')),
+]
+
+# Consultas calientes con parámetros de ejemplo para el chequeo con EXPLAIN
+HOT_QUERIES = {
+    'registro_por_correo': (
+        "SELECT id, eventos_seleccionados FROM expokossodo_registros WHERE correo = %s",
+        ('check@example.com',)
+    ),
+    'relacion_registro_evento': (
+        "SELECT 1 FROM expokossodo_registro_eventos WHERE registro_id = %s AND evento_id = %s LIMIT 1",
+        (0, 0)
+    ),
+    'leads_pendientes': (
+        "SELECT id FROM fb_leads WHERE enviado = 0 ORDER BY created_time ASC, id ASC",
+        ()
+    ),
+}
+
+def ensure_fb_leads_table(cursor):
+    """Crea la tabla fb_leads si no existe."""
+    cursor.execute(FB_LEADS_TABLE_SQL)
+
+def ensure_schema(cursor, connection):
+    """
+    Verifica la tabla fb_leads completa: la crea si falta, agrega columnas
+    nuevas y crea los índices. Pensado para correr una vez por despliegue.
+    """
+    ensure_fb_leads_table(cursor)
+
+    # Verificar y crear columnas 'procesado' y 'enviado'
+    ensure_procesado_column(cursor, connection)
+
+    # Obtener columnas existentes
+    cursor.execute("SHOW COLUMNS FROM fb_leads")
+    existing_columns = {row['Field'] for row in cursor.fetchall()}
+
+    # Verificar y agregar columnas faltantes
+    for column_name, column_definition in REQUIRED_COLUMNS.items():
+        if column_name not in existing_columns:
+            try:
+                cursor.execute(f"ALTER TABLE fb_leads ADD COLUMN {column_name} {column_definition}")
+                logger.info("Columna agregada", extra=fields(component="schema", table="fb_leads", column=column_name))
+            except Exception as e:
+                logger.error("Error agregando columna", extra=fields(component="schema", table="fb_leads", column=column_name, error=e))
+
+    # Columnas generadas desde raw_json (MySQL 5.7+). Al agregarlas se calculan
+    # también para los leads existentes, sin backfill desde Python.
+    for column_name, column_definition in GENERATED_COLUMNS.items():
+        if column_name not in existing_columns:
+            try:
+                cursor.execute(f"ALTER TABLE fb_leads ADD COLUMN {column_name} {column_definition}")
+                logger.info("Columna generada agregada", extra=fields(component="schema", table="fb_leads", column=column_name))
+            except Exception as e:
+                logger.error("Error agregando columna generada", extra=fields(component="schema", table="fb_leads", column=column_name, error=e))
+
+    # Crear índices si no existen
+    cursor.execute("SHOW INDEX FROM fb_leads")
+    existing_indexes = {row['Key_name'] for row in cursor.fetchall()}
+
+    for index_name, column_name in FB_LEADS_INDEXES.items():
+        if index_name in existing_indexes:
+            continue
+        try:
+            cursor.execute(f"CREATE INDEX {index_name} ON fb_leads({column_name})")
+            logger.info("Índice creado", extra=fields(component="schema", table="fb_leads", index=index_name))
+        except Exception as e:
+            logger.warning("No se pudo crear el índice", extra=fields(component="schema", table="fb_leads", index=index_name, error=e))
+
+    ensure_managed_indexes(cursor, connection)
+    drop_replaced_indexes(cursor, connection)
+
+    # Tabla append-only de incrementos de slots_ocupados, lista de espera y resumen
+    ensure_slot_deltas_table(cursor)
+    ensure_waitlist_table(cursor)
+    ensure_stats_table(cursor)
+    if is_partitioned():
+        ensure_partition_tables(cursor)
+
+    connection.commit()
+    logger.info("Verificación de esquema completada", extra=fields(component="schema"))
+
+def migrate_registros(cursor, connection):
+    """
+    Agrega a expokossodo_registros las columnas de REGISTROS_COLUMNS y los
+    índices de REGISTROS_INDEXES que falten. Si el usuario de MySQL no tiene
+    privilegio de ALTER/INDEX registra una advertencia en lugar de fallar: la
+    exportación sigue funcionando, solo sin modo incremental.
+
+    Returns:
+        bool: True si la tabla quedó migrada
+    """
+    try:
+        cursor.execute("SHOW COLUMNS FROM expokossodo_registros")
+        existing_columns = {row['Field'] for row in cursor.fetchall()}
+        for column_name, column_definition in REGISTROS_COLUMNS.items():
+            if column_name not in existing_columns:
+                cursor.execute(f"ALTER TABLE expokossodo_registros ADD COLUMN {column_name} {column_definition}")
+                logger.info("Columna agregada", extra=fields(component="schema", table="expokossodo_registros", column=column_name))
+
+        for table, index_name, columns, unique in REGISTROS_INDEXES:
+            if _has_index(_index_columns(cursor, table), index_name, columns, unique):
+                continue
+            cursor.execute(f"CREATE INDEX {index_name} ON {table}({', '.join(columns)})")
+            logger.info("Índice creado", extra=fields(component="schema", table=table, index=index_name))
+
+        connection.commit()
+    except Exception as e:
+        if db.mysql_error_code(e) not in db.PRIVILEGE_ERRORS:
+            raise
+        logger.warning("Sin privilegios para migrar la tabla", extra=fields(component="schema", table="expokossodo_registros", error=e))
+        return False
+
+    return True
+
+def _index_columns(cursor, table):
+    """Retorna {nombre_indice: ((columnas en orden), es_unico)} de la tabla."""
+    cursor.execute(f"SHOW INDEX FROM {table}")
+    indexes = {}
+    unique = {}
+    for row in cursor.fetchall():
+        indexes.setdefault(row['Key_name'], []).append((row['Seq_in_index'], row['Column_name']))
+        unique[row['Key_name']] = int(row['Non_unique']) == 0
+    return {name: (tuple(col for _, col in sorted(cols)), unique[name]) for name, cols in indexes.items()}
+
+def _has_index(existing, index_name, columns, unique):
+    """
+    Un índice común está presente si existe con ese nombre o si otro índice
+    empieza con las mismas columnas. Uno único exige un índice UNIQUE sobre
+    exactamente esas columnas: un índice común no protege contra duplicados.
+    """
+    if unique:
+        return any(cols == columns and is_unique for cols, is_unique in existing.values())
+    return index_name in existing or any(cols[:len(columns)] == columns for cols, _ in existing.values())
+
+def _find_duplicates(cursor, table, columns):
+    """Retorna hasta 5 combinaciones repetidas que impedirían crear un índice único."""
+    cols = ", ".join(columns)
+    cursor.execute(f"SELECT {cols}, COUNT(*) AS total FROM {table} GROUP BY {cols} HAVING COUNT(*) > 1 LIMIT 5")
+    return cursor.fetchall()
+
+def ensure_managed_indexes(cursor, connection, create=True):
+    """
+    Verifica el conjunto de índices de MANAGED_INDEXES (ver _has_index).
+    Con create=False solo reporta.
+
+    Returns:
+        list: índices que faltan (tabla, nombre, columnas)
+    """
+    missing = []
+
+    for table, index_name, columns, unique in MANAGED_INDEXES:
+        try:
+            existing = _index_columns(cursor, table)
+        except Exception as e:
+            logger.warning("No se pudo leer los índices", extra=fields(component="schema", table=table, error=e))
+            continue
+
+        if _has_index(existing, index_name, columns, unique):
+            continue
+
+        if not create:
+            missing.append((table, index_name, columns))
+            continue
+
+        if unique:
+            duplicates = _find_duplicates(cursor, table, columns)
+            if duplicates:
+                logger.warning("No se crea el índice único: hay filas duplicadas", extra=fields(component="schema", table=table, index=index_name, ejemplo=duplicates[0]))
+                missing.append((table, index_name, columns))
+                continue
+
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        try:
+            cursor.execute(f"CREATE {kind} {index_name} ON {table}({', '.join(columns)})")
+            connection.commit()
+            logger.info("Índice creado", extra=fields(component="schema", table=table, index=index_name))
+        except Exception as e:
+            logger.error("Error creando índice", extra=fields(component="schema", table=table, index=index_name, error=e))
+            missing.append((table, index_name, columns))
+
+    return missing
+
+def drop_replaced_indexes(cursor, connection, drop=True):
+    """
+    Elimina los índices de REPLACED_INDEXES que siguen existiendo, si su
+    reemplazo ya está (ver _has_index). Con drop=False solo reporta.
+
+    Returns:
+        list: índices redundantes que quedan (tabla, nombre)
+    """
+    redundant = []
+
+    for table, index_name, replacement in REPLACED_INDEXES:
+        try:
+            existing = _index_columns(cursor, table)
+        except Exception as e:
+            logger.warning("No se pudo leer los índices", extra=fields(component="schema", table=table, error=e))
+            continue
+
+        if index_name not in existing or not _has_index(existing, None, replacement, False):
+            continue
+
+        if not drop:
+            redundant.append((table, index_name))
+            continue
+
+        try:
+            cursor.execute(f"DROP INDEX {index_name} ON {table}")
+            connection.commit()
+            logger.info("Índice redundante eliminado", extra=fields(component="schema", table=table, index=index_name))
+        except Exception as e:
+            logger.error("Error eliminando índice", extra=fields(component="schema", table=table, index=index_name, error=e))
+            redundant.append((table, index_name))
+
+    return redundant
+
+def explain_hot_queries(cursor):
+    """
+    Ejecuta EXPLAIN sobre las consultas de HOT_QUERIES y marca los planes con
+    recorrido completo (type=ALL) o con ordenamiento en archivo (filesort).
+
+    Returns:
+        list: (consulta, tabla, tipo de acceso, índice usado, filas estimadas, problemas)
+    """
+    results = []
+
+    for query_name, (sql, params) in HOT_QUERIES.items():
+        cursor.execute(f"EXPLAIN {sql}", params)
+        for row in cursor.fetchall():
+            problems = []
+            if row.get('type') == 'ALL':
+                problems.append('full scan')
+            if 'filesort' in (row.get('Extra') or ''):
+                problems.append('filesort')
+            results.append((query_name, row.get('table'), row.get('type'), row.get('key'), row.get('rows'), problems))
+
+    return results
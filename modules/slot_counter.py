@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+
+from modules.log import fields
+
+logger = logging.getLogger(__name__)
+
+# Los incrementos de slots se agregan como filas nuevas (sin bloquear la fila del
+# evento) y se consolidan en expokossodo_eventos.slots_ocupados al compactar.
+SLOT_DELTAS_TABLE = "expokossodo_eventos_slots_delta"
+COMPACTION_LOCK_NAME = "expokossodo_slot_compaction"
+SLOT_COMPACTION_INTERVAL = float(os.environ.get("SLOT_COMPACTION_INTERVAL", 30))
+
+_table_ready = False
+
+def ensure_slot_deltas_table(cursor):
+    """Crea la tabla append-only de incrementos de slots si no existe."""
+    global _table_ready
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SLOT_DELTAS_TABLE} (
+          id BIGINT AUTO_INCREMENT PRIMARY KEY,
+          evento_id INT NOT NULL,
+          delta INT NOT NULL DEFAULT 1,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          INDEX idx_evento (evento_id)
+        )
+    """)
+    _table_ready = True
+
+def ensure_slot_deltas_ready(cursor):
+    """
+    Crea la tabla una sola vez por proceso. Debe llamarse antes de abrir una
+    transacción: el CREATE TABLE hace commit implícito.
+    """
+    if not _table_ready:
+        ensure_slot_deltas_table(cursor)
+
+def record_slot_increment(cursor, evento_id, delta=1):
+    """Registra un incremento de slots ocupados para el evento (solo INSERT, sin UPDATE)."""
+    ensure_slot_deltas_ready(cursor)
+    cursor.execute(
+        f"INSERT INTO {SLOT_DELTAS_TABLE} (evento_id, delta) VALUES (%s, %s)",
+        (evento_id, delta)
+    )
+
+def pending_increments(cursor):
+    """Retorna {evento_id: incrementos aún no compactados}."""
+    ensure_slot_deltas_ready(cursor)
+    cursor.execute(f"SELECT evento_id, SUM(delta) AS total FROM {SLOT_DELTAS_TABLE} GROUP BY evento_id")
+    return {row['evento_id']: int(row['total']) for row in cursor.fetchall()}
+
+def _acquire_lock(cursor):
+    """Lock con nombre para que solo un proceso compacte a la vez (no espera)."""
+    cursor.execute("SELECT GET_LOCK(%s, 0) AS locked", (COMPACTION_LOCK_NAME,))
+    return (cursor.fetchone() or {}).get('locked') == 1
+
+def _release_lock(cursor):
+    cursor.execute("SELECT RELEASE_LOCK(%s)", (COMPACTION_LOCK_NAME,))
+    cursor.fetchall()
+
+def compact_slot_increments(cursor, connection):
+    """
+    Suma los incrementos pendientes a expokossodo_eventos.slots_ocupados (un UPDATE
+    por evento) y los elimina, en una sola transacción.
+
+    Returns:
+        dict: {evento_id: slots sumados}, o None si otro proceso está compactando
+    """
+    ensure_slot_deltas_ready(cursor)
+    if not _acquire_lock(cursor):
+        return None
+
+    try:
+        connection.begin()
+        cursor.execute(f"SELECT MAX(id) AS max_id FROM {SLOT_DELTAS_TABLE}")
+        max_id = (cursor.fetchone() or {}).get('max_id')
+        if max_id is None:
+            connection.commit()
+            return {}
+
+        # Lectura con bloqueo: espera a los INSERT aún no confirmados del rango,
+        # así el DELETE posterior nunca borra un incremento que no se sumó
+        cursor.execute(
+            f"SELECT evento_id, delta FROM {SLOT_DELTAS_TABLE} WHERE id <= %s FOR UPDATE",
+            (max_id,)
+        )
+        totals = {}
+        for row in cursor.fetchall():
+            totals[row['evento_id']] = totals.get(row['evento_id'], 0) + row['delta']
+
+        for evento_id, total in totals.items():
+            cursor.execute(
+                "UPDATE expokossodo_eventos SET slots_ocupados = slots_ocupados + %s WHERE id = %s",
+                (total, evento_id)
+            )
+        cursor.execute(f"DELETE FROM {SLOT_DELTAS_TABLE} WHERE id <= %s", (max_id,))
+        connection.commit()
+
+        if totals:
+            logger.info("Incrementos compactados", extra=fields(component="slots", increments=sum(totals.values()), events=len(totals)))
+        return totals
+
+    except Exception as e:
+        logger.error("Error compactando slots", extra=fields(component="slots", error=e))
+        connection.rollback()
+        raise
+    finally:
+        _release_lock(cursor)
+
+def reconcile_slots(cursor, connection):
+    """
+    Recalcula slots_ocupados de todos los eventos desde expokossodo_registro_eventos
+    en una sola consulta agrupada y descarta los incrementos pendientes.
+
+    Returns:
+        int: cantidad de eventos cuyo contador cambió, o None si hay una compactación en curso
+    """
+    ensure_slot_deltas_ready(cursor)
+    if not _acquire_lock(cursor):
+        return None
+
+    try:
+        connection.begin()
+        cursor.execute(f"DELETE FROM {SLOT_DELTAS_TABLE}")
+        cursor.execute("""
+            UPDATE expokossodo_eventos e
+            LEFT JOIN (
+                SELECT evento_id, COUNT(*) AS total
+                FROM expokossodo_registro_eventos
+                GROUP BY evento_id
+            ) r ON r.evento_id = e.id
+            SET e.slots_ocupados = COALESCE(r.total, 0)
+        """)
+        changed = cursor.rowcount
+        connection.commit()
+        logger.info("Reconciliación completada", extra=fields(component="slots", events_changed=changed))
+        return changed
+
+    except Exception as e:
+        logger.error("Error reconciliando slots", extra=fields(component="slots", error=e))
+        connection.rollback()
+        raise
+    finally:
+        _release_lock(cursor)
+
+def start_compaction_thread(get_connection, stop, interval=SLOT_COMPACTION_INTERVAL):
+    """
+    Lanza un hilo que compacta los incrementos cada 'interval' segundos hasta
+    que se active 'stop' (threading.Event del apagado del proceso).
+    get_connection debe ser un context manager que entregue una conexión MySQL.
+    """
+    def loop():
+        while not stop.wait(interval):
+            try:
+                with get_connection() as conn, conn.cursor() as cur:
+                    compact_slot_increments(cur, conn)
+            except Exception as e:
+                logger.error("Compactación periódica de slots falló", extra=fields(component="slots", error=e))
+
+    thread = threading.Thread(target=loop, name="slot-compaction", daemon=True)
+    thread.start()
+    return thread
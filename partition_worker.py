@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Worker del modo particionado (PROCESSING_MODE=partitioned)
+
+Este script:
+1. Se registra como worker vivo y toma leases de su parte de las particiones
+   (PARTITION_COUNT / workers vivos), soltando las que le sobren
+2. Procesa en orden de llegada los leads encolados por el webhook en sus
+   particiones (Graph API con el token de la página + guardado + consolidación)
+3. Renueva el lease y toma cada lead con un UPDATE cercado por (owner, epoch)
+   antes de procesarlo; lo cierra igual y verifica el lease dentro de la
+   transacción de consolidación. Si perdió el lease, deja la partición
+4. Al recibir SIGTERM/SIGINT termina el lead en curso y libera sus leases
+
+Se pueden correr varios por nodo y en varios nodos contra la misma BD.
+
+Uso:
+    python partition_worker.py [--worker-id nodo1-a] [--batch-size 50] [--idle-sleep 2]
+"""
+
+import argparse
+import functools
+import os
+import signal
+import threading
+
+import app
+from modules import db, partitions, resilience
+from modules.log import fields
+
+logger = app.app.logger
+stop_event = threading.Event()
+
+# Timeouts del worker: el peor caso de un lead (partitions.lead_time_budget)
+# debe quedar por debajo de la mitad del lease, así el lead termina antes de que
+# otro worker pueda tomar la partición
+WORKER_GRAPH_TIMEOUT = float(os.environ.get("PARTITION_GRAPH_TIMEOUT", 5))
+WORKER_DB_QUERY_TIMEOUT = int(os.environ.get("PARTITION_DB_QUERY_TIMEOUT", 2))
+
+def process_partition(cursor, leases, partition, batch_size):
+    """
+    Procesa los leads pendientes de una partición en orden. Cada lead se toma
+    con claim_item y se cierra con mark_done/mark_failed, cercados por el lease.
+    Si un lead falla (sin agotar intentos) la partición se detiene en él para no
+    alterar el orden.
+
+    Returns:
+        int: leads procesados
+    """
+    processed = 0
+    try:
+        for item in partitions.next_items(cursor, partition, batch_size):
+            if stop_event.is_set() or not leases.renew(cursor, partition):
+                break
+            epoch = leases.held[partition]
+            partitions.claim_item(cursor, item['seq'], leases.worker_id, epoch)
+            leadgen_id = str(item['leadgen_id'])
+            # La consolidación confirma solo si el lease sigue siendo de este worker
+            fence = functools.partial(partitions.check_lease, partition=partition, worker_id=leases.worker_id, epoch=epoch)
+            try:
+                app.process_leadgen(leadgen_id, item['form_id'], item['page_id'], fence=fence)
+            except (resilience.DependencyUnavailable, partitions.LeaseLost):
+                # Sin sumar intentos: queda 'processing' y se retoma cuando la
+                # dependencia vuelva o lo toma el nuevo dueño de la partición
+                raise
+            except Exception as e:
+                discarded = partitions.mark_failed(cursor, item, e, leases.worker_id, epoch)
+                logger.warning("Error procesando lead", extra=fields(
+                    component="partition",
+                    lead_id=leadgen_id, partition=partition, attempts=item['attempts'] + 1, discarded=discarded, error=e
+                ))
+                if not discarded:
+                    break
+                continue
+            partitions.mark_done(cursor, item['seq'], leases.worker_id, epoch)
+            processed += 1
+    except partitions.LeaseLost:
+        # El lead queda para el nuevo dueño de la partición
+        leases.lost(partition)
+    return processed
+
+def run(worker_id=None, batch_size=50, idle_sleep=2.0):
+    leases = partitions.PartitionLeases(worker_id)
+    logger.info("Worker iniciado", extra=fields(component="partition", worker=leases.worker_id, partitions=leases.count))
+
+    while not stop_event.is_set():
+        processed = 0
+        try:
+            with db.get_connection() as conn, conn.cursor() as cur:
+                partitions.ensure_partition_tables_ready(cur)
+                for partition in leases.rebalance(cur):
+                    if stop_event.is_set():
+                        break
+                    if partition in leases.held:
+                        processed += process_partition(cur, leases, partition, batch_size)
+        except resilience.DependencyUnavailable as e:
+            logger.warning("Dependencia no disponible; reintentando", extra=fields(component="partition", error=e))
+        except Exception as e:
+            logger.exception("Error en el ciclo del worker", extra=fields(component="partition", error=e))
+
+        if not processed:
+            # Debe ser menor que PARTITION_LEASE_SECONDS para renovar a tiempo
+            stop_event.wait(idle_sleep)
+
+    try:
+        with db.get_connection() as conn, conn.cursor() as cur:
+            leases.release_all(cur)
+    except Exception as e:
+        logger.warning("No se pudieron liberar los leases; vencerán solos", extra=fields(component="partition", error=e))
+    logger.info("Worker detenido", extra=fields(component="partition", worker=leases.worker_id))
+
+def main():
+    parser = argparse.ArgumentParser(description="Procesa los leads encolados por partición")
+    parser.add_argument("--worker-id", help="Identificador del worker (default host:pid)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Leads por partición y ciclo")
+    parser.add_argument("--idle-sleep", type=float, default=2.0, help="Segundos de espera sin trabajo")
+    args = parser.parse_args()
+
+    if not db.is_configured():
+        print("❌ Error: Variables de entorno de base de datos no configuradas")
+        return
+
+    app.GRAPH_TIMEOUT = WORKER_GRAPH_TIMEOUT
+    db.DB_QUERY_TIMEOUT = WORKER_DB_QUERY_TIMEOUT
+    budget = partitions.lead_time_budget(app.GRAPH_TIMEOUT, db.DB_CONNECT_TIMEOUT, db.DB_QUERY_TIMEOUT)
+    if budget is None:
+        print("❌ Error: PARTITION_DB_QUERY_TIMEOUT debe ser mayor que 0")
+        return
+    if budget > partitions.LEASE_SECONDS / 2:
+        print(f"❌ Error: el peor caso de un lead ({budget:.0f} s) supera la mitad de "
+              f"PARTITION_LEASE_SECONDS ({partitions.LEASE_SECONDS} s); ajusta PARTITION_GRAPH_TIMEOUT, "
+              "DB_CONNECT_TIMEOUT o PARTITION_DB_QUERY_TIMEOUT")
+        return
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop_event.set())
+
+    # La compactación de slots se detiene con la misma señal que el worker
+    app.start_slot_compaction(stop_event)
+    run(args.worker_id, args.batch_size, args.idle_sleep)
+
+if __name__ == "__main__":
+    main()
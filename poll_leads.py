@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Script para recuperar leads consultando Graph API (alternativa a los webhooks)
+
+Este script:
+1. Lista los formularios de cada página (o usa los indicados con --form-id)
+2. Trae de /{form_id}/leads solo los leads posteriores a la marca de agua del formulario
+3. Los guarda y consolida con el mismo flujo del webhook (save_lead_mysql), o
+   con PROCESSING_MODE=partitioned los encola para partition_worker.py
+4. Avanza la marca de agua en fb_form_sync para que la próxima corrida traiga solo lo nuevo
+
+Uso:
+    python poll_leads.py                      # todos los formularios de las páginas configuradas
+    python poll_leads.py --page-id 456        # una página (FB_PAGE_TOKENS o FB_PAGE_ACCESS_TOKEN)
+    python poll_leads.py --page-id 456 --form-id 123 --full # un formulario, ignorando la marca de agua
+                                              # (--form-id requiere un solo --page-id)
+"""
+
+import argparse
+from datetime import datetime
+
+import app
+from modules import db, partitions
+from modules.lead_poller import ensure_sync_table, list_page_forms, poll_form
+
+def enqueue_fn(cursor):
+    """Modo particionado: save_fn que encola el lead en su partición en lugar de procesarlo."""
+    def enqueue(lead_json, form_id, page_id):
+        partitions.enqueue_lead(cursor, lead_json["id"], form_id, page_id)
+        return True
+    return enqueue
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza leads desde Graph API")
+    parser.add_argument("--page-id", action="append", help="Página a sincronizar (se puede repetir; default: FB_PAGE_TOKENS o PAGE_ID)")
+    parser.add_argument("--form-id", action="append", help="Formulario específico (se puede repetir; requiere un solo --page-id)")
+    parser.add_argument("--full", action="store_true", help="Ignorar la marca de agua y traer todo")
+    parser.add_argument("--limit", type=int, default=500, help="Leads por request a Graph API")
+    args = parser.parse_args()
+    if args.form_id and len(args.page_id or []) != 1:
+        parser.error("--form-id requiere exactamente un --page-id (la página dueña del formulario)")
+
+    start_time = datetime.now()
+    print("🚀 SINCRONIZANDO LEADS DESDE GRAPH API")
+    print("=" * 60)
+
+    if not db.is_configured():
+        print("❌ Error: Variables de entorno de base de datos no configuradas")
+        return
+    page_ids = args.page_id or app.PAGE_IDS
+    missing_tokens = [page_id for page_id in page_ids if not app.page_token(page_id)]
+    if missing_tokens:
+        print(f"❌ Error: sin token para las páginas {', '.join(missing_tokens)} (FB_PAGE_TOKENS / FB_PAGE_ACCESS_TOKEN)")
+        return
+
+    session = app.graph_session()
+    totals = {"fetched": 0, "skipped": 0, "saved": 0, "errors": 0}
+
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        ensure_sync_table(cursor)
+        if partitions.is_partitioned():
+            partitions.ensure_partition_tables_ready(cursor)
+            save_fn = enqueue_fn(cursor)
+            print("📬 Modo particionado: los leads se encolan para partition_worker.py")
+        else:
+            save_fn = app.save_lead_mysql
+
+        for page_id in page_ids:
+            token = app.page_token(page_id)
+            form_ids = args.form_id
+            if not form_ids:
+                forms = list_page_forms(session, page_id, token)
+                form_ids = [form["id"] for form in forms]
+                print(f"📋 {len(form_ids)} formularios encontrados en la página {page_id}")
+
+            for form_id in form_ids:
+                print(f"\n🔄 Formulario {form_id}...")
+                try:
+                    stats = poll_form(
+                        session, cursor, connection, form_id, page_id, token,
+                        save_fn, full=args.full, limit=args.limit
+                    )
+                except Exception as e:
+                    print(f"   💥 Error sincronizando formulario {form_id}: {e}")
+                    continue
+
+                for key in totals:
+                    totals[key] += stats[key]
+                print(f"   ✅ {stats['saved']} guardados, {stats['skipped']} ya existían, {stats['errors']} errores")
+
+    duration = (datetime.now() - start_time).total_seconds()
+    print("\n" + "=" * 60)
+    print("📊 RESUMEN DE LA SINCRONIZACIÓN")
+    print("=" * 60)
+    print(f"📥 Leads obtenidos de Graph API: {totals['fetched']}")
+    print(f"⏭️  Ya existentes: {totals['skipped']}")
+    print(f"✅ {'Encolados' if partitions.is_partitioned() else 'Guardados y consolidados'}: {totals['saved']}")
+    print(f"❌ Con errores: {totals['errors']}")
+    print(f"⏱️  Tiempo total: {duration:.2f} segundos")
+
+if __name__ == "__main__":
+    main()
@@ -8,83 +8,110 @@ Este script:
 2. Los procesa usando la lógica de consolidación existente
 3. Los marca como enviado=1 al finalizar
 4. Muestra estadísticas del procesamiento
+
+Uso:
+    python process_existing_leads.py [--profile]
+
+Con --profile el lote corre bajo cProfile y se guarda el perfil en profiles/
+junto con las consultas SQL más costosas.
 """
 
+import argparse
 import os
+import time
+import logging
 import pymysql
 from dotenv import load_dotenv
 from datetime import datetime
-from modules.lead_consolidator import consolidate_lead_to_registros, ensure_procesado_column
 
-# Cargar variables de entorno
+# Antes de importar 'modules': sus ajustes se leen del entorno al importarse
 load_dotenv()
 
+from modules import db
+from modules.pipeline import match, parse_rows, persist
+from modules.profiling import PROFILE_DIR, profiled
+from modules.schema import ensure_schema
+from modules.slot_counter import compact_slot_increments
+from modules.log import fields, setup_logging
+
+logger = logging.getLogger("process_existing_leads")
+
 DB_HOST = os.environ.get("DB_HOST")
 DB_NAME = os.environ.get("DB_NAME")
 DB_USER = os.environ.get("DB_USER")
 DB_PASSWORD = os.environ.get("DB_PASSWORD")
 DB_PORT = int(os.environ.get("DB_PORT", 3306))
 
-def get_pending_leads(cursor):
-    """Obtiene todos los leads pendientes de enviar (enviado=0)"""
-    try:
-        cursor.execute("""
-            SELECT id, ad_name, adset_name, sala, email, full_name, phone
-            FROM fb_leads 
-            WHERE enviado = 0 
-            ORDER BY created_time ASC
-        """)
-        leads = cursor.fetchall()
-        print(f"📋 Encontrados {len(leads)} leads pendientes de procesar")
-        return leads
-    except Exception as e:
-        print(f"❌ Error obteniendo leads pendientes: {e}")
-        return []
+PENDING_PAGE_SIZE = 500
+
+def count_pending_leads(cursor):
+    """Cuenta los leads pendientes de enviar (enviado=0)"""
+    cursor.execute("SELECT COUNT(*) AS total FROM fb_leads WHERE enviado = 0")
+    return cursor.fetchone()['total']
 
-def process_leads_batch(leads, cursor, connection):
-    """Procesa un lote de leads"""
+def iter_pending_leads(cursor, page_size=PENDING_PAGE_SIZE):
+    """
+    Recorre los leads pendientes (enviado=0) en orden de llegada, por páginas
+    con clave (created_time, id): la memoria no depende del tamaño del backlog
+    y los leads que fallan no se vuelven a leer en la misma corrida.
+    """
+    last_created, last_id = None, 0
+    while True:
+        if last_created is None:
+            cursor.execute("""
+                SELECT id, created_time, ad_name, adset_name, sala, email, full_name, phone,
+                       job_title, company_name
+                FROM fb_leads
+                WHERE enviado = 0
+                ORDER BY created_time ASC, id ASC
+                LIMIT %s
+            """, (page_size,))
+        else:
+            cursor.execute("""
+                SELECT id, created_time, ad_name, adset_name, sala, email, full_name, phone,
+                       job_title, company_name
+                FROM fb_leads
+                WHERE enviado = 0
+                  AND (created_time > %s OR (created_time = %s AND id > %s))
+                ORDER BY created_time ASC, id ASC
+                LIMIT %s
+            """, (last_created, last_created, last_id, page_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        last_created, last_id = rows[-1]['created_time'], rows[-1]['id']
+        yield from rows
+        if len(rows) < page_size:
+            return
+
+def process_leads_batch(rows, cursor, connection, total):
+    """Procesa los leads con las etapas compartidas con el webhook (parse -> match -> persist)"""
     processed = 0
     errors = 0
-    
-    for i, lead in enumerate(leads, 1):
-        try:
-            print(f"\n🔄 Procesando lead {i}/{len(leads)} - ID: {lead['id']}")
-            print(f"   📧 Email: {lead['email']}")
-            print(f"   👤 Nombre: {lead['full_name']}")
-            print(f"   🎯 Anuncio: {lead['ad_name'][:50]}...")
-            
-            # Preparar datos del lead
-            lead_data = {
-                'id': lead['id'],
-                'ad_name': lead['ad_name'],
-                'adset_name': lead['adset_name'], 
-                'sala': lead['sala'],
-                'email': lead['email'],
-                'full_name': lead['full_name'],
-                'phone_number': lead['phone'],
-                'cargo': '',  # No disponible en leads históricos
-                'empresa': ''  # No disponible en leads históricos
-            }
-            
-            # Consolidar usando la lógica existente
-            success = consolidate_lead_to_registros(lead_data, cursor, connection)
-            
-            if success:
-                processed += 1
-                print(f"   ✅ Lead {lead['id']} procesado exitosamente")
-            else:
-                errors += 1
-                print(f"   ❌ Error procesando lead {lead['id']}")
-                
-        except Exception as e:
+    started = time.perf_counter()
+
+    leads = persist(match(parse_rows(rows), cursor), cursor, connection, store=False)
+    for i, (lead, success) in enumerate(leads, 1):
+        if success:
+            processed += 1
+            logger.info("Lead procesado", extra=fields(
+                lead_id=lead.id, n=i, total=total,
+                duration_ms=(time.perf_counter() - started) * 1000, sampled=True
+            ))
+        else:
             errors += 1
-            print(f"   💥 Excepción procesando lead {lead['id']}: {e}")
-            continue
-    
+            logger.warning("Error procesando lead", extra=fields(lead_id=lead.id, ad_name=lead.ad_name))
+        started = time.perf_counter()
+
     return processed, errors
 
 def main():
     """Función principal del script"""
+    parser = argparse.ArgumentParser(description="Procesa los leads pendientes de fb_leads")
+    parser.add_argument("--profile", action="store_true", help="Perfilar el lote con cProfile y tiempos de consultas")
+    args = parser.parse_args()
+
+    setup_logging()
     start_time = datetime.now()
     print("🚀 INICIANDO PROCESAMIENTO DE LEADS EXISTENTES")
     print("=" * 60)
@@ -105,34 +132,41 @@ def main():
             database=DB_NAME,
             autocommit=False,  # Usaremos transacciones manuales
             charset="utf8mb4",
-            cursorclass=pymysql.cursors.DictCursor,
+            cursorclass=db.timed_cursor_class(),  # DictCursor que mide consultas con --profile
         )
         
         with connection.cursor() as cursor:
             print("✅ Conexión establecida")
             
-            # Verificar que las columnas existan
+            # Verificar que las columnas existan (incluye job_title/company_name generadas)
             print("🔧 Verificando columnas necesarias...")
-            ensure_procesado_column(cursor, connection)
+            ensure_schema(cursor, connection)
             
-            # Obtener leads pendientes
+            # Contar leads pendientes (se leen por páginas al procesar)
             print("📋 Buscando leads pendientes...")
-            leads = get_pending_leads(cursor)
+            total = count_pending_leads(cursor)
+            print(f"📋 Encontrados {total} leads pendientes de procesar")
             
-            if not leads:
+            if not total:
                 print("✅ No hay leads pendientes de procesar")
                 return
             
             # Confirmar procesamiento
-            print(f"\n⚠️  Se van a procesar {len(leads)} leads")
+            print(f"\n⚠️  Se van a procesar {total} leads")
             response = input("¿Continuar? (s/N): ").lower().strip()
             if response != 's':
                 print("❌ Procesamiento cancelado por el usuario")
                 return
             
             # Procesar leads
-            print(f"\n🔄 Iniciando procesamiento de {len(leads)} leads...")
-            processed, errors = process_leads_batch(leads, cursor, connection)
+            print(f"\n🔄 Iniciando procesamiento de {total} leads...")
+            with profiled("backfill", enabled=args.profile) as profiler:
+                processed, errors = process_leads_batch(iter_pending_leads(cursor), cursor, connection, total)
+
+                # Aplicar los slots registrados durante el lote en expokossodo_eventos
+                compact_slot_increments(cursor, connection)
+            if profiler is not None:
+                print(f"🔬 Perfil guardado en {PROFILE_DIR}/ (ver el .txt para las consultas más costosas)")
             
             # Estadísticas finales
             end_time = datetime.now()
@@ -143,9 +177,9 @@ def main():
             print("=" * 60)
             print(f"✅ Leads procesados exitosamente: {processed}")
             print(f"❌ Leads con errores: {errors}")
-            print(f"📋 Total leads: {len(leads)}")
+            print(f"📋 Total leads: {processed + errors}")
             print(f"⏱️  Tiempo total: {duration.total_seconds():.2f} segundos")
-            print(f"⚡ Promedio: {duration.total_seconds()/len(leads):.2f} seg/lead")
+            print(f"⚡ Promedio: {duration.total_seconds()/max(processed + errors, 1):.2f} seg/lead")
             
             if processed > 0:
                 print(f"\n🎉 ¡Procesamiento completado!")
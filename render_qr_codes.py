@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Script para renderizar las imágenes de los códigos QR de expokossodo_registros
+
+Este script:
+1. Lee por páginas los registros con qr_code generado, a medida que el pool avanza
+2. Omite los códigos que ya están en el almacén local (por hash del texto)
+3. Renderiza los faltantes en paralelo con un pool de procesos (PNG y/o SVG)
+4. Muestra estadísticas de tiempo por imagen
+
+Requiere: pip install "qrcode[pil]"
+
+Uso:
+    python render_qr_codes.py [--format png --format svg] [--workers 8] [--since-id 0]
+"""
+
+import argparse
+import importlib.util
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# Antes de importar 'modules': sus ajustes se leen del entorno al importarse
+load_dotenv()
+
+from modules import db
+from modules.qr_renderer import QR_FORMATS, QR_STORE_DIR, render_many, timing_stats
+
+def iter_qr_codes(connection, since_id=0, page_size=1000):
+    """
+    Recorre los qr_code por páginas de id (keyset), con memoria constante.
+    Cada página es una consulta corta: mientras el pool renderiza no queda un
+    resultado abierto en el servidor esperando a ser leído.
+    """
+    last_id = since_id
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute("""
+                SELECT id, qr_code FROM expokossodo_registros
+                WHERE id > %s AND qr_code IS NOT NULL AND qr_code <> ''
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, page_size))
+            rows = cursor.fetchall()
+            for row in rows:
+                yield row['qr_code']
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]['id']
+
+def main():
+    parser = argparse.ArgumentParser(description="Renderiza imágenes QR de los registros")
+    parser.add_argument("--format", action="append", choices=QR_FORMATS, help="Formato (se puede repetir, default png)")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos del pool (default: CPUs)")
+    parser.add_argument("--since-id", type=int, default=0, help="Solo registros con id mayor a este")
+    parser.add_argument("--store", default=QR_STORE_DIR, help="Carpeta del almacén de imágenes")
+    args = parser.parse_args()
+    formats = tuple(args.format or ["png"])
+
+    start_time = datetime.now()
+    print("🚀 RENDERIZANDO CÓDIGOS QR")
+    print("=" * 60)
+
+    if not db.is_configured():
+        print("❌ Error: Variables de entorno de base de datos no configuradas")
+        return
+    if importlib.util.find_spec("qrcode") is None:
+        print('❌ Error: falta la librería qrcode (pip install "qrcode[pil]")')
+        return
+
+    print(f"📋 Formatos: {', '.join(formats)}; almacén: {args.store}")
+
+    durations = []
+    errors = 0
+    summary = {}
+    connection = db.connect()
+    try:
+        # Los textos se leen por páginas a medida que el pool los consume
+        qr_texts = iter_qr_codes(connection, args.since_id)
+        results = render_many(qr_texts, formats, args.workers, args.store, summary=summary)
+        for i, (digest, fmt, seconds, error) in enumerate(results, 1):
+            if error:
+                errors += 1
+                print(f"   ❌ {digest[:12]}.{fmt}: {error}")
+            else:
+                durations.append(seconds)
+            if i % 500 == 0:
+                print(f"   🔄 {i} imágenes procesadas...")
+    finally:
+        connection.close()
+
+    stats = timing_stats(durations)
+    duration = (datetime.now() - start_time).total_seconds()
+
+    print("\n" + "=" * 60)
+    print("📊 RESUMEN DEL RENDERIZADO")
+    print("=" * 60)
+    print(f"📋 Registros con QR: {summary['qr']}")
+    print(f"✅ Imágenes renderizadas: {stats['count']}")
+    print(f"⏭️  Ya existentes: {summary['existing']}")
+    print(f"❌ Con errores: {errors}")
+    if stats["count"]:
+        print(f"⏱️  Por imagen: media {stats['mean_ms']:.1f} ms | p50 {stats['p50_ms']:.1f} ms | "
+              f"p95 {stats['p95_ms']:.1f} ms | max {stats['max_ms']:.1f} ms")
+    print(f"⏱️  Tiempo total: {duration:.2f} segundos")
+
+if __name__ == "__main__":
+    main()
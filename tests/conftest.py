@@ -0,0 +1,146 @@
+import os
+import sys
+import types
+
+import pytest
+
+# Las pruebas importan 'modules' desde la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _build_fake_pymysql():
+    """pymysql mínimo: jerarquía de errores y clases de cursor, sin conexión real."""
+    pymysql = types.ModuleType("pymysql")
+    err = types.ModuleType("pymysql.err")
+    cursors = types.ModuleType("pymysql.cursors")
+
+    class MySQLError(Exception):
+        pass
+
+    class InterfaceError(MySQLError):
+        pass
+
+    class DatabaseError(MySQLError):
+        pass
+
+    for name in ("OperationalError", "InternalError", "ProgrammingError", "IntegrityError", "DataError"):
+        setattr(err, name, type(name, (DatabaseError,), {}))
+    err.MySQLError = MySQLError
+    err.InterfaceError = InterfaceError
+    err.DatabaseError = DatabaseError
+
+    class DictCursor:
+        def execute(self, query, args=None):
+            return 0
+
+    class SSDictCursor(DictCursor):
+        pass
+
+    cursors.DictCursor = DictCursor
+    cursors.SSDictCursor = SSDictCursor
+
+    pymysql.err = err
+    pymysql.cursors = cursors
+    pymysql.MySQLError = MySQLError
+    pymysql.OperationalError = err.OperationalError
+    pymysql.InterfaceError = InterfaceError
+    return pymysql
+
+@pytest.fixture
+def fake_pymysql(monkeypatch):
+    """Reemplaza pymysql en sys.modules por el módulo falso durante la prueba."""
+    pymysql = _build_fake_pymysql()
+    monkeypatch.setitem(sys.modules, "pymysql", pymysql)
+    monkeypatch.setitem(sys.modules, "pymysql.err", pymysql.err)
+    monkeypatch.setitem(sys.modules, "pymysql.cursors", pymysql.cursors)
+    return pymysql
+
+class FakeCursor:
+    """
+    Cursor de prueba: registra las sentencias y responde con resultados
+    programados en orden (fetchone/fetchall) y un rowcount fijo o por sentencia.
+    Un resultado que es una excepción se lanza desde execute.
+    """
+
+    def __init__(self, results=(), rowcounts=()):
+        self.executed = []
+        self.results = list(results)
+        self.rowcounts = list(rowcounts)
+        self.rowcount = 0
+        self._current = None
+
+    def execute(self, query, args=None):
+        self.executed.append((" ".join(query.split()), args))
+        self.rowcount = self.rowcounts.pop(0) if self.rowcounts else 1
+        self._current = self.results.pop(0) if self.results else None
+        if isinstance(self._current, Exception):
+            raise self._current
+        return self.rowcount
+
+    def executemany(self, query, args):
+        self.executed.append((" ".join(query.split()), list(args)))
+
+    def fetchone(self):
+        if isinstance(self._current, list):
+            return self._current[0] if self._current else None
+        return self._current
+
+    def fetchall(self):
+        if self._current is None:
+            return []
+        return self._current if isinstance(self._current, list) else [self._current]
+
+    def fetchmany(self, size):
+        rows = self.fetchall()
+        self._current = rows[size:]
+        return rows[:size]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+@pytest.fixture
+def cursor_factory():
+    return FakeCursor
+
+class FakeConnection:
+    """
+    Conexión de prueba: registra begin/commit/rollback en orden, cuenta
+    pings y cierres, y entrega el cursor indicado al crearla.
+    """
+
+    def __init__(self, cursor=None):
+        self._cursor = cursor
+        self.calls = []
+        self.pings = 0
+        self.closed = False
+
+    @property
+    def commits(self):
+        return self.calls.count("commit")
+
+    def cursor(self, cursor_class=None):
+        return self._cursor
+
+    def begin(self):
+        self.calls.append("begin")
+
+    def commit(self):
+        self.calls.append("commit")
+
+    def rollback(self):
+        self.calls.append("rollback")
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def connection_factory():
+    return FakeConnection
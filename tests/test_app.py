@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("dotenv")
+
+import app as webhook_app
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(webhook_app, "STATS_TOKEN", "secreto")
+    monkeypatch.setattr(webhook_app, "EXPORT_TOKEN", "")
+    return webhook_app.app.test_client()
+
+def test_stats_requires_bearer_token(client):
+    assert client.get("/stats").status_code == 403
+    assert client.get("/stats", headers={"Authorization": "Bearer otro"}).status_code == 403
+    assert client.get("/stats", headers={"Authorization": "secreto"}).status_code == 403
+
+def test_stats_with_token_serves_cached_summary(client, monkeypatch):
+    monkeypatch.setattr(webhook_app.lead_stats, "cached_summary", lambda days: {"dias": days})
+
+    response = client.get("/stats?dias=7", headers={"Authorization": "Bearer secreto"})
+
+    assert response.status_code == 200
+    assert response.get_json() == {"dias": 7}
+
+def test_export_is_disabled_without_token(client):
+    assert client.get("/export/registros").status_code == 403
+    assert client.get("/export/registros", headers={"Authorization": "Bearer "}).status_code == 403
+
+def test_export_closes_its_connection_even_if_never_read(client, cursor_factory, connection_factory, monkeypatch):
+    connection = connection_factory(cursor_factory())
+    monkeypatch.setattr(webhook_app, "EXPORT_TOKEN", "exportar")
+    monkeypatch.setattr(webhook_app.db, "is_configured", lambda: True)
+    monkeypatch.setattr(webhook_app.db, "connect", lambda: connection)
+    monkeypatch.setattr(webhook_app.exporter, "export_started_at", lambda cursor: "2025-09-02 10:00:00")
+    monkeypatch.setattr(webhook_app.exporter, "has_updated_column", lambda cursor: True)
+
+    response = client.get("/export/registros", headers={"Authorization": "Bearer exportar"}, buffered=False)
+    assert response.status_code == 200
+    assert not connection.closed
+
+    # El cliente se desconecta sin leer el cuerpo
+    response.close()
+
+    assert connection.closed
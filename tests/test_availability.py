@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+
+from modules import availability, slot_counter
+
+EVENT = {"id": 7, "titulo_charla": "Microscopía: técnicas", "fecha": datetime(2025, 9, 2), "sala": "sala1"}
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(availability, "_events", [])
+    monkeypatch.setattr(availability, "_remaining", {})
+    monkeypatch.setattr(availability, "_loaded_at", 0.0)
+    monkeypatch.setattr(availability, "_capacity_enabled", True)
+    monkeypatch.setattr(slot_counter, "_table_ready", True)
+
+class ScriptedCursor:
+    """Responde a cada execute con el siguiente resultado o excepción programada."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.executed = []
+        self._rows = []
+
+    def execute(self, query, args=None):
+        self.executed.append(" ".join(query.split()))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        self._rows = response
+
+    def fetchall(self):
+        return self._rows
+
+def test_reserve_counts_down_capacity_including_pending_increments():
+    row = dict(EVENT, capacidad=3, slots_ocupados=1)
+    cursor = ScriptedCursor([row], [{"evento_id": 7, "total": 1}])
+
+    assert availability.try_reserve(cursor, 7) is True
+    assert availability.try_reserve(cursor, 7) is False
+
+    availability.release(7)
+    assert availability.try_reserve(cursor, 7) is True
+    # Una sola recarga: el resto sale del cache
+    assert len(cursor.executed) == 2
+
+def test_events_without_capacity_always_accept():
+    row = dict(EVENT, capacidad=None, slots_ocupados=0)
+    cursor = ScriptedCursor([row], [])
+
+    assert all(availability.try_reserve(cursor, 7) for _ in range(5))
+    assert [event.id for event in availability.get_events(cursor)] == [7]
+
+def test_unknown_capacity_column_disables_capacity(fake_pymysql):
+    unknown_column = fake_pymysql.err.OperationalError(1054, "Unknown column 'slots_disponibles'")
+    cursor = ScriptedCursor(unknown_column, [EVENT])
+
+    availability.refresh(cursor)
+
+    assert availability._capacity_enabled is False
+    assert availability.try_reserve(cursor, 7) is True
+    assert cursor.executed[1] == "SELECT id, titulo_charla, fecha, sala FROM expokossodo_eventos"
+
+@pytest.mark.parametrize("error", [
+    lambda err: err.OperationalError(2013, "Lost connection to MySQL server during query"),
+    lambda err: err.OperationalError(1213, "Deadlock found when trying to get lock"),
+    lambda err: err.InterfaceError(0, ""),
+    lambda err: TimeoutError("read timeout"),
+])
+def test_transient_errors_keep_capacity_enabled(fake_pymysql, error):
+    cursor = ScriptedCursor(error(fake_pymysql.err))
+
+    with pytest.raises(Exception):
+        availability.refresh(cursor)
+
+    assert availability._capacity_enabled is True
+    assert len(cursor.executed) == 1
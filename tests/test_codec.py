@@ -0,0 +1,51 @@
+import hashlib
+import hmac
+import io
+import json
+
+import pytest
+
+from modules import codec
+
+class FakeRequest:
+    def __init__(self, body, content_length=None):
+        self.stream = io.BytesIO(body)
+        self.content_length = content_length
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(codec, "orjson", None)
+    elif codec.orjson is None:
+        pytest.skip("orjson no instalado")
+    return request.param
+
+def test_dumps_text_matches_stdlib_format(backend):
+    assert codec.dumps_text([12, 15]) == "[12, 15]"
+    assert codec.dumps_text([12, 15]) == json.dumps([12, 15])
+
+def test_loads_accepts_bytes_and_str(backend):
+    assert codec.loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+    assert codec.loads('{"a": "ñ"}') == {"a": "ñ"}
+    with pytest.raises(ValueError):
+        codec.loads(b"{no es json")
+
+def test_dumps_keeps_non_ascii(backend):
+    assert "Química" in codec.dumps({"empresa": "Química"})
+    assert codec.loads(codec.dumps({"a": [1, 2]}, pretty=True)) == {"a": [1, 2]}
+
+def test_verify_hmac_sha256():
+    body = b'{"entry": []}'
+    digest = hmac.new(b"secreto", msg=body, digestmod=hashlib.sha256).hexdigest()
+
+    assert codec.verify_hmac_sha256(b"secreto", body, f"sha256={digest}")
+    assert not codec.verify_hmac_sha256(b"otro", body, f"sha256={digest}")
+    assert not codec.verify_hmac_sha256(b"secreto", body, digest)
+    assert not codec.verify_hmac_sha256(b"secreto", body, "")
+
+def test_read_body_limits_size():
+    assert codec.read_body(FakeRequest(b"12345"), max_bytes=5) == b"12345"
+    with pytest.raises(codec.BodyTooLarge):
+        codec.read_body(FakeRequest(b"123456"), max_bytes=5)
+    with pytest.raises(codec.BodyTooLarge):
+        codec.read_body(FakeRequest(b"", content_length=10), max_bytes=5)
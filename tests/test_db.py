@@ -0,0 +1,90 @@
+import pytest
+
+from modules import db
+
+@pytest.fixture
+def connections(monkeypatch, connection_factory):
+    created = []
+
+    def connect(autocommit=True):
+        conn = connection_factory()
+        created.append(conn)
+        return conn
+
+    monkeypatch.setattr(db, "connect", connect)
+    monkeypatch.setattr(db, "_pool", None)
+    monkeypatch.setattr(db, "_pool_pid", None)
+    return created
+
+def test_pool_is_created_lazily_and_reuses_connections(connections):
+    assert db._pool is None
+    with db.get_connection() as first:
+        pass
+    with db.get_connection() as second:
+        pass
+
+    assert first is second
+    assert len(connections) == 1
+    assert second.pings == 1
+
+def test_pool_is_recreated_after_fork(connections, monkeypatch):
+    with db.get_connection():
+        pass
+    parent_pool = db._pool
+
+    monkeypatch.setattr(db.os, "getpid", lambda: -1)
+    with db.get_connection() as conn:
+        pass
+
+    assert db._pool is not parent_pool
+    assert conn is connections[1]
+
+def test_application_error_returns_connection_to_pool(connections, fake_pymysql):
+    with pytest.raises(ValueError):
+        with db.get_connection():
+            raise ValueError("lead inválido")
+    with pytest.raises(fake_pymysql.err.IntegrityError):
+        with db.get_connection():
+            raise fake_pymysql.err.IntegrityError(1062, "Duplicate entry")
+
+    assert len(connections) == 1
+    assert not connections[0].closed
+
+@pytest.mark.parametrize("error", ["OperationalError", "InterfaceError"])
+def test_connection_error_discards_connection(connections, fake_pymysql, error):
+    with pytest.raises(getattr(fake_pymysql.err, error)):
+        with db.get_connection():
+            raise getattr(fake_pymysql.err, error)(2013, "Lost connection")
+    with db.get_connection():
+        pass
+
+    assert connections[0].closed
+    assert len(connections) == 2
+
+def test_statement_key_groups_by_shape():
+    assert db._statement_key("SELECT *  FROM t\n WHERE id = 15") == "SELECT * FROM t WHERE id = ?"
+    assert db._statement_key(b"SELECT 1") == "SELECT ?"
+
+def test_top_statements_ranks_by_total_time():
+    stats = {}
+    db._add_timing(stats, "A", 0.010)
+    db._add_timing(stats, "A", 0.030)
+    db._add_timing(stats, "B", 0.050)
+
+    ranked = db.top_statements(stats)
+    assert [row[0] for row in ranked] == ["B", "A"]
+    key, count, total_ms, max_ms = ranked[1]
+    assert count == 2 and round(total_ms) == 40 and round(max_ms) == 30
+
+def test_timed_cursor_records_only_inside_a_capture(fake_pymysql, monkeypatch):
+    monkeypatch.setattr(db, "_cursor_class", None)
+    monkeypatch.setattr(db, "DB_QUERY_TIMING", False)
+    cursor = db.timed_cursor_class()()
+
+    cursor.execute("SELECT 1")
+    with db.capture_queries() as queries:
+        cursor.execute("SELECT id FROM fb_leads WHERE id = 42")
+        cursor.execute("SELECT id FROM fb_leads WHERE id = 43")
+
+    assert list(queries) == ["SELECT id FROM fb_leads WHERE id = ?"]
+    assert queries["SELECT id FROM fb_leads WHERE id = ?"][0] == 2
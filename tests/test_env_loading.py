@@ -0,0 +1,29 @@
+import ast
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = [
+    "app.py", "check_indexes.py", "compact_slots.py", "export_registros.py",
+    "process_existing_leads.py", "render_qr_codes.py",
+]
+
+def _first_line(tree, predicate):
+    return min(node.lineno for node in tree.body if predicate(node))
+
+@pytest.mark.parametrize("filename", ENTRY_POINTS)
+def test_load_dotenv_runs_before_importing_modules(filename):
+    with open(os.path.join(ROOT, filename), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+
+    loads_env = _first_line(tree, lambda node: (
+        isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+        and getattr(node.value.func, "id", None) == "load_dotenv"
+    ))
+    imports_modules = _first_line(tree, lambda node: (
+        isinstance(node, ast.ImportFrom) and (node.module or "").split(".")[0] == "modules"
+    ))
+
+    # Los ajustes de modules/* se leen del entorno al importarse
+    assert loads_env < imports_modules
@@ -0,0 +1,41 @@
+import gzip
+
+import pytest
+
+from modules import exporter
+
+def _row(registro_id, evento_id, **values):
+    row = {column: None for column in exporter.EXPORT_COLUMNS}
+    row.update(registro_id=registro_id, evento_id=evento_id, **values)
+    return row
+
+def test_iter_rows_pages_by_key(cursor_factory, fake_pymysql, connection_factory):
+    pages = [[_row(1, 3), _row(2, 1)], [_row(2, 5)]]
+    cursor = cursor_factory(results=pages)
+
+    rows = list(exporter.iter_rows(connection_factory(cursor), sala="S1", page_size=2))
+
+    assert [(r["registro_id"], r["evento_id"]) for r in rows] == [(1, 3), (2, 1), (2, 5)]
+    assert [args for _, args in cursor.executed] == [(0, 0, 0, "S1", 2), (2, 2, 1, "S1", 2)]
+    assert "ORDER BY re.registro_id, re.evento_id LIMIT %s" in cursor.executed[0][0]
+
+def test_iter_rows_without_updated_column(cursor_factory, fake_pymysql, connection_factory):
+    cursor = cursor_factory(results=[[]])
+
+    list(exporter.iter_rows(connection_factory(cursor), updated_at=False))
+
+    sql, _ = cursor.executed[0]
+    assert "NULL AS actualizado_at" in sql and "r.actualizado_at" not in sql
+
+def test_since_requires_updated_column(cursor_factory, connection_factory):
+    with pytest.raises(ValueError):
+        exporter.export_stream(connection_factory(cursor_factory()), "csv", since="2025-09-01", updated_at=False)
+
+def test_export_stream_csv_gzip(cursor_factory, fake_pymysql, connection_factory):
+    cursor = cursor_factory(results=[[_row(1, 3, nombres="Ana", sala="S1")]])
+
+    data = b"".join(exporter.export_stream(connection_factory(cursor), "csv", compress=True, page_size=10))
+
+    lines = gzip.decompress(data).decode("utf-8").splitlines()
+    assert lines[0] == ",".join(exporter.EXPORT_COLUMNS)
+    assert lines[1].startswith("1,Ana,")
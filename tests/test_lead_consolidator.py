@@ -0,0 +1,56 @@
+import pytest
+
+from modules import lead_consolidator, partitions, slot_counter
+from modules.records import LeadRecord
+
+@pytest.fixture(autouse=True)
+def tables_ready(monkeypatch):
+    monkeypatch.setattr(slot_counter, "_table_ready", True)
+
+@pytest.fixture
+def connection(connection_factory, monkeypatch):
+    connection = connection_factory()
+    monkeypatch.setattr(lead_consolidator.availability, "try_reserve", lambda cursor, evento_id: True)
+    monkeypatch.setattr(lead_consolidator.availability, "release", lambda evento_id: connection.calls.append(("release", evento_id)))
+    monkeypatch.setattr(lead_consolidator.lead_stats, "record_event",
+                        lambda cursor, conn, evento_id: connection.calls.append(("stats", evento_id)))
+    return connection
+
+def _lead():
+    lead = LeadRecord(5, full_name="Ana Pérez", email="ana@example.com")
+    lead.event_id = 7
+    return lead
+
+def _new_registro_cursor(cursor_factory, *results):
+    # Sin registro previo; INSERT del registro; sin relación previa; y lo que siga
+    cursor = cursor_factory(results=[None, None, None, *results])
+    cursor.lastrowid = 3
+    return cursor
+
+def test_registro_and_relation_commit_together_before_event_stats(cursor_factory, connection):
+    cursor = _new_registro_cursor(cursor_factory)
+
+    assert lead_consolidator.consolidate_lead_to_registros(_lead(), cursor, connection)
+
+    assert connection.calls == ["begin", "commit", ("stats", 7), "commit"]
+    assert ("INSERT INTO expokossodo_registro_eventos (registro_id, evento_id) VALUES (%s, %s)", (3, 7)) in cursor.executed
+
+def test_relation_error_rolls_back_the_registro(cursor_factory, connection):
+    # El incremento de slots cae por deadlock: MySQL deshizo también el registro y la relación
+    cursor = _new_registro_cursor(cursor_factory, None, RuntimeError("Deadlock found"))
+
+    assert lead_consolidator.consolidate_lead_to_registros(_lead(), cursor, connection) is False
+
+    assert connection.calls == ["begin", "rollback", ("release", 7)]
+
+def test_lost_lease_rejects_the_commit(cursor_factory, connection):
+    def fence(cursor):
+        connection.calls.append("fence")
+        raise partitions.LeaseLost("partición 3")
+
+    cursor = _new_registro_cursor(cursor_factory)
+
+    with pytest.raises(partitions.LeaseLost):
+        lead_consolidator.consolidate_lead_to_registros(_lead(), cursor, connection, fence)
+
+    assert connection.calls == ["begin", "fence", "rollback", ("release", 7)]
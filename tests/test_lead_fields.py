@@ -0,0 +1,44 @@
+from modules.lead_fields import GENERATED_FIELDS, LEAD_FIELD_ALIASES, extract_fields, generated_column_definition
+
+def test_extract_fields_prefers_first_alias():
+    field_data = [
+        {"name": "name", "values": ["Nombre alterno"]},
+        {"name": "full_name", "values": ["Ana Pérez"]},
+        {"name": "phone", "values": ["+51 999"]},
+        {"name": "cargo", "values": ["Jefa de laboratorio"]},
+    ]
+
+    values = extract_fields(field_data)
+
+    assert values == {
+        "full_name": "Ana Pérez",
+        "email": None,
+        "phone": "+51 999",
+        "job_title": "Jefa de laboratorio",
+        "company_name": None,
+    }
+
+def test_extract_fields_skips_empty_values():
+    field_data = [
+        {"name": "company_name", "values": [""]},
+        {"name": "empresa", "values": ["Kossodo"]},
+        {"name": "email", "values": []},
+    ]
+
+    values = extract_fields(field_data)
+
+    assert values["company_name"] == "Kossodo"
+    assert values["email"] is None
+
+def test_extract_fields_accepts_missing_field_data():
+    assert set(extract_fields(None)) == set(LEAD_FIELD_ALIASES)
+
+def test_generated_column_covers_every_alias_in_order():
+    for field in GENERATED_FIELDS:
+        definition = generated_column_definition(field)
+        assert definition.startswith("VARCHAR(255) AS (LEFT(COALESCE(")
+        assert definition.endswith("STORED")
+        # JSON_SEARCH usa comodines tipo LIKE: el '_' del alias va escapado
+        patterns = ["'" + alias.replace("_", "\\_") + "'" for alias in LEAD_FIELD_ALIASES[field]]
+        positions = [definition.index(pattern) for pattern in patterns]
+        assert positions == sorted(positions)
@@ -0,0 +1,169 @@
+import os
+
+import pytest
+
+from modules import codec, lead_journal
+
+class DependencyDown(Exception):
+    pass
+
+@pytest.fixture(autouse=True)
+def journal_folder(tmp_path, monkeypatch):
+    folder = tmp_path / "journal"
+    monkeypatch.setattr(lead_journal, "JOURNAL_FOLDER", str(folder))
+    return folder
+
+def _entry(folder, leadgen_id, suffix=""):
+    with open(folder / f"{leadgen_id}.json{suffix}", "rb") as f:
+        return codec.loads(f.read())
+
+def test_record_pending_and_mark_done(journal_folder):
+    lead_journal.record_pending("111", 10, 20)
+    assert lead_journal.pending_count() == 1
+    entry = _entry(journal_folder, "111")
+    assert entry["form_id"] == 10 and entry["page_id"] == 20
+    assert entry["owner_pid"] == os.getpid()
+
+    lead_journal.mark_done("111")
+    assert lead_journal.pending_count() == 0
+
+def test_record_pending_keeps_attempts_and_lead_json(journal_folder):
+    lead_journal.record_pending("111", 10, 20)
+    lead_journal.attach_lead("111", {"id": "111"})
+    lead_journal.release("111")
+
+    lead_journal.record_pending("111", 10, 20)
+    entry = _entry(journal_folder, "111")
+    assert entry["lead_json"] == {"id": "111"}
+    assert entry["owner_pid"] == os.getpid()
+
+def test_replay_skips_entries_owned_by_this_process():
+    lead_journal.record_pending("111", 10, 20)
+    calls = []
+
+    replayed, failed = lead_journal.replay_pending(lambda *args: calls.append(args))
+
+    assert (replayed, failed) == (0, 0)
+    assert calls == []
+    assert lead_journal.pending_count() == 1
+
+def test_replay_processes_released_entries_with_lead_json():
+    lead_journal.record_pending("111", 10, 20)
+    lead_journal.attach_lead("111", {"id": "111"})
+    lead_journal.release("111")
+    calls = []
+
+    replayed, failed = lead_journal.replay_pending(lambda *args: calls.append(args))
+
+    assert (replayed, failed) == (1, 0)
+    assert calls == [("111", 10, 20, {"id": "111"})]
+    assert lead_journal.pending_count() == 0
+
+def test_replay_counts_attempts_and_discards_after_max(journal_folder, monkeypatch):
+    monkeypatch.setattr(lead_journal, "MAX_REPLAY_ATTEMPTS", 2)
+    lead_journal.record_pending("111", 10, 20)
+    lead_journal.release("111")
+
+    def failing(*args):
+        raise RuntimeError("MySQL rechazó el lead")
+
+    assert lead_journal.replay_pending(failing) == (0, 1)
+    assert _entry(journal_folder, "111")["attempts"] == 1
+
+    assert lead_journal.replay_pending(failing) == (0, 1)
+    assert lead_journal.pending_count() == 0
+    assert _entry(journal_folder, "111", ".failed")["attempts"] == 2
+
+def test_replay_defers_without_counting_attempt(journal_folder):
+    for leadgen_id in ("111", "222"):
+        lead_journal.record_pending(leadgen_id, 10, 20)
+        lead_journal.release(leadgen_id)
+    calls = []
+
+    def unavailable(leadgen_id, *args):
+        calls.append(leadgen_id)
+        raise DependencyDown("circuito abierto")
+
+    assert lead_journal.replay_pending(unavailable, defer_on=DependencyDown) == (0, 0)
+    # Se detiene en la primera entrada y ambas siguen pendientes, sin intentos
+    assert calls == ["111"]
+    assert lead_journal.pending_count() == 2
+    assert _entry(journal_folder, "111")["attempts"] == 0
+
+def test_corrupt_entry_is_set_aside(journal_folder):
+    os.makedirs(journal_folder)
+    (journal_folder / "999.json").write_text("{no es json")
+
+    assert lead_journal.replay_pending(lambda *args: None) == (0, 0)
+    assert (journal_folder / "999.json.corrupt").exists()
+    assert lead_journal.pending_count() == 0
+
+def _set_owner(folder, leadgen_id, **owner):
+    entry = _entry(folder, leadgen_id)
+    entry.update(owner)
+    lead_journal._write_atomic(str(folder / f"{leadgen_id}.json"), entry)
+
+def test_entry_of_dead_process_is_replayed(journal_folder, monkeypatch):
+    lead_journal.record_pending("111", 10, 20)
+    _set_owner(journal_folder, "111", owner_pid=4242, owner_started=None, owner_boot=None)
+
+    def kill(pid, sig):
+        raise ProcessLookupError
+
+    monkeypatch.setattr(lead_journal.os, "kill", kill)
+
+    assert lead_journal.replay_pending(lambda *args: None) == (1, 0)
+
+def test_reused_pid_after_restart_is_not_the_owner(journal_folder):
+    lead_journal.record_pending("111", 10, 20)
+    owner = lead_journal._owner()
+    if owner["owner_started"] is None:
+        pytest.skip("sin /proc")
+    # Mismo PID que este proceso, pero de un proceso anterior (otro inicio u otro arranque)
+    _set_owner(journal_folder, "111", owner_started=owner["owner_started"] - 1)
+    lead_journal.record_pending("222", 10, 20)
+    _set_owner(journal_folder, "222", owner_boot="otro-arranque")
+
+    assert lead_journal.replay_pending(lambda *args: None) == (2, 0)
+
+def _abandon(folder, leadgen_id, token):
+    lead_journal.record_pending(leadgen_id, 10, 20)
+    lead_journal.release(leadgen_id)
+    os.rename(folder / f"{leadgen_id}.json", folder / f"{leadgen_id}.json.replaying.{token}")
+
+def test_replay_of_dead_worker_is_reclaimed(journal_folder, monkeypatch):
+    monkeypatch.setattr(lead_journal, "_start_time", lambda pid: None if pid == 4242 else 1)
+    monkeypatch.setattr(lead_journal, "_owner_cache", {os.getpid(): {"owner_pid": os.getpid(), "owner_started": 1, "owner_boot": None}})
+    _abandon(journal_folder, "111", "4242-99")
+    assert lead_journal.pending_count() == 1
+    calls = []
+
+    assert lead_journal.replay_pending(lambda *args: calls.append(args[0])) == (1, 0)
+    assert calls == ["111"]
+    assert os.listdir(journal_folder) == []
+
+def test_replay_of_live_worker_is_left_until_stale(journal_folder, monkeypatch):
+    monkeypatch.setattr(lead_journal, "_start_time", lambda pid: 1)
+    monkeypatch.setattr(lead_journal, "_owner_cache", {os.getpid(): {"owner_pid": os.getpid(), "owner_started": 1, "owner_boot": None}})
+    _abandon(journal_folder, "111", "4242-1")
+
+    assert lead_journal.replay_pending(lambda *args: None) == (0, 0)
+    assert lead_journal.pending_count() == 1
+
+    old = 1000
+    os.utime(journal_folder / "111.json.replaying.4242-1", (old, old))
+    assert lead_journal.replay_pending(lambda *args: None) == (1, 0)
+
+def test_replay_stops_when_shutting_down(journal_folder):
+    import threading
+
+    for leadgen_id in ("111", "222"):
+        lead_journal.record_pending(leadgen_id, 10, 20)
+        lead_journal.release(leadgen_id)
+    stop = threading.Event()
+
+    def process(*args):
+        stop.set()
+
+    assert lead_journal.replay_pending(process, stop=stop) == (1, 0)
+    assert sorted(os.listdir(journal_folder)) == ["222.json"]
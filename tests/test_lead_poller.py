@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+
+from modules import codec, lead_poller
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.content = codec.dumps(payload).encode()
+
+    def raise_for_status(self):
+        pass
+
+class FakeSession:
+    """Entrega las páginas de /{form_id}/leads encadenadas por paging.next."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        self.requests.append((url, params))
+        index = len(self.requests) - 1
+        payload = {"data": self.pages[index]}
+        if index + 1 < len(self.pages):
+            payload["paging"] = {"next": f"https://graph.example/next/{index + 1}"}
+        return FakeResponse(payload)
+
+def _lead(lead_id, minute):
+    return {"id": str(lead_id), "created_time": f"2025-09-02T10:{minute:02d}:00+0000"}
+
+def _marks(cursor):
+    return [args for sql, args in cursor.executed if sql.startswith("INSERT INTO fb_form_sync")]
+
+def test_pages_are_saved_and_marked_once_at_the_end(cursor_factory, connection_factory):
+    # Graph entrega los leads del más nuevo al más antiguo
+    session = FakeSession([[_lead(3, 3), _lead(2, 2)], [_lead(1, 1)]])
+    # fb_form_sync vacío; ningún lead existe en fb_leads
+    cursor = cursor_factory(results=[None, [], [], None])
+    saved = []
+    connection = connection_factory()
+
+    def save_fn(lead_json, form_id, page_id):
+        # La segunda página no se pide hasta guardar la primera
+        saved.append((lead_json["id"], len(session.requests)))
+        return True
+
+    stats = lead_poller.poll_form(session, cursor, connection, 55, 66, "token", save_fn)
+
+    assert stats == {"fetched": 3, "skipped": 0, "saved": 3, "errors": 0}
+    assert saved == [("3", 1), ("2", 1), ("1", 2)]
+    assert [args[1:] for args in _marks(cursor)] == [("2025-09-02 10:03:00", 3)]
+    assert connection.commits == 1
+
+def test_failure_on_an_older_page_keeps_the_mark(cursor_factory, connection_factory):
+    session = FakeSession([[_lead(3, 3), _lead(2, 2)], [_lead(1, 1)]])
+    cursor = cursor_factory(results=[None, [], []])
+    connection = connection_factory()
+
+    stats = lead_poller.poll_form(session, cursor, connection, 55, 66, "token",
+                                  lambda lead, *_: lead["id"] != "1")
+
+    assert stats["saved"] == 2 and stats["errors"] == 1
+    # La próxima corrida repite el rango: el lead 1 no se pierde
+    assert _marks(cursor) == []
+    assert connection.commits == 0
+
+def test_existing_leads_are_skipped(cursor_factory, connection_factory):
+    session = FakeSession([[_lead(1, 1), _lead(2, 2)]])
+    cursor = cursor_factory(results=[None, [{"id": 1}], None])
+    saved = []
+
+    stats = lead_poller.poll_form(session, cursor, connection_factory(), 55, 66, "token",
+                                  lambda lead, *_: saved.append(lead["id"]) or True)
+
+    assert stats["skipped"] == 1 and stats["saved"] == 1
+    assert saved == ["2"]
+
+def test_save_exception_counts_as_error_and_keeps_the_mark(cursor_factory, connection_factory):
+    session = FakeSession([[_lead(3, 3), {"id": "2"}, _lead(1, 1)]])
+    cursor = cursor_factory(results=[None, []])
+
+    def save_fn(lead_json, form_id, page_id):
+        # Como save_lead_mysql con un lead sin created_time
+        lead_poller.parse_created_time(lead_json)
+        return True
+
+    stats = lead_poller.poll_form(session, cursor, connection_factory(), 55, 66, "token", save_fn)
+
+    assert stats == {"fetched": 3, "skipped": 0, "saved": 2, "errors": 1}
+    assert _marks(cursor) == []
+
+def test_existing_newer_leads_advance_the_mark(cursor_factory, connection_factory):
+    session = FakeSession([[_lead(5, 5), _lead(4, 4)]])
+    cursor = cursor_factory(results=[None, [{"id": 5}], None])
+
+    stats = lead_poller.poll_form(session, cursor, connection_factory(), 55, 66, "token", lambda *_: True)
+
+    assert stats["skipped"] == 1 and stats["saved"] == 1
+    assert [args[1] for args in _marks(cursor)] == ["2025-09-02 10:05:00"]
+
+def test_since_filter_uses_high_water_mark_with_overlap(cursor_factory, connection_factory):
+    session = FakeSession([[]])
+    mark = datetime(2025, 9, 2, 10, 0, 0)
+    cursor = cursor_factory(results=[{"last_created_time": mark}])
+
+    lead_poller.poll_form(session, cursor, connection_factory(), 55, 66, "token", lambda *_: True)
+
+    filtering = codec.loads(session.requests[0][1]["filtering"])
+    expected = int(mark.replace(tzinfo=timezone.utc).timestamp()) - lead_poller.HIGH_WATER_OVERLAP
+    assert filtering == [{"field": "time_created", "operator": "GREATER_THAN", "value": expected}]
+
+def test_saved_lead_without_date_keeps_the_mark(cursor_factory, connection_factory):
+    # Modo particionado: encolar no lee created_time
+    session = FakeSession([[_lead(3, 3), {"id": "2"}]])
+    cursor = cursor_factory(results=[None, []])
+
+    stats = lead_poller.poll_form(session, cursor, connection_factory(), 55, 66, "token", lambda *_: True)
+
+    assert stats["saved"] == 2 and stats["errors"] == 0
+    assert _marks(cursor) == []
@@ -0,0 +1,76 @@
+from datetime import date, datetime
+
+import pytest
+
+from modules import lead_stats
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(lead_stats, "_table_ready", True)
+    monkeypatch.setattr(lead_stats, "_cache", {})
+
+def test_record_lead_counts_total_campaign_and_room(cursor_factory):
+    cursor = cursor_factory()
+
+    lead_stats.record_lead(cursor, datetime(2025, 9, 2, 10, 15), None, "S3")
+
+    sql, args = cursor.executed[0]
+    assert sql.startswith("INSERT INTO fb_leads_stats")
+    assert args == (date(2025, 9, 2), date(2025, 9, 2), lead_stats.NO_CAMPAIGN, date(2025, 9, 2), "S3")
+
+def test_record_lead_never_raises(cursor_factory):
+    class BrokenCursor:
+        def execute(self, *args):
+            raise RuntimeError("tabla bloqueada")
+
+    lead_stats.record_lead(BrokenCursor(), datetime(2025, 9, 2), "Campaña", None)
+
+def test_record_event_commits_its_own_transaction(cursor_factory, connection_factory):
+    cursor = cursor_factory(results=[{"dia": date(2025, 9, 2)}])
+    connection = connection_factory()
+
+    lead_stats.record_event(cursor, connection, 7, "lista_espera")
+
+    assert cursor.executed[0][0].startswith("SELECT DATE(fecha)")
+    sql, args = cursor.executed[1]
+    assert sql.startswith("INSERT INTO fb_leads_stats") and "SELECT" not in sql
+    assert args == (date(2025, 9, 2), "lista_espera", 7)
+    assert connection.calls == ["commit"]
+
+def test_record_event_rolls_back_its_own_error(cursor_factory, connection_factory):
+    cursor = cursor_factory(results=[{"dia": date(2025, 9, 2)}, RuntimeError("Deadlock found")])
+    connection = connection_factory()
+
+    lead_stats.record_event(cursor, connection, 7)
+
+    assert connection.calls == ["rollback"]
+
+def test_summary_joins_events_by_integer_id(cursor_factory):
+    cursor = cursor_factory(results=[[]])
+
+    lead_stats.load_summary(cursor, 7)
+
+    sql, _ = cursor.executed[0]
+    assert "e.id = CAST(s.valor AS UNSIGNED)" in sql
+
+def test_summary_totals_and_cache(cursor_factory, monkeypatch):
+    rows = [
+        {"dia": date(2025, 9, 1), "dimension": "leads", "valor": "", "total": 3, "titulo_charla": None},
+        {"dia": date(2025, 9, 2), "dimension": "leads", "valor": "", "total": 2, "titulo_charla": None},
+        {"dia": date(2025, 9, 2), "dimension": "evento", "valor": "7", "total": 4, "titulo_charla": "Microscopía"},
+    ]
+    cursor = cursor_factory(results=[rows])
+    now = [100.0]
+    monkeypatch.setattr(lead_stats.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(lead_stats, "STATS_CACHE_TTL", 5)
+
+    summary = lead_stats.load_summary(cursor, 30)
+
+    assert summary["totales"] == {"leads": {"": 5}, "evento": {"7": 4}}
+    assert summary["por_dia"]["2025-09-02"]["leads"] == {"": 2}
+    assert summary["eventos"] == {"7": "Microscopía"}
+
+    assert lead_stats.cached_summary(30) is summary
+    assert lead_stats.cached_summary(7) is None
+    now[0] += 5
+    assert lead_stats.cached_summary(30) is None
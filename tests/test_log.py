@@ -0,0 +1,58 @@
+import logging
+
+from modules.log import KeyValueFormatter, SamplingFilter, fields
+
+def _record(msg, level=logging.INFO, **extra):
+    record = logging.LogRecord("modules.test", level, __file__, 1, msg, None, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+def test_formatter_appends_fields_after_message():
+    record = _record("Evento encontrado", **fields(component="match", event_id=12, total_ms=3.14159, ad="S1 - Charla"))
+
+    line = KeyValueFormatter().format(record)
+
+    assert line.endswith('INFO modules.test Evento encontrado component=match event_id=12 total_ms=3.1 ad="S1 - Charla"')
+
+def test_formatter_keeps_fields_on_first_line_of_traceback():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        import sys
+        record = _record("Error consolidando lead", level=logging.ERROR, **fields(lead_id=1))
+        record.exc_info = sys.exc_info()
+
+    first, rest = KeyValueFormatter().format(record).split("\n", 1)
+
+    assert first.endswith("Error consolidando lead lead_id=1")
+    assert "ValueError: boom" in rest
+
+def test_sampling_filter_only_samples_marked_info_records():
+    sampler = SamplingFilter(rate=3)
+
+    sampled = [sampler.filter(_record("Evento encontrado", **fields(sampled=True))) for _ in range(6)]
+    assert sampled == [True, False, False, True, False, False]
+
+    assert all(sampler.filter(_record("Lead guardado")) for _ in range(3))
+    assert all(sampler.filter(_record("Falló", level=logging.WARNING, **fields(sampled=True))) for _ in range(3))
+
+def test_log_messages_are_constant():
+    # El muestreo agrupa por msg: los valores van en fields(...), no en el texto
+    import ast
+    import glob
+    import os
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    levels = {"debug", "info", "warning", "error", "exception", "critical"}
+    offenders = []
+    for path in [os.path.join(root, "app.py"), *glob.glob(os.path.join(root, "modules", "*.py"))]:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in levels and node.args
+                    and isinstance(node.args[0], (ast.JoinedStr, ast.BinOp))):
+                offenders.append(f"{os.path.basename(path)}:{node.lineno}")
+
+    assert offenders == []
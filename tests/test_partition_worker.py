@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("dotenv")
+
+import partition_worker
+from modules import partitions
+
+ITEMS = [
+    {"seq": 1, "leadgen_id": 11, "form_id": "123", "page_id": "456", "attempts": 0},
+    {"seq": 2, "leadgen_id": 12, "form_id": "123", "page_id": "456", "attempts": 0},
+]
+
+@pytest.fixture
+def leases(monkeypatch):
+    leases = partitions.PartitionLeases("w1", count=4)
+    leases.held[3] = 7
+    monkeypatch.setattr(leases, "renew", lambda cursor, partition: partition in leases.held)
+    return leases
+
+def _statements(cursor):
+    return [sql.split(" SET ")[1].split(" WHERE ")[0] for sql, _ in cursor.executed[1:]]
+
+def test_each_lead_is_claimed_then_closed(cursor_factory, leases, monkeypatch):
+    processed = []
+    monkeypatch.setattr(partition_worker.app, "process_leadgen", lambda lead_id, form_id, page_id, fence: processed.append(lead_id))
+    cursor = cursor_factory(results=[ITEMS])
+
+    assert partition_worker.process_partition(cursor, leases, 3, 10) == 2
+
+    assert processed == ["11", "12"]
+    assert [status.split(",")[0] for status in _statements(cursor)] == [
+        "q.status = 'processing'", "q.status = 'done'", "q.status = 'processing'", "q.status = 'done'",
+    ]
+    assert all(args[-2:] == ("w1", 7) for _, args in cursor.executed[1:])
+
+def test_lost_lease_stops_the_partition(cursor_factory, leases, monkeypatch):
+    monkeypatch.setattr(partition_worker.app, "process_leadgen", lambda *args, **kwargs: None)
+    # next_items, claim, mark_done rechazado
+    cursor = cursor_factory(results=[ITEMS], rowcounts=[2, 1, 0])
+
+    assert partition_worker.process_partition(cursor, leases, 3, 10) == 0
+
+    assert leases.held == {}
+    assert len(cursor.executed) == 3
+
+def test_failed_lead_is_marked_and_blocks_the_partition(cursor_factory, leases, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("lead inválido")
+
+    monkeypatch.setattr(partition_worker.app, "process_leadgen", fail)
+    cursor = cursor_factory(results=[ITEMS])
+
+    assert partition_worker.process_partition(cursor, leases, 3, 10) == 0
+
+    sql, args = cursor.executed[2]
+    assert "q.attempts = %s, q.status = %s" in sql
+    assert args[:2] == (1, "pending")
+    assert len(cursor.executed) == 3
+
+def test_lease_lost_in_consolidation_leaves_the_lead_unmarked(cursor_factory, leases, monkeypatch):
+    def lost(*args, **kwargs):
+        raise partitions.LeaseLost("partición 3")
+
+    monkeypatch.setattr(partition_worker.app, "process_leadgen", lost)
+    cursor = cursor_factory(results=[ITEMS])
+
+    assert partition_worker.process_partition(cursor, leases, 3, 10) == 0
+
+    assert leases.held == {}
+    assert len(cursor.executed) == 2
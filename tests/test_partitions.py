@@ -0,0 +1,108 @@
+import pytest
+
+from modules import partitions
+
+def test_partition_for_is_stable_and_type_independent():
+    assert partitions.partition_for("142158129158183", "123", 16) == partitions.partition_for(142158129158183, 123, 16)
+    assert partitions.partition_for(1, 2, 16) == partitions.partition_for(1, 2, 16)
+    assert all(0 <= partitions.partition_for(page, 7, 16) < 16 for page in range(50))
+    # crc32 de "1:2": no depende de PYTHONHASHSEED ni del proceso
+    assert partitions.partition_for(1, 2, 1000) == 932632908 % 1000
+
+def test_enqueue_uses_partition_of_page_and_form(cursor_factory):
+    cursor = cursor_factory()
+
+    partition = partitions.enqueue_lead(cursor, "99", "123", "456")
+
+    assert partition == partitions.partition_for("456", "123")
+    assert cursor.executed[0][1] == (99, "123", "456", partition)
+
+def test_next_items_includes_unfinished_claims(cursor_factory):
+    cursor = cursor_factory(results=[[]])
+
+    partitions.next_items(cursor, 3, limit=10)
+
+    sql, args = cursor.executed[0]
+    assert "status IN ('pending', 'processing')" in sql
+    assert args == (3, 10)
+
+def test_claim_is_fenced_by_owner_epoch_and_valid_lease(cursor_factory):
+    cursor = cursor_factory(rowcounts=[1])
+
+    partitions.claim_item(cursor, 42, "nodo1:10", 7)
+
+    sql, args = cursor.executed[0]
+    assert sql.startswith("UPDATE fb_lead_queue q JOIN fb_partition_leases l ON l.partition_id = q.partition_id")
+    assert "SET q.status = 'processing', q.claim_epoch = l.epoch" in sql
+    assert "l.owner = %s AND l.epoch = %s AND l.lease_until > NOW()" in sql
+    assert args == (42, "nodo1:10", 7)
+
+@pytest.mark.parametrize("write", [
+    lambda cursor: partitions.claim_item(cursor, 42, "nodo1:10", 7),
+    lambda cursor: partitions.mark_done(cursor, 42, "nodo1:10", 7),
+    lambda cursor: partitions.mark_failed(cursor, {"seq": 42, "attempts": 0}, "boom", "nodo1:10", 7),
+])
+def test_fenced_writes_raise_when_lease_was_taken(cursor_factory, write):
+    with pytest.raises(partitions.LeaseLost):
+        write(cursor_factory(rowcounts=[0]))
+
+def test_mark_done_requires_claim_of_same_epoch(cursor_factory):
+    cursor = cursor_factory(rowcounts=[1])
+
+    partitions.mark_done(cursor, 42, "nodo1:10", 7)
+
+    sql, args = cursor.executed[0]
+    assert "q.status = 'processing' AND q.claim_epoch = l.epoch" in sql
+    assert "lease_until" not in sql
+    assert args == (42, "nodo1:10", 7)
+
+def test_mark_failed_counts_attempts_until_discarded(cursor_factory):
+    cursor = cursor_factory(rowcounts=[1, 1])
+
+    assert not partitions.mark_failed(cursor, {"seq": 1, "attempts": 0}, "boom", "w", 1, max_attempts=2)
+    assert partitions.mark_failed(cursor, {"seq": 1, "attempts": 1}, "x" * 300, "w", 1, max_attempts=2)
+
+    assert cursor.executed[0][1] == (1, "pending", "boom", 1, "w", 1)
+    attempts, status, error, *_ = cursor.executed[1][1]
+    assert (attempts, status, len(error)) == (2, "failed", 255)
+
+def test_renew_keeps_lease_when_unchanged_in_same_second(cursor_factory):
+    leases = partitions.PartitionLeases("w1", count=4, lease_seconds=60)
+    leases.held[2] = 5
+    cursor = cursor_factory(results=[None, {"owner": "w1", "epoch": 5}], rowcounts=[0, 1])
+
+    assert leases.renew(cursor, 2)
+    assert leases.held == {2: 5}
+
+def test_renew_forgets_partition_taken_by_another_worker(cursor_factory):
+    leases = partitions.PartitionLeases("w1", count=4, lease_seconds=60)
+    leases.held[2] = 5
+    cursor = cursor_factory(results=[None, {"owner": "w2", "epoch": 6}], rowcounts=[0, 1])
+
+    assert not leases.renew(cursor, 2)
+    assert leases.held == {}
+
+def test_acquire_records_new_epoch(cursor_factory):
+    leases = partitions.PartitionLeases("w1", count=4)
+    cursor = cursor_factory(results=[None, {"epoch": 8}], rowcounts=[1, 1])
+
+    assert leases._try_acquire(cursor, 1)
+    assert leases.held == {1: 8}
+    assert "epoch = epoch + 1" in cursor.executed[0][0]
+
+def test_lead_time_budget_counts_every_query():
+    assert partitions.lead_time_budget(5, 5, 2) == 4 * 5 + 5 + partitions.QUERIES_PER_LEAD * 2
+    assert partitions.lead_time_budget(5, 5, 0) is None
+
+def test_check_lease_locks_the_lease_row(cursor_factory):
+    cursor = cursor_factory(results=[{"1": 1}])
+
+    partitions.check_lease(cursor, 3, "w1", 7)
+
+    sql, args = cursor.executed[0]
+    assert sql.endswith("LOCK IN SHARE MODE")
+    assert args == (3, "w1", 7)
+
+def test_check_lease_rejects_a_stale_epoch(cursor_factory):
+    with pytest.raises(partitions.LeaseLost):
+        partitions.check_lease(cursor_factory(results=[None]), 3, "w1", 6)
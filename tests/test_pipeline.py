@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from modules import pipeline
+from modules.records import LeadRecord
+
+@pytest.fixture(autouse=True)
+def table_ready(monkeypatch):
+    monkeypatch.setattr(pipeline, "_fb_leads_table_ready", True)
+
+@pytest.mark.parametrize("ad_name, expected", [
+    ("S3 - De la Microscopía Óptica", ("S3", "De la Microscopía Óptica")),
+    ("  S12-Charla  ", ("S12", "Charla")),
+    ("Nombre sin sala", (None, "Nombre sin sala")),
+    (None, (None, None)),
+])
+def test_extract_sala_and_clean_name(ad_name, expected):
+    assert pipeline.extract_sala_and_clean_name(ad_name) == expected
+
+def test_enrich_fills_names_and_sala_lazily():
+    calls = []
+
+    def name_of(kind):
+        def lookup(object_id):
+            calls.append((kind, object_id))
+            return f"{kind} {object_id}" if kind != "ad" else "S1 - Charla"
+        return lookup
+
+    lead = LeadRecord(1)
+    lead.campaign_id, lead.adset_id, lead.ad_id = "c1", "a1", "ad1"
+    leads = pipeline.enrich(iter([lead]), name_of("campaign"), name_of("adset"), name_of("ad"))
+    assert calls == []
+
+    [enriched] = list(leads)
+
+    assert (enriched.campaign_name, enriched.adset_name) == ("campaign c1", "adset a1")
+    assert (enriched.sala, enriched.ad_name) == ("S1", "Charla")
+
+def _lead():
+    lead = LeadRecord(5, form_id=1, page_id=2, created_time=datetime(2025, 9, 2, 15, 0, tzinfo=timezone.utc), raw_json="{}")
+    lead.campaign_name, lead.sala = "Campaña", "S1"
+    return lead
+
+def test_store_lead_counts_stats_only_for_new_leads(cursor_factory, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(pipeline.lead_stats, "record_lead", lambda cursor, *args: recorded.append(args))
+
+    assert pipeline.store_lead(cursor_factory(rowcounts=[1]), _lead())
+    assert not pipeline.store_lead(cursor_factory(rowcounts=[2]), _lead())
+
+    assert recorded == [(_lead().created_time, "Campaña", "S1")]
+
+def test_store_lead_writes_created_time_as_utc_text(cursor_factory, monkeypatch):
+    monkeypatch.setattr(pipeline.lead_stats, "record_lead", lambda *args: None)
+    cursor = cursor_factory(rowcounts=[2])
+
+    pipeline.store_lead(cursor, _lead())
+
+    sql, args = cursor.executed[0]
+    assert sql.startswith("INSERT INTO fb_leads")
+    assert args[0] == 5 and args[13] == "2025-09-02 15:00:00"
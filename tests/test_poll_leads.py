@@ -0,0 +1,26 @@
+import sys
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("dotenv")
+
+import poll_leads
+from modules import partitions
+
+@pytest.mark.parametrize("argv", [
+    ["--form-id", "123"],
+    ["--form-id", "123", "--page-id", "1", "--page-id", "2"],
+])
+def test_form_id_requires_a_single_page(monkeypatch, argv):
+    monkeypatch.setattr(sys, "argv", ["poll_leads.py", *argv])
+
+    with pytest.raises(SystemExit):
+        poll_leads.main()
+
+def test_enqueue_fn_routes_leads_to_their_partition(cursor_factory):
+    cursor = cursor_factory()
+
+    assert poll_leads.enqueue_fn(cursor)({"id": "99"}, "123", "456")
+
+    assert cursor.executed[0][1] == (99, "123", "456", partitions.partition_for("456", "123"))
@@ -0,0 +1,49 @@
+import hashlib
+import hmac
+import os
+
+from modules import profiling
+
+def test_signed_header_forces_profiling(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SECRET", b"secreto")
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0)
+    body = b'{"entry": []}'
+    signature = "sha256=" + hmac.new(b"secreto", body, hashlib.sha256).hexdigest()
+
+    assert profiling.should_profile(body, signature)
+    assert not profiling.should_profile(body, "sha256=00")
+    assert not profiling.should_profile(body, None)
+
+def test_sampling_profiles_one_of_n(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SECRET", b"")
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 3)
+    monkeypatch.setattr(profiling, "_request_counter", iter(range(1, 7)))
+
+    assert [profiling.should_profile(b"", None) for _ in range(6)] == [False, False, True, False, False, True]
+
+def test_rotate_keeps_newest_profiles(tmp_path):
+    for i in range(4):
+        for ext in (".prof", ".txt"):
+            path = tmp_path / f"webhook_{i}{ext}"
+            path.write_text("x")
+            os.utime(path, (1000 + i, 1000 + i))
+
+    profiling._rotate(str(tmp_path), keep=2)
+
+    assert sorted(os.listdir(tmp_path)) == ["webhook_2.prof", "webhook_2.txt", "webhook_3.prof", "webhook_3.txt"]
+
+def test_profiled_writes_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_KEEP", 5)
+
+    with profiling.profiled("webhook", folder=str(tmp_path)) as profiler:
+        assert profiler is not None
+        sum(range(1000))
+
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 2 and names[0].endswith(".prof") and names[1].endswith(".txt")
+    assert "Consultas SQL" in (tmp_path / names[1]).read_text(encoding="utf-8")
+
+def test_profiled_disabled_yields_none(tmp_path):
+    with profiling.profiled("webhook", enabled=False, folder=str(tmp_path)) as profiler:
+        assert profiler is None
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from modules import qr_renderer
+
+def test_store_path_is_content_addressed(tmp_path):
+    path = qr_renderer.store_path("QR|Ana", "png", str(tmp_path))
+    digest = qr_renderer.qr_hash("QR|Ana")
+
+    assert path == os.path.join(str(tmp_path), digest[:2], f"{digest}.png")
+    assert "Ana" not in os.path.basename(path)
+
+def test_render_many_consumes_a_generator_and_skips_existing(tmp_path):
+    store = str(tmp_path)
+    existing = qr_renderer.store_path("QR-1", "png", store)
+    os.makedirs(os.path.dirname(existing))
+    open(existing, "wb").close()
+    consumed = []
+
+    def qr_texts():
+        for text in ("QR-1", "QR-2", "QR-3"):
+            consumed.append(text)
+            yield text
+
+    summary = {}
+    results = list(qr_renderer.render_many(qr_texts(), ("png",), workers=2, store_dir=store, chunksize=1, summary=summary))
+
+    assert consumed == ["QR-1", "QR-2", "QR-3"]
+    assert summary == {"qr": 3, "existing": 1}
+    # Sin la librería qrcode cada imagen vuelve con su error, igual se reporta una por tarea
+    assert sorted(digest for digest, _, _, _ in results) == sorted(qr_renderer.qr_hash(t) for t in ("QR-2", "QR-3"))
+
+def test_render_many_returns_lazily():
+    def qr_texts():
+        raise AssertionError("no debe leerse antes de iterar")
+        yield
+
+    results = qr_renderer.render_many(qr_texts())
+    assert hasattr(results, "__next__")
+
+def test_iter_qr_codes_pages_by_id(cursor_factory, connection_factory):
+    render_qr_codes = pytest.importorskip("render_qr_codes")
+    first = [{"id": 1, "qr_code": "A"}, {"id": 4, "qr_code": "B"}]
+    cursor = cursor_factory(results=[first, [{"id": 9, "qr_code": "C"}]])
+
+    assert list(render_qr_codes.iter_qr_codes(connection_factory(cursor), since_id=0, page_size=2)) == ["A", "B", "C"]
+    assert [args for _, args in cursor.executed] == [(0, 2), (4, 2)]
+
+def test_timing_stats():
+    stats = qr_renderer.timing_stats([0.002, 0.001, 0.003])
+
+    assert stats["count"] == 3
+    assert round(stats["p50_ms"]) == 2 and round(stats["max_ms"]) == 3
+    assert qr_renderer.timing_stats([]) == {"count": 0}
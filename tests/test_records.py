@@ -0,0 +1,59 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from modules.records import EventRecord, LeadRecord
+
+GRAPH_LEAD = {
+    "id": "1234567890",
+    "created_time": "2025-09-02T15:04:05+0000",
+    "ad_id": "555",
+    "field_data": [
+        {"name": "full_name", "values": ["Ana Pérez"]},
+        {"name": "email", "values": ["ana@example.com"]},
+        {"name": "empresa", "values": ["Kossodo"]},
+    ],
+}
+
+def test_lead_from_graph():
+    lead = LeadRecord.from_graph(GRAPH_LEAD, "77", "88")
+
+    assert (lead.id, lead.form_id, lead.page_id) == (1234567890, 77, 88)
+    assert lead.created_time == datetime(2025, 9, 2, 15, 4, 5, tzinfo=timezone.utc)
+    assert lead.ad_id == "555" and lead.campaign_id is None
+    assert (lead.full_name, lead.email, lead.company_name, lead.job_title) == ("Ana Pérez", "ana@example.com", "Kossodo", None)
+    assert json.loads(lead.raw_json) == GRAPH_LEAD
+    assert lead.event_id is None
+
+def test_lead_from_graph_normalizes_offset_to_utc():
+    lead = LeadRecord.from_graph(dict(GRAPH_LEAD, created_time="2025-09-02T10:04:05-05:00"), 1, 2)
+
+    assert lead.created_time == datetime(2025, 9, 2, 15, 4, 5, tzinfo=timezone.utc)
+
+def test_lead_from_row_defaults_generated_columns():
+    row = {
+        "id": 9, "ad_name": "Charla", "adset_name": "Conjunto", "sala": "S2",
+        "full_name": "Luis", "email": "luis@example.com", "phone": None,
+        "job_title": None, "company_name": "Lab",
+    }
+
+    lead = LeadRecord.from_row(row)
+
+    assert (lead.id, lead.sala, lead.ad_name) == (9, "S2", "Charla")
+    assert lead.job_title == "" and lead.company_name == "Lab"
+
+def test_records_have_no_instance_dict():
+    with pytest.raises(AttributeError):
+        LeadRecord(1).otro = 1
+
+def test_event_record_precomputes_match_keys():
+    event = EventRecord.from_row({
+        "id": 7, "titulo_charla": "Microscopía: técnicas avanzadas - copia",
+        "fecha": datetime(2025, 9, 2, 10, 0), "sala": "S3",
+    })
+
+    assert event.fecha_iso == "2025-09-02"
+    assert event.key_45 == "microscopía: técnicas avanzadas"
+    assert event.key_colon == "microscopía"
+    assert EventRecord(8, None, None, "S1").fecha_iso == ""
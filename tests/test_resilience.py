@@ -0,0 +1,152 @@
+import pytest
+
+from modules import resilience
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"{status} Error")
+        self.response = type("Response", (), {"status_code": status})()
+
+def test_breaker_opens_after_threshold_and_half_opens_after_timeout(clock):
+    breaker = resilience.CircuitBreaker("graph", failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.would_allow()
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Una sola prueba a la vez
+    assert not breaker.allow()
+    assert not breaker.would_allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+def test_failed_probe_reopens(clock):
+    breaker = resilience.CircuitBreaker("mysql", failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_success_resets_consecutive_failures():
+    breaker = resilience.CircuitBreaker("mysql", failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == "closed"
+
+def test_limiter_grows_additively_and_halves_on_slow_or_failed_calls():
+    limiter = resilience.AdaptiveLimiter("mysql", target_latency=1.0, initial_limit=4, min_limit=1, max_limit=5)
+
+    assert all(limiter.try_acquire() for _ in range(4))
+    assert not limiter.try_acquire()
+
+    for _ in range(4):
+        limiter.release(0.1, ok=True)
+    assert 4.9 < limiter.limit <= 5
+
+    for _ in range(20):
+        assert limiter.try_acquire()
+        limiter.release(0.1, ok=True)
+    assert limiter.limit == 5
+
+    assert limiter.try_acquire()
+    limiter.release(2.0, ok=True)
+    assert limiter.limit == 2.5
+
+    for _ in range(3):
+        assert limiter.try_acquire()
+        limiter.release(0.1, ok=False)
+    assert limiter.limit == 1
+    assert limiter.in_flight == 0
+
+def _dependency(is_failure=None, threshold=2):
+    dependency = resilience.Dependency("test", target_latency=1.0, is_failure=is_failure)
+    dependency.breaker.failure_threshold = threshold
+    return dependency
+
+def test_call_records_failures_and_rejects_when_open():
+    dependency = _dependency()
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            with dependency.call():
+                raise ConnectionError("refused")
+
+    with pytest.raises(resilience.DependencyUnavailable):
+        with dependency.call():
+            pytest.fail("no debe ejecutarse con el circuito abierto")
+    assert dependency.status()["state"] == "open"
+    assert dependency.limiter.in_flight == 0
+
+def test_call_rejected_by_limiter_releases_half_open_probe(clock):
+    dependency = _dependency(threshold=1)
+    with pytest.raises(ConnectionError):
+        with dependency.call():
+            raise ConnectionError("refused")
+    clock.now += resilience.BREAKER_RESET_TIMEOUT
+    dependency.limiter.limit = 0
+
+    with pytest.raises(resilience.DependencyUnavailable):
+        with dependency.call():
+            pass
+
+    assert dependency.breaker.would_allow()
+
+@pytest.mark.parametrize("status", [400, 403, 404])
+def test_graph_client_errors_do_not_open_the_circuit(status):
+    dependency = _dependency(resilience.http_failure)
+    for _ in range(5):
+        with pytest.raises(HTTPError):
+            with dependency.call():
+                raise HTTPError(status)
+
+    assert dependency.status()["state"] == "closed"
+
+@pytest.mark.parametrize("error", [HTTPError(500), HTTPError(503), HTTPError(429), TimeoutError("read timeout")])
+def test_graph_server_errors_open_the_circuit(error):
+    dependency = _dependency(resilience.http_failure)
+    for _ in range(2):
+        with pytest.raises(type(error)):
+            with dependency.call():
+                raise error
+
+    assert dependency.status()["state"] == "open"
+
+def test_mysql_only_counts_connection_errors(fake_pymysql):
+    dependency = _dependency(resilience.mysql_failure)
+    for _ in range(3):
+        with pytest.raises(fake_pymysql.err.IntegrityError):
+            with dependency.call():
+                raise fake_pymysql.err.IntegrityError(1062, "Duplicate entry")
+    assert dependency.status()["state"] == "closed"
+
+    for _ in range(2):
+        with pytest.raises(fake_pymysql.err.OperationalError):
+            with dependency.call():
+                raise fake_pymysql.err.OperationalError(2013, "Lost connection")
+    assert dependency.status()["state"] == "open"
@@ -0,0 +1,125 @@
+import pytest
+
+from modules import schema
+
+def _index_rows(name, columns, unique):
+    return [
+        {"Key_name": name, "Seq_in_index": seq, "Column_name": column, "Non_unique": 0 if unique else 1}
+        for seq, column in enumerate(columns, 1)
+    ]
+
+@pytest.fixture
+def unique_relation(monkeypatch):
+    monkeypatch.setattr(schema, "MANAGED_INDEXES", [
+        ('expokossodo_registro_eventos', 'uq_registro_evento', ('registro_id', 'evento_id'), True),
+    ])
+
+def _created(cursor):
+    return [sql for sql, _ in cursor.executed if sql.startswith("CREATE")]
+
+def test_plain_index_does_not_satisfy_unique_entry(cursor_factory, unique_relation, connection_factory):
+    rows = _index_rows("PRIMARY", ("id",), True) + _index_rows("idx_rel", ("registro_id", "evento_id"), False)
+    # SHOW INDEX, búsqueda de duplicados (ninguno), CREATE
+    cursor = cursor_factory(results=[rows, [], None])
+
+    missing = schema.ensure_managed_indexes(cursor, connection_factory())
+
+    assert missing == []
+    assert _created(cursor) == [
+        "CREATE UNIQUE INDEX uq_registro_evento ON expokossodo_registro_eventos(registro_id, evento_id)"
+    ]
+
+def test_plain_index_is_reported_as_missing_without_create(cursor_factory, unique_relation, connection_factory):
+    rows = _index_rows("idx_rel", ("registro_id", "evento_id"), False)
+    cursor = cursor_factory(results=[rows])
+
+    missing = schema.ensure_managed_indexes(cursor, connection_factory(), create=False)
+
+    assert missing == [('expokossodo_registro_eventos', 'uq_registro_evento', ('registro_id', 'evento_id'))]
+
+def test_existing_unique_index_with_other_name_is_accepted(cursor_factory, unique_relation, connection_factory):
+    rows = _index_rows("uq_otro_nombre", ("registro_id", "evento_id"), True)
+    cursor = cursor_factory(results=[rows])
+
+    assert schema.ensure_managed_indexes(cursor, connection_factory()) == []
+    assert _created(cursor) == []
+
+def test_unique_index_is_not_created_over_duplicates(cursor_factory, unique_relation, connection_factory):
+    duplicates = [{"registro_id": 1, "evento_id": 2, "total": 2}]
+    cursor = cursor_factory(results=[[], duplicates])
+
+    missing = schema.ensure_managed_indexes(cursor, connection_factory())
+
+    assert len(missing) == 1
+    assert _created(cursor) == []
+
+def test_plain_index_is_satisfied_by_longer_prefix(cursor_factory, monkeypatch, connection_factory):
+    monkeypatch.setattr(schema, "MANAGED_INDEXES", [
+        ('expokossodo_registros', 'idx_correo', ('correo',), False),
+    ])
+    cursor = cursor_factory(results=[_index_rows("idx_correo_fecha", ("correo", "fecha_registro"), False)])
+
+    assert schema.ensure_managed_indexes(cursor, connection_factory()) == []
+    assert _created(cursor) == []
+
+def test_explain_flags_full_scans_and_filesort(cursor_factory, monkeypatch):
+    monkeypatch.setattr(schema, "HOT_QUERIES", {"q": ("SELECT 1", ())})
+    cursor = cursor_factory(results=[[
+        {"table": "fb_leads", "type": "ALL", "key": None, "rows": 900, "Extra": "Using where; Using filesort"},
+    ]])
+
+    [result] = schema.explain_hot_queries(cursor)
+
+    assert result == ("q", "fb_leads", "ALL", None, 900, ["full scan", "filesort"])
+
+def test_idx_actualizado_is_not_created_at_startup():
+    assert all(table != 'expokossodo_registros' or index != 'idx_actualizado' for table, index, _, _ in schema.MANAGED_INDEXES)
+
+def test_migrate_registros_adds_column_and_index(cursor_factory, connection_factory):
+    columns = [{"Field": "id"}, {"Field": "correo"}]
+    # SHOW COLUMNS, ALTER, SHOW INDEX, CREATE
+    cursor = cursor_factory(results=[columns, None, _index_rows("PRIMARY", ("id",), True), None])
+    connection = connection_factory()
+
+    assert schema.migrate_registros(cursor, connection)
+
+    statements = [sql for sql, _ in cursor.executed]
+    assert statements[1].startswith("ALTER TABLE expokossodo_registros ADD COLUMN actualizado_at")
+    assert statements[3] == "CREATE INDEX idx_actualizado ON expokossodo_registros(actualizado_at, id)"
+    assert connection.commits == 1
+
+def test_migrate_registros_without_privileges_warns(cursor_factory, fake_pymysql, connection_factory):
+    denied = fake_pymysql.err.OperationalError(1142, "ALTER command denied to user 'leads'")
+    cursor = cursor_factory(results=[[{"Field": "id"}], denied])
+    connection = connection_factory()
+
+    assert schema.migrate_registros(cursor, connection) is False
+    assert connection.commits == 0
+
+def test_migrate_registros_reraises_other_errors(cursor_factory, fake_pymysql, connection_factory):
+    lost = fake_pymysql.err.OperationalError(2013, "Lost connection")
+    cursor = cursor_factory(results=[lost])
+
+    with pytest.raises(fake_pymysql.err.OperationalError):
+        schema.migrate_registros(cursor, connection_factory())
+
+def test_replaced_index_is_dropped_once_replacement_exists(cursor_factory, connection_factory):
+    rows = _index_rows("idx_enviado", ("enviado",), False) + _index_rows("idx_enviado_created", ("enviado", "created_time", "id"), False)
+    cursor = cursor_factory(results=[rows, None])
+    connection = connection_factory()
+
+    assert schema.drop_replaced_indexes(cursor, connection) == []
+    assert cursor.executed[1][0] == "DROP INDEX idx_enviado ON fb_leads"
+    assert connection.commits == 1
+
+def test_replaced_index_is_kept_without_replacement(cursor_factory, connection_factory):
+    cursor = cursor_factory(results=[_index_rows("idx_enviado", ("enviado",), False)])
+
+    assert schema.drop_replaced_indexes(cursor, connection_factory()) == []
+    assert [sql for sql, _ in cursor.executed if sql.startswith("DROP")] == []
+
+def test_replaced_index_is_only_reported_without_drop(cursor_factory, connection_factory):
+    rows = _index_rows("idx_enviado", ("enviado",), False) + _index_rows("idx_enviado_created", ("enviado", "created_time", "id"), False)
+    cursor = cursor_factory(results=[rows])
+
+    assert schema.drop_replaced_indexes(cursor, connection_factory(), drop=False) == [('fb_leads', 'idx_enviado')]
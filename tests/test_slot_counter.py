@@ -0,0 +1,61 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from modules import slot_counter
+
+@pytest.fixture(autouse=True)
+def table_ready(monkeypatch):
+    monkeypatch.setattr(slot_counter, "_table_ready", True)
+
+def test_compaction_sums_increments_per_event(cursor_factory, connection_factory):
+    cursor = cursor_factory(results=[
+        {"locked": 1},
+        {"max_id": 4},
+        [{"evento_id": 7, "delta": 1}, {"evento_id": 7, "delta": 1}, {"evento_id": 9, "delta": 1}],
+    ])
+    connection = connection_factory()
+
+    totals = slot_counter.compact_slot_increments(cursor, connection)
+
+    assert totals == {7: 2, 9: 1}
+    updates = [args for sql, args in cursor.executed if sql.startswith("UPDATE expokossodo_eventos")]
+    assert updates == [(2, 7), (1, 9)]
+    assert ("DELETE FROM expokossodo_eventos_slots_delta WHERE id <= %s", (4,)) in cursor.executed
+    assert connection.calls == ["begin", "commit"]
+    assert cursor.executed[-1][0] == "SELECT RELEASE_LOCK(%s)"
+
+def test_compaction_skips_when_lock_is_taken(cursor_factory, connection_factory):
+    cursor = cursor_factory(results=[{"locked": 0}])
+
+    assert slot_counter.compact_slot_increments(cursor, connection_factory()) is None
+    assert len(cursor.executed) == 1
+
+def test_compaction_thread_stops_on_event():
+    stop = threading.Event()
+    compacted = threading.Event()
+
+    @contextmanager
+    def get_connection():
+        compacted.set()
+        raise RuntimeError("sin MySQL")
+        yield
+
+    thread = slot_counter.start_compaction_thread(get_connection, stop, interval=0.01)
+    assert compacted.wait(2)
+
+    stop.set()
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+
+def test_compaction_thread_does_not_run_after_stop():
+    stop = threading.Event()
+    stop.set()
+    calls = []
+
+    thread = slot_counter.start_compaction_thread(lambda: calls.append(1), stop, interval=0.01)
+    thread.join(timeout=2)
+
+    assert not thread.is_alive()
+    assert calls == []